@@ -5,27 +5,66 @@ from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Literal
 from app.core.orchestrator import EngraveJob, run_engrave_job, run_cycle_for_site
 from app.core.state import get_state
+from app.core.presets import resolve_preset
+from app.core.tracing import traces, trace_clock
+from app.core.logging import get_logger
+from app.api.v1.cycle import run_traced
 from datetime import datetime
 import uuid
 
 router = APIRouter(prefix="/composer", tags=["composer"])
+logger = get_logger("composer")
 
 def generate_order_number(prefix: str = "C") -> str:
     """Generate unique order number with timestamp"""
     timestamp = datetime.now().strftime("%m%d%H%M")  # MMDDHHMM
-    return f"{prefix}-{timestamp}"
+    # Suffix keeps runs started in the same minute from being rejected as duplicates
+    return f"{prefix}-{timestamp}-{uuid.uuid4().hex[:4].upper()}"
 
 class DirectJobRequest(BaseModel):
     laserText: str = Field(..., min_length=1, max_length=50, description="Text to engrave")
     site: Literal["JOB_POS1", "JOB_POS2"] = Field(default="JOB_POS1", description="Target site")
+    powerPreset: Optional[str] = Field(default=None, description="Engraver power preset (default: engraver.default_powerPreset)")
 
 class BatchJobItem(BaseModel):
     laserText: str = Field(..., min_length=1, max_length=50, description="Text to engrave")
+    weightKg: Optional[float] = Field(default=None, gt=0, description="Payload weight (default: agv.job_weight_kg)")
+    powerPreset: Optional[str] = Field(default=None, description="Engraver power preset (default: engraver.default_powerPreset)")
 
 class BatchJobRequest(BaseModel):
-    jobs: List[BatchJobItem] = Field(..., min_items=1, max_items=5, description="Jobs for batch")
+    jobs: List[BatchJobItem] = Field(..., min_length=1, description="Jobs for batch; split into AGV loads by payload and admitted against the live queue limits")
     site: Literal["JOB_POS1", "JOB_POS2"] = Field(default="JOB_POS1", description="Target site for all jobs")
 
+def check_power_presets(names: List[Optional[str]]) -> None:
+    """Reject unknown power presets before a composer run starts"""
+    engraver = get_state().config["engraver"]
+    try:
+        for name in set(filter(None, names)):
+            resolve_preset(engraver, name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def admit_composer_jobs(state, jobs: List[EngraveJob], site: str) -> None:
+    """
+    Queue a composer run's jobs, all or none, with the same rejections as
+    /queue/enqueue; 400 for a batch that could never fit the queue limits
+    """
+    orch = state.orchestrator
+    limits = orch.queue_limits()
+    most = min(limits["max_per_site"], limits["max_length"])
+    if len(jobs) > most:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {most} jobs (queue.max_per_site / queue.max_length)")
+    reason = orch.admit_batch(jobs)
+    if reason == "duplicate":
+        raise HTTPException(status_code=409, detail="Order number is already queued")
+    if reason in ("site_full", "queue_full"):
+        # Per-site limit is the client's problem (429), a full queue is ours (503)
+        raise HTTPException(
+            status_code=429 if reason == "site_full" else 503,
+            detail=f"Queue is full for site {site}" if reason == "site_full" else "Queue is full",
+            headers={"Retry-After": str(int(limits["retry_after_s"]))}
+        )
+
 def run_composer_job_background(state, jobs: List[EngraveJob], site: str, run_id: str, source: str, mode: str):
     """Run composer job in background with progress tracking"""
     try:
@@ -45,14 +84,36 @@ def run_composer_job_background(state, jobs: List[EngraveJob], site: str, run_id
         }
         state.add_run_history(run_entry)
         
-        # Add jobs to queue (do not clear existing queue)
-        for job in jobs:
-            state.orchestrator.enqueue_job(job)
-        
-        # Acquire cycle lock to prevent concurrent cycles
-        with state.get_cycle_lock():
-            # Run the actual cycle
-            summary = run_cycle_for_site(state.orchestrator, site, max_jobs_in_cycle=len(jobs))
+        # Reserve a free engraver/AGV pair; other pairs keep running their own cycles
+        with state.fleet.pair() as (engraver, agv):
+            def record_billing(summary):
+                # Update cumulative billing for user jobs from the pair that ran the cycle
+                engraver_billing = engraver["usageBilling"]
+                agv_billing = agv["usageBilling"]
+                state.update_cumulative_billing(
+                    source, 
+                    engraver_billing, 
+                    agv_billing, 
+                    summary["jobsProcessed"]
+                )
+                
+                # Store individual job details
+                if "individualJobs" in summary:
+                    for job_detail in summary["individualJobs"]:
+                        state.add_individual_job({
+                            **job_detail,
+                            "source": source,
+                            "site": site,
+                            "run_id": run_id,
+                            "engraver_id": engraver["deviceId"],
+                            "agv_id": agv["deviceId"],
+                            "agv_distance_share": round(summary.get("agvBilledMeters", 0) / len(summary["individualJobs"]) if summary.get("individualJobs") else 0, 6),
+                            "agv_cost_share": round(summary.get("agvCostEUR", 0) / len(summary["individualJobs"]) if summary.get("individualJobs") else 0, 6)
+                        })
+            
+            # Run the actual cycle on the jobs this run admitted, not whichever are first at the site;
+            # its jobs are acknowledged only after record_billing has persisted their bill
+            summary = run_cycle_for_site(state.orchestrator.for_devices(engraver, agv), site, order_nos=[job.orderNo for job in jobs], on_billed=record_billing)
             
             # Add source metadata
             summary["source"] = source
@@ -73,32 +134,11 @@ def run_composer_job_background(state, jobs: List[EngraveJob], site: str, run_id
                     "jobsProcessed": summary["jobsProcessed"],
                     "cycleSummary": summary
                 })
-                
-                # Update cumulative billing for user jobs
-                engraver_billing = state.engraver["usageBilling"]
-                agv_billing = state.agv["usageBilling"]
-                state.update_cumulative_billing(
-                    source, 
-                    engraver_billing, 
-                    agv_billing, 
-                    summary["jobsProcessed"]
-                )
-                
-                # Store individual job details
-                if "individualJobs" in summary:
-                    for job_detail in summary["individualJobs"]:
-                        state.add_individual_job({
-                            **job_detail,
-                            "source": source,
-                            "site": site,
-                            "run_id": run_id,
-                            "agv_distance_share": round(summary.get("agvBilledMeters", 0) / len(summary["individualJobs"]) if summary.get("individualJobs") else 0, 6),
-                            "agv_cost_share": round(summary.get("agvCostEUR", 0) / len(summary["individualJobs"]) if summary.get("individualJobs") else 0, 6)
-                        })
         
         state.update_run_history(run_id, run_entry)
         
     except Exception as e:
+        logger.exception("Composer run failed", extra={"site": site})
         run_entry.update({
             "status": "error",
             "endedAt": datetime.now().isoformat(),
@@ -109,6 +149,8 @@ def run_composer_job_background(state, jobs: List[EngraveJob], site: str, run_id
 @router.post("/direct")
 async def run_direct_job(request: DirectJobRequest, background_tasks: BackgroundTasks):
     """Run a single job directly at specified site with real-time tracking"""
+    started = trace_clock()
+    check_power_presets([request.powerPreset])
     try:
         state = get_state()
         
@@ -117,18 +159,17 @@ async def run_direct_job(request: DirectJobRequest, background_tasks: Background
         run_id = f"direct_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{order_no}"
         
         # Create job
-        job = EngraveJob(order_no, request.laserText, request.site)
+        job = EngraveJob(order_no, request.laserText, request.site, powerPreset=request.powerPreset)
+        admit_composer_jobs(state, [job], request.site)
         
-        # Start background task for real-time tracking
+        # Start background task for real-time tracking, traced and profiled like /cycle/run
+        traces.start(run_id)
         background_tasks.add_task(
-            run_composer_job_background, 
-            state, 
-            [job], 
-            request.site, 
-            run_id, 
-            "direct", 
-            "individual"
+            run_traced,
+            run_id,
+            lambda: run_composer_job_background(state, [job], request.site, run_id, "direct", "individual")
         )
+        traces.record(run_id, "POST /api/v1/composer/direct", "api", started)
         
         return {
             "success": True,
@@ -139,37 +180,41 @@ async def run_direct_job(request: DirectJobRequest, background_tasks: Background
             "tracking_url": f"/api/v1/cycle/status/{run_id}"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start direct job: {str(e)}")
 
 @router.post("/batch")
 async def run_batch_jobs(request: BatchJobRequest, background_tasks: BackgroundTasks):
     """Run multiple jobs as a batch at the same site with real-time tracking"""
+    started = trace_clock()
+    check_power_presets([job_req.powerPreset for job_req in request.jobs])
     try:
         state = get_state()
         
         # Generate unique order numbers for each job and run ID
         order_numbers = []
         jobs = []
+        batch_no = generate_order_number("B")  # B for Batch
         
         for i, job_req in enumerate(request.jobs):
-            order_no = generate_order_number("B") + f"{i+1:02d}"  # B for Batch with sequence
+            order_no = f"{batch_no}-{i+1:02d}"  # with sequence
             order_numbers.append(order_no)
-            job = EngraveJob(order_no, job_req.laserText, request.site)
+            job = EngraveJob(order_no, job_req.laserText, request.site, job_req.weightKg, job_req.powerPreset)
             jobs.append(job)
         
-        run_id = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(jobs)}jobs"
+        run_id = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{batch_no}_{len(jobs)}jobs"
+        admit_composer_jobs(state, jobs, request.site)
         
-        # Start background task for real-time tracking
+        # Start background task for real-time tracking, traced and profiled like /cycle/run
+        traces.start(run_id)
         background_tasks.add_task(
-            run_composer_job_background, 
-            state, 
-            jobs, 
-            request.site, 
-            run_id, 
-            "batch", 
-            "batch"
+            run_traced,
+            run_id,
+            lambda: run_composer_job_background(state, jobs, request.site, run_id, "batch", "batch")
         )
+        traces.record(run_id, "POST /api/v1/composer/batch", "api", started)
         
         return {
             "success": True,
@@ -181,6 +226,8 @@ async def run_batch_jobs(request: BatchJobRequest, background_tasks: BackgroundT
             "tracking_url": f"/api/v1/cycle/status/{run_id}"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start batch jobs: {str(e)}")
 
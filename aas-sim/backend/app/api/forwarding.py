@@ -0,0 +1,116 @@
+"""Middlewares for shared-state mode: workers forward mutations to the owner, the owner publishes before responding"""
+from typing import Optional
+from urllib.parse import parse_qs
+import httpx
+from starlette.concurrency import run_in_threadpool
+from app.core.context import current_cell
+from app.core.shared import SharedStore, StatePublisher
+
+# Query parameters that turn a read into a long-poll parked on the owner's version clock
+LONG_POLL_PARAMS = ("wait", "waitFor", "sinceVersion")
+
+# Headers that describe one hop and must not be copied to the next
+HOP_HEADERS = {b"connection", b"keep-alive", b"transfer-encoding", b"te", b"trailer", b"upgrade", b"host", b"x-cell-id"}
+
+def must_forward(method: str, path: str, query_string: bytes) -> bool:
+    """True if a request has to be served by the owner rather than a replica"""
+    params = parse_qs(query_string.decode("latin-1"))
+    if path.startswith("/api/v1/profile"):
+        # Each process profiles the requests it serves; owner=true reaches the owner, which runs the cycles
+        return params.get("owner", ["false"])[0].lower() in ("1", "true", "yes", "on")
+    if method not in ("GET", "HEAD"):
+        return True
+    if path.startswith("/api/v1/cells"):
+        return True  # Cell management acts on the owner's cells
+    if path.startswith("/api/v1/history/") and path.endswith("/trace"):
+        return True  # Spans are recorded by the owner, which runs the cycles
+    if path.startswith("/api/v1/aas/") and path.endswith("/telemetry"):
+        return True  # So is telemetry
+    if params.get("wait", ["false"])[0].lower() in ("1", "true", "yes", "on"):
+        return True
+    return any(name in params for name in LONG_POLL_PARAMS if name != "wait")
+
+class ForwardingMiddleware:
+    """
+    Worker side. Reads are served from the local replica of the request's
+    cell; mutations, long-polls and requests for cells the owner has not
+    published yet are streamed to the owner process and back.
+    Must run inside CellMiddleware, which has already resolved the cell.
+    """
+
+    def __init__(self, app, owner_url: str, store: SharedStore):
+        self.app = app
+        self.owner_url = owner_url
+        self.store = store
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cell_id = current_cell.get()
+        if must_forward(scope["method"], scope["path"], scope["query_string"]) or self.store.head(cell_id)[1] is None:
+            await self.forward(scope, receive, send, cell_id)
+        else:
+            await self.app(scope, receive, send)
+
+    async def forward(self, scope, receive, send, cell_id: str):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.owner_url, timeout=None)
+
+        async def body():
+            more_body = True
+            while more_body:
+                message = await receive()
+                more_body = message.get("more_body", False)
+                if message.get("body"):
+                    yield message["body"]
+
+        headers = [(name, value) for name, value in scope["headers"] if name not in HOP_HEADERS]
+        headers.append((b"x-cell-id", cell_id.encode()))
+        request = self._client.build_request(
+            scope["method"],
+            scope["path"],
+            params=scope["query_string"].decode("latin-1"),
+            headers=headers,
+            content=body() if scope["method"] not in ("GET", "HEAD") else None
+        )
+        try:
+            response = await self._client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            await send({"type": "http.response.start", "status": 502, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": f"Owner process unavailable: {e}".encode()})
+            return
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [(name, value) for name, value in response.headers.raw if name.lower() not in HOP_HEADERS]
+            })
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.aclose()
+
+class PublishMiddleware:
+    """
+    Owner side. Publishes the request's changes before a mutation responds,
+    so any worker that receives a later request already sees them.
+    """
+
+    def __init__(self, app, publisher: StatePublisher):
+        self.app = app
+        self.publisher = publisher
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_after_publish(message):
+            if message["type"] == "http.response.start":
+                await run_in_threadpool(self.publisher.flush)
+            await send(message)
+
+        await self.app(scope, receive, send_after_publish)
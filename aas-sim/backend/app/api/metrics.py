@@ -0,0 +1,53 @@
+"""Prometheus metrics endpoint and per-route request latency"""
+from time import perf_counter
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import metrics
+
+router = APIRouter()
+
+REQUEST_SECONDS = metrics.histogram("aas_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def route_template(scope) -> str:
+    """Path template of the route that served a request, e.g. /api/v1/history/{run_id}"""
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Routes of included routers may carry only their own path; FastAPI records the prefixed one
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    return getattr(context, "path", None) or route.path
+
+class RequestMetricsMiddleware:
+    """
+    Times every HTTP request, labelled by the matched route template
+    (so /api/v1/history/{run_id} is one series, not one per run).
+    Must run inside CellMiddleware so cell-prefixed paths resolve to their route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.observe(perf_counter() - started, method=scope["method"], route=route_template(scope), status=str(status))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """GET all metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
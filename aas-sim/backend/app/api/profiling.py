@@ -0,0 +1,98 @@
+"""Profiling control endpoints and the middleware that profiles selected routes"""
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from app.core.profiling import profiler, PROFILE_MODES
+
+router = APIRouter()
+
+# Never profiled: the profiling endpoints themselves and the long-lived event stream
+UNPROFILED_PREFIXES = ("/api/v1/profile", "/api/v1/events")
+
+class ProfilingMiddleware:
+    """
+    Profiles requests whose path starts with one of the profiler's routes.
+    Requests share the event loop thread, so a profile only stands for its
+    request when no other request ran meanwhile; overlapped profiles are
+    discarded. While profiling is off a request costs one attribute check.
+    Must run inside CellMiddleware so cell-prefixed paths are matched by their route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = 0   # HTTP requests on the event loop, counted while profiling is on
+        self._started = 0
+
+    async def __call__(self, scope, receive, send):
+        # The event stream stays open for good and is left out, or it would void every profile
+        if not profiler.enabled or scope["type"] != "http" or scope["path"].startswith(UNPROFILED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        self._in_flight += 1
+        self._started += 1
+        try:
+            if not profiler.wants_route(scope["path"]):
+                await self.app(scope, receive, send)
+                return
+            alone, started = self._in_flight == 1, self._started
+            with profiler.profile(f"{scope['method']} {scope['path']}") as block:
+                await self.app(scope, receive, send)
+                if block is not None and not (alone and self._started == started):
+                    block.discard()
+        finally:
+            self._in_flight -= 1
+
+@router.get("")
+async def get_profile_status():
+    """GET profiling mode, targets and how much has been collected"""
+    return profiler.status()
+
+@router.post("/start")
+async def start_profiling(
+    mode: str = Query(default="sample", description="'sample' (stack sampling) or 'cprofile' (deterministic)"),
+    routes: Optional[List[str]] = Query(default=None, description="Path prefixes to profile (default /api/v1)"),
+    cycles: Optional[bool] = Query(default=None, description="Profile cycle runs"),
+    intervalMs: Optional[float] = Query(default=None, gt=0, description="Sampling interval in milliseconds")
+):
+    """POST enable profiling; data collected earlier is kept until DELETE"""
+    if mode not in PROFILE_MODES or mode == "off":
+        raise HTTPException(status_code=400, detail=f"Invalid mode '{mode}'. Available: ['sample', 'cprofile']")
+    profiler.configure(mode, routes, cycles, intervalMs / 1000 if intervalMs else None)
+    return profiler.status()
+
+@router.post("/stop")
+async def stop_profiling():
+    """POST disable profiling; collected data stays available"""
+    profiler.configure("off")
+    return profiler.status()
+
+@router.delete("")
+async def reset_profile():
+    """DELETE all collected samples and statistics"""
+    profiler.reset()
+    return profiler.status()
+
+@router.get("/collapsed", response_class=PlainTextResponse)
+async def get_collapsed_stacks():
+    """GET sampled stacks in collapsed format, for flamegraph.pl or speedscope"""
+    return PlainTextResponse(profiler.collapsed())
+
+@router.get("/pstats")
+async def get_pstats(
+    format: str = Query(default="text", pattern="^(text|binary)$", description="'text' report or 'binary' dump for snakeviz / pstats.Stats"),
+    sort: str = Query(default="cumulative", description="pstats sort key"),
+    limit: int = Query(default=50, ge=1, le=1000, description="Rows in the text report")
+):
+    """GET merged cProfile statistics of profiled routes and cycles"""
+    if format == "binary":
+        dump = profiler.pstats_dump()
+        if dump is None:
+            raise HTTPException(status_code=404, detail="No cProfile data collected; start profiling with mode=cprofile")
+        return Response(content=dump, media_type="application/octet-stream", headers={"Content-Disposition": 'attachment; filename="aas-sim.pstats"'})
+    try:
+        report = profiler.pstats_text(sort, limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Invalid sort key '{sort}'")
+    if report is None:
+        raise HTTPException(status_code=404, detail="No cProfile data collected; start profiling with mode=cprofile")
+    return PlainTextResponse(report)
@@ -1,55 +1,104 @@
 """AAS API endpoints for device data access"""
-from fastapi import APIRouter, HTTPException
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Response, Request, Query
+from typing import Optional, Dict, Any
 from app.core.state import get_state
+from app.models import DeviceBatchReadRequest, DeviceCreateRequest
+from app.core.cache import response_cache, encode_json
+from app.core.versioning import versions, submodel_key, make_etag, etag_matches, DEVICE_SUBMODELS
+from app.core.telemetry import telemetry
+from datetime import datetime, timezone
 
 router = APIRouter()
 
-@router.get("/{device}/operational/status")
-async def get_operational_status(device: str):
-    """GET operational status for a device"""
+# Longest time a client may park a long-poll request
+MAX_WAIT_S = 60.0
+
+async def submodel_response(request: Request, device: str, submodel: str, wait: bool, timeout: float) -> Response:
+    """
+    Serve one device submodel with a strong ETag.
+    If-None-Match with the current ETag answers 304 without building a body;
+    with wait=true the request is parked until the submodel changes or the timeout expires.
+    """
     state = get_state()
-    device_data = state.get_device(device)
-    if not device_data:
+    device_id = state.resolve_device_id(device)
+    if not device_id:
         raise HTTPException(status_code=404, detail=f"Device '{device}' not found")
     
-    return device_data["operationalData"]["status"]
+    key = submodel_key(device_id, submodel)
+    version = versions.get(key)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, make_etag(key, version)):
+        if wait:
+            version = await versions.wait_for_change(key, version, min(timeout, MAX_WAIT_S))
+        etag = make_etag(key, version)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+    
+    body = state.get_submodel(device_id, submodel)
+    return Response(content=encode_json(body), media_type="application/json", headers={"ETag": make_etag(key, version)})
+
+@router.get("/{device}/operational/status")
+async def get_operational_status(request: Request, device: str, wait: bool = False, timeout: float = Query(default=30.0, gt=0)):
+    """GET operational status for a device"""
+    return await submodel_response(request, device, "status", wait, timeout)
 
 @router.get("/{device}/operational/order")
-async def get_operational_order(device: str):
+async def get_operational_order(request: Request, device: str, wait: bool = False, timeout: float = Query(default=30.0, gt=0)):
     """GET operational order for a device"""
-    state = get_state()
-    device_data = state.get_device(device)
-    if not device_data:
-        raise HTTPException(status_code=404, detail=f"Device '{device}' not found")
-    
-    return device_data["operationalData"]["order"]
+    return await submodel_response(request, device, "order", wait, timeout)
 
 @router.get("/{device}/operational/pose")
-async def get_operational_pose(device: str):
+async def get_operational_pose(request: Request, device: str, wait: bool = False, timeout: float = Query(default=30.0, gt=0)):
     """GET operational pose for a device"""
-    state = get_state()
-    device_data = state.get_device(device)
-    if not device_data:
-        raise HTTPException(status_code=404, detail=f"Device '{device}' not found")
-    
-    return device_data["operationalData"]["pose"]
+    return await submodel_response(request, device, "pose", wait, timeout)
 
 @router.get("/{device}/billing")
-async def get_billing_data(device: str):
+async def get_billing_data(request: Request, device: str, wait: bool = False, timeout: float = Query(default=30.0, gt=0)):
     """GET billing data for a device"""
+    return await submodel_response(request, device, "billing", wait, timeout)
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds from an ISO8601 timestamp (UTC if it has no offset) or a number"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time '{value}'")
+    return (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).timestamp()
+
+@router.get("/{device}/telemetry")
+async def get_telemetry(
+    device: str,
+    start: Optional[str] = Query(default=None, alias="from", description="Earliest sample (ISO8601 or epoch seconds)"),
+    end: Optional[str] = Query(default=None, alias="to", description="Latest sample (ISO8601 or epoch seconds)"),
+    points: int = Query(default=500, ge=0, le=100000, description="Downsample to at most this many samples (0: all)"),
+    by: Optional[str] = Query(default=None, pattern="^(pose|progress)$", description="Shape LTTB keeps (default: pose for AGVs, progress otherwise)")
+):
+    """GET recent pose, progress and mode samples of a device as columns, one per heartbeat"""
     state = get_state()
-    device_data = state.get_device(device)
-    if not device_data:
+    device_id = state.resolve_device_id(device)
+    if not device_id:
         raise HTTPException(status_code=404, detail=f"Device '{device}' not found")
-    
-    return device_data["usageBilling"]
+    if by is None:
+        by = "pose" if state.get_device(device_id)["deviceType"] == "AGV" else "progress"
+    return telemetry.query(device_id, parse_time(start), parse_time(end), points, by)
 
 @router.get("/combined-billing")
 async def get_combined_billing():
     """GET combined billing data - prioritizes user jobs over scenarios"""
     state = get_state()
-    
+    # Only the billing submodels, so heartbeats and moves do not rebuild it
+    version = versions.snapshot("billing", submodel_key(state.engraver["deviceId"], "billing"), submodel_key(state.agv["deviceId"], "billing"))
+    body = response_cache.get_or_build(("combined-billing",), version, lambda: build_combined_billing(state))
+    return Response(content=body, media_type="application/json")
+
+def build_combined_billing(state) -> Dict[str, Any]:
+    """Build combined billing payload"""
     engraver = state.get_device("engraver")
     agv = state.get_device("agv")
     
@@ -130,7 +179,11 @@ async def get_combined_billing():
 async def get_individual_jobs(source: Optional[str] = None):
     """GET individual job details for billing breakdown"""
     state = get_state()
-    
+    body = response_cache.get_or_build(("individual-jobs", source), versions.snapshot("jobs"), lambda: build_individual_jobs(state, source))
+    return Response(content=body, media_type="application/json")
+
+def build_individual_jobs(state, source: Optional[str]) -> Dict[str, Any]:
+    """Build individual jobs payload with totals"""
     individual_jobs = state.get_individual_jobs(source)
     
     # Calculate totals
@@ -155,6 +208,36 @@ async def get_individual_jobs(source: Optional[str] = None):
         "last_updated": individual_jobs[-1]["timestamp"] if individual_jobs else None
     }
 
+@router.get("/registry")
+async def list_registered_devices(deviceType: Optional[str] = None, status: Optional[str] = None):
+    """GET registered devices, optionally filtered by deviceType and operationMode"""
+    state = get_state()
+    devices = state.list_devices(deviceType, status)
+    return {"devices": devices, "count": len(devices)}
+
+@router.post("/registry", status_code=201)
+async def register_device(request: DeviceCreateRequest):
+    """POST create a device from the engraver/AGV template"""
+    state = get_state()
+    device = state.add_device(request.deviceType, request.deviceId)
+    if device is None:
+        raise HTTPException(status_code=409, detail=f"Device '{request.deviceId}' already exists")
+    return device
+
+@router.delete("/registry/{device_id}")
+async def unregister_device(device_id: str):
+    """DELETE remove a non-primary device"""
+    state = get_state()
+    if not state.remove_device(device_id):
+        raise HTTPException(status_code=404, detail=f"Device '{device_id}' not found or is a primary device")
+    return {"message": f"Device {device_id} removed"}
+
+@router.post("/batch-read")
+async def batch_read_devices(request: DeviceBatchReadRequest):
+    """POST read projected fields from many devices against one consistent snapshot"""
+    state = get_state()
+    return state.project_devices(request.fields, request.devices)
+
 @router.post("/reset-user-billing") 
 async def reset_user_billing():
     """Reset cumulative user job billing"""
@@ -170,8 +253,9 @@ async def reset_user_billing():
 async def get_all_devices():
     """GET all device data"""
     state = get_state()
-    
-    return {
+    version = versions.snapshot(*(submodel_key(device["deviceId"], submodel) for device in (state.engraver, state.agv) for submodel in DEVICE_SUBMODELS))
+    body = response_cache.get_or_build(("devices",), version, lambda: {
         "engraver": state.get_device("engraver"),
         "agv": state.get_device("agv")
-    }
\ No newline at end of file
+    })
+    return Response(content=body, media_type="application/json")
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Capacity planning endpoints: simulate shifts in virtual time to size the fleet"""
+from typing import Any, Dict
+from fastapi import APIRouter, HTTPException
+from app.core.state import get_state
+from app.core.capacity import simulate_shift, size_fleet, optimise_batching, job_sites, shift_start
+from app.core.fleet import BatchingPolicy
+from app.models import CapacitySimulationRequest, FleetSizingRequest, BatchingOptimisationRequest
+
+router = APIRouter()
+
+# Simulations are CPU-bound: plain def endpoints run in FastAPI's threadpool, off the event loop
+
+def _options(request: CapacitySimulationRequest) -> Dict[str, Any]:
+    return {
+        "policy": BatchingPolicy(request.maxJobs, request.minBatch, request.maxWaitS, request.maxAgvCostPerJob),
+        "job_mix": request.jobMix,
+        "site_mix": request.siteMix,
+        "shift_s": request.shiftHours * 3600,
+        "seed": request.seed,
+        "start_at": shift_start(request.startAt)
+    }
+
+@router.post("/simulate")
+def simulate_capacity(request: CapacitySimulationRequest):
+    """POST simulate one shift with the cell's config and layout; nothing in the cell changes"""
+    state = get_state()
+    try:
+        return simulate_shift(state.config, state.coords, request.arrivalRatePerHour, pairs=request.pairs or state.fleet.pair_count(), **_options(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/size")
+def size_capacity(request: FleetSizingRequest):
+    """POST find the fewest device pairs whose p95 queue wait meets the target"""
+    state = get_state()
+    try:
+        return size_fleet(state.config, state.coords, request.arrivalRatePerHour, max_pairs=request.maxPairs, target_p95_wait_s=request.targetP95WaitS, **_options(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/batching")
+def optimise_batching_policy(request: BatchingOptimisationRequest):
+    """
+    POST search batching policies (fixed size, time window, AGV cost threshold)
+    for the current queue and config; recommend the cheapest per job within
+    the p95 wait bound and, with apply, make it the dispatch policy
+    """
+    state = get_state()
+    sites = set(job_sites(state.coords))
+    backlog = [(len(job["laserText"]), job["site"]) for job in state.orchestrator.get_queue_jobs() if job["site"] in sites]
+    try:
+        result = optimise_batching(
+            state.config, state.coords, backlog, request.maxP95WaitS,
+            arrival_rate_per_h=request.arrivalRatePerHour,
+            pairs=request.pairs or state.fleet.pair_count(),
+            job_mix=request.jobMix,
+            site_mix=request.siteMix,
+            shift_s=request.shiftHours * 3600,
+            seed=request.seed,
+            start_at=shift_start(request.startAt)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # A policy without a time trigger could hold a site's jobs forever once arrivals stop
+    result["applied"] = request.apply and result["recommended"]["feasible"] and result["recommended"]["policy"]["max_wait_s"] is not None
+    if result["applied"]:
+        state.update_config({"batching": result["recommended"]["policy"]})
+    return result
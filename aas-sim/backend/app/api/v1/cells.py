@@ -0,0 +1,76 @@
+"""Multi-cell routing and cell management endpoints"""
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+from app.core.cells import CELL_ID_PATTERN
+from app.core.context import DEFAULT_CELL, current_cell
+from app.core.state import cells
+
+router = APIRouter()
+
+CELLS_PREFIX = "/api/v1/cells/"
+CELL_HEADER = b"x-cell-id"
+
+class CellMiddleware:
+    """
+    Selects the cell a request runs against, either from a
+    /api/v1/cells/{cellId}/... path prefix (rewritten to /api/v1/...)
+    or from an X-Cell-Id header. Requests naming neither use the default cell.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        cell_id = dict(scope.get("headers") or []).get(CELL_HEADER, b"").decode("latin-1") or DEFAULT_CELL
+        path = scope["path"]
+        if path.startswith(CELLS_PREFIX):
+            prefixed_id, _, rest = path[len(CELLS_PREFIX):].partition("/")
+            if rest:
+                cell_id = prefixed_id
+                scope = {**scope, "path": f"/api/v1/{rest}", "raw_path": f"/api/v1/{rest}".encode()}
+
+        if not CELL_ID_PATTERN.match(cell_id):
+            response = JSONResponse(status_code=400, content={"detail": f"Invalid cell ID '{cell_id}'"})
+            await response(scope, receive, send)
+            return
+
+        token = current_cell.set(cell_id)
+        try:
+            with cells.active(cell_id):
+                await self.app(scope, receive, send)
+        finally:
+            current_cell.reset(token)
+
+@router.get("")
+async def list_cells():
+    """GET loaded and stored cells"""
+    return cells.list_cells()
+
+@router.post("/evict")
+async def evict_cells(cellId: Optional[str] = Query(default=None, description="Cell to evict; every cell idle past the TTL if omitted")):
+    """POST write cells to storage and drop them from memory"""
+    if cellId is None:
+        return {"evicted": cells.evict_idle()}
+    if cells.loaded(cellId) is None:
+        raise HTTPException(status_code=404, detail=f"Cell {cellId} is not loaded")
+    if not cells.evict(cellId):
+        raise HTTPException(status_code=409, detail=f"Cell {cellId} is in use or is the default cell")
+    return {"evicted": [cellId]}
+
+@router.delete("/{cell_id}")
+async def delete_cell(cell_id: str):
+    """DELETE a cell and its storage"""
+    if cell_id == DEFAULT_CELL:
+        raise HTTPException(status_code=400, detail="The default cell cannot be deleted")
+    if not CELL_ID_PATTERN.match(cell_id):
+        raise HTTPException(status_code=400, detail=f"Invalid cell ID '{cell_id}'")
+    if cells.loaded(cell_id) is None and cell_id not in cells.stored():
+        raise HTTPException(status_code=404, detail=f"Cell {cell_id} not found")
+    if not cells.delete(cell_id):
+        raise HTTPException(status_code=409, detail=f"Cell {cell_id} is in use")
+    return {"message": f"Cell {cell_id} deleted", "cellId": cell_id}
@@ -1,7 +1,10 @@
 """Configuration management API endpoints"""
-from fastapi import APIRouter
+import time
+from fastapi import APIRouter, HTTPException
 from app.core.state import get_state
-from app.models import ConfigUpdateRequest
+from app.core.tariff import load_schedule
+from app.core.presets import preset_table, quote_jobs
+from app.models import ConfigUpdateRequest, QuoteRequest
 from app.core.rules import DEFAULT_CONFIG, DEFAULT_COORDS
 
 router = APIRouter()
@@ -26,14 +29,30 @@ async def update_config(request: ConfigUpdateRequest):
         updates["currency"] = request.currency
     if request.engraver is not None:
         updates["engraver"] = request.engraver.dict(exclude_unset=True)
+        # Reject a schedule file that cannot be loaded before jobs start billing against it
+        for key in ("tariff_file", "emission_factor_file"):
+            if updates["engraver"].get(key):
+                try:
+                    load_schedule(updates["engraver"][key])
+                except (ValueError, KeyError, OSError) as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid {key}: {e}")
     if request.agv is not None:
         updates["agv"] = request.agv.dict(exclude_unset=True)
+    if request.queue is not None:
+        updates["queue"] = request.queue.dict(exclude_unset=True)
+    if request.batching is not None:
+        updates["batching"] = request.batching.dict(exclude_unset=True)
     if request.progress_step is not None:
         updates["progress_step"] = request.progress_step
     if request.poll_interval_s is not None:
         updates["poll_interval_s"] = request.poll_interval_s
+    if request.time_scale is not None:
+        updates["time_scale"] = request.time_scale
     
-    updated_config = state.update_config(updates)
+    try:
+        updated_config = state.update_config(updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "message": "Configuration updated successfully",
@@ -41,6 +60,25 @@ async def update_config(request: ConfigUpdateRequest):
         "coords": state.coords
     }
 
+@router.get("/presets")
+async def get_power_presets():
+    """GET power presets with the per-letter speed their tables were built from"""
+    state = get_state()
+    engraver = state.config["engraver"]
+    return {
+        "default": engraver.get("default_powerPreset"),
+        "presets": [preset_table(engraver, name).to_dict() for name in engraver.get("power_presets") or {}]
+    }
+
+@router.post("/presets/quote")
+async def quote_power_presets(request: QuoteRequest):
+    """POST engraving time, energy, cost and CO2 of jobs (run back to back from now) without running them"""
+    state = get_state()
+    try:
+        return quote_jobs(state.config, state.get_device("engraver")["usageBilling"], [(job.laserText, job.powerPreset) for job in request.jobs], time.time())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/coords")
 async def get_coordinates():
     """GET coordinate system"""
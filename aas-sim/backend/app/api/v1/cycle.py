@@ -1,16 +1,99 @@
 """Cycle execution API endpoints"""
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Query
-from app.core.state import get_state
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Response
+from app.core.state import get_state, cells
+from app.core.cache import encode_json
+from app.core.versioning import versions
 from app.core.orchestrator import run_cycle_for_site, run_scenario_1, run_scenario_2
+from app.core.fleet import dispatchable_sites, billed_round_trip_cost, BatchingPolicy
+from app.core.tracing import traces, trace_run, trace_clock
+from app.core.profiling import profiler
+from app.core.logging import get_logger, log_context
+from app.core.context import current_cell
 from app.models import CycleSummaryResponse
 from datetime import datetime
+from contextvars import copy_context
 import threading
-from typing import Optional
+import uuid
+import asyncio
+from typing import Dict, Optional, Tuple
 
 router = APIRouter()
+logger = get_logger("cycle")
+
+# Run statuses after which a run no longer changes
+TERMINAL_STATUSES = {"completed", "error", "no_jobs", "interrupted"}
+
+# Longest time a client may park a long-poll request
+MAX_WAIT_S = 120.0
+
+# (cell, site) -> timer that re-checks a held site once its oldest job has waited max_wait_s
+_release_timers: Dict[Tuple[str, str], threading.Timer] = {}
+_release_lock = threading.Lock()
+
+def parse_max_jobs(maxJobs: Optional[str], policy: BatchingPolicy) -> Optional[int]:
+    """Jobs per cycle from the maxJobs parameter: a number, 'all', or the batching policy's when omitted"""
+    if maxJobs is None:
+        return policy.max_jobs
+    return int(maxJobs) if maxJobs.isdigit() else None
+
+def run_traced(run_id: str, func) -> None:
+    """
+    Run func() with its spans recorded in the run's trace and its log records
+    tagged with the runId; the cell stays loaded until it returns
+    """
+    with cells.active(current_cell.get()), trace_run(run_id), log_context(runId=run_id):
+        if profiler.wants_cycles():
+            with profiler.profile("cycle"):
+                func()
+        else:
+            func()
+
+def start_dispatch(state, site: str, max_jobs: Optional[int]) -> str:
+    """Start a dispatched cycle for a site in its own thread; returns its run id"""
+    # Concurrent dispatches in the same second must not share a run id
+    run_id = f"dispatch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{site}_{uuid.uuid4().hex[:8]}"
+    traces.start(run_id)
+    # The thread runs in and holds the current cell; it blocks until a pair frees up if all are busy
+    cells.start_thread(run_cycle_background, state, site, max_jobs, run_id)
+    return run_id
+
+def schedule_release(site: str, delay_s: float) -> None:
+    """
+    Re-check a held site of the current cell after delay_s, so its max_wait_s
+    trigger fires without another /dispatch. One timer per site at a time.
+    """
+    key = (current_cell.get(), site)
+    with _release_lock:
+        if key in _release_timers:
+            return
+        timer = threading.Timer(max(0.0, delay_s), copy_context().run, args=(release_held_site, site))
+        timer.daemon = True
+        _release_timers[key] = timer
+    timer.start()
+
+def release_held_site(site: str) -> None:
+    """Dispatch a held site if the batching policy now allows it, else wait for its oldest job again"""
+    cell_id = current_cell.get()
+    with _release_lock:
+        _release_timers.pop((cell_id, site), None)
+    if cells.loaded(cell_id) is None:
+        return   # evicted or deleted since; the next /dispatch holds the site again
+    with cells.active(cell_id):
+        state = get_state()
+        policy = BatchingPolicy.from_config(state.config)
+        queued = state.orchestrator.get_queue_stats()["siteDepth"].get(site, 0)
+        wait_s = state.orchestrator.oldest_wait_s(site)
+        if policy.ready(queued, wait_s, billed_round_trip_cost(state.config, state.coords, site)):
+            run_id = start_dispatch(state, site, policy.max_jobs)
+            logger.info("Released held site", extra={"site": site, "runId": run_id, "queued": queued})
+        elif queued and policy.max_wait_s is not None:
+            schedule_release(site, policy.max_wait_s - wait_s)
 
 def run_cycle_background(state, site: str, max_jobs: Optional[int], run_id: str):
-    """Run cycle in background thread"""
+    """Run cycle in background thread, recording its spans in the run's trace"""
+    run_traced(run_id, lambda: _run_cycle(state, site, max_jobs, run_id))
+
+def _run_cycle(state, site: str, max_jobs: Optional[int], run_id: str):
     try:
         # Add run to history
         run_entry = {
@@ -26,10 +109,10 @@ def run_cycle_background(state, site: str, max_jobs: Optional[int], run_id: str)
         }
         state.add_run_history(run_entry)
         
-        # Acquire cycle lock to prevent concurrent cycles
-        with state.get_cycle_lock():
+        # Reserve a free engraver/AGV pair; other pairs keep running their own cycles
+        with state.fleet.pair() as (engraver, agv):
             # Run the actual cycle
-            summary = run_cycle_for_site(state.orchestrator, site, max_jobs)
+            summary = run_cycle_for_site(state.orchestrator.for_devices(engraver, agv), site, max_jobs)
             
             if "error" in summary:
                 # No jobs found
@@ -50,6 +133,7 @@ def run_cycle_background(state, site: str, max_jobs: Optional[int], run_id: str)
         state.update_run_history(run_id, run_entry)
         
     except Exception as e:
+        logger.exception("Cycle failed", extra={"site": site})
         run_entry.update({
             "status": "error",
             "endedAt": datetime.now().isoformat(),
@@ -61,9 +145,10 @@ def run_cycle_background(state, site: str, max_jobs: Optional[int], run_id: str)
 async def run_cycle(
     background_tasks: BackgroundTasks,
     site: str = Query(default="JOB_POS1", description="Site to run cycle for"),
-    maxJobs: Optional[str] = Query(default="all", description="Maximum jobs to process or 'all'")
+    maxJobs: Optional[str] = Query(default=None, description="Maximum jobs to process or 'all' (default: the batching policy's max_jobs)")
 ):
     """POST run a cycle for a specific site"""
+    started = trace_clock()
     state = get_state()
     
     # Validate site
@@ -71,36 +156,108 @@ async def run_cycle(
         raise HTTPException(status_code=400, detail=f"Invalid site '{site}'. Available: {list(state.coords.keys())}")
     
     # Check if there are jobs for the site
-    site_jobs = [j for j in state.orchestrator.get_queue_jobs() if j["site"] == site]
-    if not site_jobs:
+    site_depth = state.orchestrator.site_depth(site)
+    if not site_depth:
         raise HTTPException(status_code=400, detail=f"No jobs in queue for site {site}")
     
     # Parse maxJobs
-    max_jobs_int = None if maxJobs == "all" else int(maxJobs) if maxJobs.isdigit() else None
+    max_jobs_int = parse_max_jobs(maxJobs, BatchingPolicy.from_config(state.config))
     
-    # Generate run ID
-    run_id = f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{site}"
+    # Generate run ID; like dispatched runs, a random suffix keeps runs started in the same second apart
+    run_id = f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{site}_{uuid.uuid4().hex[:8]}"
     
     # Start background task
+    traces.start(run_id)
     background_tasks.add_task(run_cycle_background, state, site, max_jobs_int, run_id)
+    traces.record(run_id, "POST /api/v1/cycle/run", "api", started)
     
     return {
         "message": f"Cycle started for site {site}",
         "runId": run_id,
         "site": site,
-        "estimatedJobs": min(len(site_jobs), max_jobs_int or len(site_jobs))
+        "estimatedJobs": min(site_depth, max_jobs_int or site_depth)
+    }
+
+@router.post("/dispatch")
+async def dispatch_cycles(
+    maxJobs: Optional[str] = Query(default=None, description="Maximum jobs per cycle or 'all' (default: the batching policy's max_jobs)"),
+    force: bool = Query(default=False, description="Dispatch every site with queued jobs, even if the batching policy would hold it")
+):
+    """POST start one cycle per site whose batching policy is met, spread across free engraver/AGV pairs"""
+    started = trace_clock()
+    state = get_state()
+    policy = BatchingPolicy.from_config(state.config)
+    max_jobs_int = parse_max_jobs(maxJobs, policy)
+    
+    site_depth = state.orchestrator.get_queue_stats()["siteDepth"]
+    sites = dispatchable_sites(site_depth, state.coords)
+    if not sites:
+        raise HTTPException(status_code=400, detail="No jobs in queue")
+    
+    # Sites the batching policy holds back keep collecting jobs; max_wait_s releases them on a timer
+    held = []
+    if not force:
+        ready = []
+        for site in sites:
+            wait_s = state.orchestrator.oldest_wait_s(site)
+            if policy.ready(site_depth[site], wait_s, billed_round_trip_cost(state.config, state.coords, site)):
+                ready.append(site)
+            else:
+                held.append({"site": site, "queued": site_depth[site], "oldestWaitS": round(wait_s, 3)})
+                if policy.max_wait_s is not None:
+                    schedule_release(site, policy.max_wait_s - wait_s)
+        sites = ready
+    
+    runs = [{"runId": start_dispatch(state, site, max_jobs_int), "site": site} for site in sites]
+    
+    for run in runs:
+        traces.record(run["runId"], "POST /api/v1/cycle/dispatch", "api", started, {"runs": len(runs)})
+    
+    return {
+        "message": f"Dispatched {len(runs)} cycles across {state.fleet.pair_count()} device pairs",
+        "runs": runs,
+        "held": held,
+        "policy": policy.to_dict(),
+        "fleet": state.fleet.stats()
     }
 
 @router.get("/status/{run_id}")
-async def get_cycle_status(run_id: str):
-    """GET status of a specific cycle run"""
+async def get_cycle_status(
+    run_id: str,
+    waitFor: Optional[str] = Query(default=None, pattern="^terminal$", description="Long-poll until the run reaches a terminal status"),
+    sinceVersion: Optional[int] = Query(default=None, ge=0, description="Long-poll until the run's version exceeds this value"),
+    timeout: float = Query(default=30.0, gt=0, description="Maximum seconds to wait")
+):
+    """
+    GET status of a specific cycle run.
+    With waitFor=terminal or sinceVersion the request is parked until the run
+    changes accordingly or the timeout expires; X-Run-Version carries the version served.
+    """
+    started = trace_clock()
     state = get_state()
+    key = f"run:{run_id}"
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(timeout, MAX_WAIT_S)
+    
+    while True:
+        version = versions.get(key)
+        status = state.get_run_status(run_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f"Run '{run_id}' not found")
+        
+        waiting_for_terminal = waitFor == "terminal" and status not in TERMINAL_STATUSES
+        waiting_for_version = sinceVersion is not None and version <= sinceVersion
+        remaining = deadline - loop.time()
+        if not (waiting_for_terminal or waiting_for_version) or remaining <= 0:
+            break
+        await versions.wait_for_change(key, version, remaining)
     
     run_history = state.get_run_history(run_id)
-    if not run_history:
+    if run_history is None:
+        # Cleared while the request was parked
         raise HTTPException(status_code=404, detail=f"Run '{run_id}' not found")
-    
-    return run_history
+    traces.record(run_id, "GET /api/v1/cycle/status/{run_id}", "api", started, {"waitFor": waitFor, "sinceVersion": sinceVersion})
+    return Response(content=encode_json(run_history), media_type="application/json", headers={"X-Run-Version": str(version)})
 
 @router.get("/status")
 async def get_current_status():
@@ -113,7 +270,8 @@ async def get_current_status():
         "engraver_progress": state.engraver["operationalData"]["status"]["productionProgress"],
         "agv_progress": state.agv["operationalData"]["status"]["productionProgress"],
         "queue_length": len(state.orchestrator.queue),
-        "billing_window_active": state.orchestrator.billing_window_active,
+        "billing_window_active": state.fleet.billing_window_active(),
+        "fleet": state.fleet.stats(),
         "agv_pose": state.agv["operationalData"]["pose"]
     }
 
@@ -172,6 +330,7 @@ async def run_scenario_1_endpoint(background_tasks: BackgroundTasks):
             state.update_run_history(run_id, run_entry)
             
         except Exception as e:
+            logger.exception("Scenario failed")
             run_entry.update({
                 "status": "error",
                 "endedAt": datetime.now().isoformat(),
@@ -179,7 +338,8 @@ async def run_scenario_1_endpoint(background_tasks: BackgroundTasks):
             })
             state.update_run_history(run_id, run_entry)
     
-    background_tasks.add_task(scenario1_background)
+    traces.start(run_id)
+    background_tasks.add_task(run_traced, run_id, scenario1_background)
     
     return {
         "message": "Scenario 1 started: Multiple jobs at same site",
@@ -259,6 +419,7 @@ async def run_scenario_2_endpoint(background_tasks: BackgroundTasks):
             state.update_run_history(run_id, run_entry)
             
         except Exception as e:
+            logger.exception("Scenario failed")
             run_entry.update({
                 "status": "error",
                 "endedAt": datetime.now().isoformat(),
@@ -266,7 +427,8 @@ async def run_scenario_2_endpoint(background_tasks: BackgroundTasks):
             })
             state.update_run_history(run_id, run_entry)
     
-    background_tasks.add_task(scenario2_background)
+    traces.start(run_id)
+    background_tasks.add_task(run_traced, run_id, scenario2_background)
     
     return {
         "message": "Scenario 2 started: Jobs at two different sites",
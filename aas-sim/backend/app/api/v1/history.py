@@ -1,33 +1,62 @@
 """History and export API endpoints"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
 from app.core.state import get_state
+from app.core.cache import response_cache, encode_json
+from app.core.versioning import versions
+from app.core.tracing import traces
+from app.core.tariff import Schedule, billing_schedules, load_schedule, rebill
+from app.models import RebillRequest
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import base64
+import binascii
 import json
 import io
+import time
 import csv
+import zlib
 
 router = APIRouter()
 
+def encode_cursor(key: Tuple[str, str]) -> str:
+    """Encode a history index key as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode an opaque cursor back into a history index key"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        started_at, run_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(started_at), str(run_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("")
-async def get_history(limit: Optional[int] = 50):
-    """GET run history with pagination"""
+async def get_history(
+    limit: Optional[int] = Query(default=50, ge=0, description="Page size (0 returns all runs)"),
+    cursor: Optional[str] = Query(default=None, description="Opaque cursor from a previous page's nextCursor"),
+    site: Optional[str] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None
+):
+    """GET run history, newest first, with cursor pagination and filters"""
     state = get_state()
+    filters = {"site": site, "status": status, "source": source}
     
-    history_dict = state.get_run_history()
-    history_list = list(history_dict.values())
-    
-    # Sort by start time, most recent first
-    history_list.sort(key=lambda x: x.get("startedAt", ""), reverse=True)
-    
-    if limit:
-        history_list = history_list[:limit]
+    # total counts the runs matching the filters, not the whole history
+    total = state.count_run_history(filters)
+    history_list, next_key = state.query_run_history(
+        limit or max(total, 1),
+        decode_cursor(cursor) if cursor else None,
+        filters
+    )
     
     return {
         "history": history_list,
-        "total": len(history_dict),
-        "showing": len(history_list)
+        "total": total,
+        "showing": len(history_list),
+        "nextCursor": encode_cursor(next_key) if next_key else None
     }
 
 @router.get("/{run_id}")
@@ -41,101 +70,197 @@ async def get_run_details(run_id: str):
     
     return run_data
 
-@router.get("/export/json")
-async def export_history_json(limit: Optional[int] = None):
-    """Export run history as JSON"""
-    state = get_state()
-    
-    history_dict = state.get_run_history()
-    history_list = list(history_dict.values())
-    history_list.sort(key=lambda x: x.get("startedAt", ""), reverse=True)
-    
-    if limit:
-        history_list = history_list[:limit]
+@router.get("/{run_id}/trace")
+async def get_run_trace(run_id: str):
+    """
+    GET the spans recorded for a run as Chrome trace-event JSON
+    (open in chrome://tracing or ui.perfetto.dev). Only recent runs of this process are kept.
+    """
+    trace = traces.get(run_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No trace recorded for run '{run_id}'")
     
-    export_data = {
-        "exportTime": datetime.now().isoformat(),
-        "totalRuns": len(history_dict),
-        "exportedRuns": len(history_list),
-        "history": history_list
-    }
-    
-    json_str = json.dumps(export_data, indent=2)
-    
-    return StreamingResponse(
-        io.StringIO(json_str),
+    return Response(
+        content=encode_json(trace.chrome_trace()),
         media_type="application/json",
-        headers={"Content-Disposition": f"attachment; filename=aas_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"}
+        headers={"Content-Disposition": f'attachment; filename="{run_id}.trace.json"'}
     )
 
-@router.get("/export/csv")
-async def export_history_csv(limit: Optional[int] = None):
-    """Export run history as CSV"""
-    state = get_state()
-    
-    history_dict = state.get_run_history()
-    history_list = list(history_dict.values())
-    history_list.sort(key=lambda x: x.get("startedAt", ""), reverse=True)
-    
-    if limit:
-        history_list = history_list[:limit]
-    
-    # Create CSV content
-    output = io.StringIO()
-    fieldnames = [
-        'runId', 'site', 'startedAt', 'endedAt', 'status', 
-        'jobsProcessed', 'agvBilledMeters', 'agvCostEUR', 
-        'engraverEnergyKWh', 'engraverCO2g', 'engraverCostEUR', 
-        'combinedCostEUR', 'error'
-    ]
+# Exports are flushed in chunks of roughly this many characters
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+CSV_FIELDNAMES = [
+    'runId', 'site', 'startedAt', 'endedAt', 'status', 
+    'jobsProcessed', 'agvBilledMeters', 'agvCostEUR', 
+    'engraverEnergyKWh', 'engraverCO2g', 'engraverCostEUR', 
+    'combinedCostEUR', 'error'
+]
+
+def iter_runs(state, run_ids: List[str]) -> Iterator[Dict[str, Any]]:
+    """Yield runs one at a time from a snapshot of run IDs, skipping runs deleted meanwhile"""
+    for run_id in run_ids:
+        run = state.get_run_history(run_id)
+        if run is not None:
+            yield run
+
+def chunked(pieces: Iterable[str], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Join small string pieces into bounded byte chunks"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+def gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a byte stream on the fly into gzip format"""
+    compressor = zlib.compressobj(wbits=31)  # 16 + MAX_WBITS -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def json_pieces(state, run_ids: List[str]) -> Iterator[str]:
+    total = state.count_run_history()
+    yield (
+        "{\n"
+        f'  "exportTime": {json.dumps(datetime.now().isoformat())},\n'
+        f'  "totalRuns": {total},\n'
+        f'  "exportedRuns": {len(run_ids)},\n'
+        '  "history": ['
+    )
+    for i, run in enumerate(iter_runs(state, run_ids)):
+        yield ("," if i else "") + "\n    " + json.dumps(run, indent=2).replace("\n", "\n    ")
+    yield "\n  ]\n}\n"
+
+def ndjson_pieces(state, run_ids: List[str]) -> Iterator[str]:
+    for run in iter_runs(state, run_ids):
+        yield json.dumps(run) + "\n"
+
+def csv_row(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a run into a CSV row"""
+    row = {
+        'runId': run.get('runId', ''),
+        'site': run.get('site', ''),
+        'startedAt': run.get('startedAt', ''),
+        'endedAt': run.get('endedAt', ''),
+        'status': run.get('status', ''),
+        'jobsProcessed': '|'.join(run.get('jobsProcessed', [])),
+        'error': run.get('error', '')
+    }
     
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    # Add cycle summary data if available
+    summary = run.get('cycleSummary')
+    if summary:
+        row.update({
+            'agvBilledMeters': summary.get('agvBilledMeters', 0),
+            'agvCostEUR': summary.get('agvCostEUR', 0),
+            'engraverEnergyKWh': summary.get('engraverEnergyKWh', 0),
+            'engraverCO2g': summary.get('engraverCO2g', 0),
+            'engraverCostEUR': summary.get('engraverCostEUR', 0),
+            'combinedCostEUR': summary.get('combinedCostEUR', 0),
+        })
+    return row
+
+def csv_pieces(state, run_ids: List[str]) -> Iterator[str]:
+    # Reuse one small buffer; each row is taken out and the buffer reset
+    line = io.StringIO()
+    writer = csv.DictWriter(line, fieldnames=CSV_FIELDNAMES)
     writer.writeheader()
+    for run in iter_runs(state, run_ids):
+        writer.writerow(csv_row(run))
+        if line.tell() >= EXPORT_CHUNK_SIZE:
+            yield line.getvalue()
+            line.seek(0)
+            line.truncate()
+    yield line.getvalue()
+
+EXPORT_FORMATS = {
+    "json": (json_pieces, "application/json"),
+    "ndjson": (ndjson_pieces, "application/x-ndjson"),
+    "csv": (csv_pieces, "text/csv"),
+}
+
+def stream_export(fmt: str, limit: Optional[int], start: Optional[str], end: Optional[str], site: Optional[str], gzip: bool) -> StreamingResponse:
+    """Build a streaming export over a snapshot of matching run IDs"""
+    state = get_state()
+    run_ids = state.snapshot_run_ids(start, end, site, limit)
+    pieces, media_type = EXPORT_FORMATS[fmt]
     
-    for run in history_list:
-        row = {
-            'runId': run.get('runId', ''),
-            'site': run.get('site', ''),
-            'startedAt': run.get('startedAt', ''),
-            'endedAt': run.get('endedAt', ''),
-            'status': run.get('status', ''),
-            'jobsProcessed': '|'.join(run.get('jobsProcessed', [])),
-            'error': run.get('error', '')
-        }
-        
-        # Add cycle summary data if available
-        summary = run.get('cycleSummary')
-        if summary:
-            row.update({
-                'agvBilledMeters': summary.get('agvBilledMeters', 0),
-                'agvCostEUR': summary.get('agvCostEUR', 0),
-                'engraverEnergyKWh': summary.get('engraverEnergyKWh', 0),
-                'engraverCO2g': summary.get('engraverCO2g', 0),
-                'engraverCostEUR': summary.get('engraverCostEUR', 0),
-                'combinedCostEUR': summary.get('combinedCostEUR', 0),
-            })
-        
-        writer.writerow(row)
-    
-    output.seek(0)
+    body = chunked(pieces(state, run_ids))
+    filename = f"aas_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    if gzip:
+        body = gzipped(body)
+        filename += ".gz"
+        media_type = "application/gzip"
     
     return StreamingResponse(
-        io.StringIO(output.getvalue()),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=aas_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
+@router.get("/export/{fmt}")
+async def export_history(
+    fmt: str,
+    limit: Optional[int] = None,
+    start: Optional[str] = Query(default=None, alias="from", description="Earliest startedAt (ISO8601)"),
+    end: Optional[str] = Query(default=None, alias="to", description="Latest startedAt (ISO8601 prefix, inclusive)"),
+    site: Optional[str] = None,
+    gzip: bool = False
+):
+    """Export run history as JSON, NDJSON or CSV, streamed in bounded chunks"""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Unknown export format '{fmt}'. Available: {list(EXPORT_FORMATS)}")
+    return stream_export(fmt, limit, start, end, site, gzip)
+
+def requested_schedule(points, file: Optional[str], unit: str, current: Schedule) -> Schedule:
+    """Schedule from inline points or a tariff file, else the one jobs are billed against now"""
+    if points is not None:
+        return Schedule.from_points(points.points, unit)
+    if file:
+        return load_schedule(file, unit)
+    return current
+
+@router.post("/rebill")
+async def rebill_history(
+    request: RebillRequest,
+    start: Optional[str] = Query(default=None, alias="from", description="Earliest startedAt (ISO8601)"),
+    end: Optional[str] = Query(default=None, alias="to", description="Latest startedAt (ISO8601 prefix, inclusive)"),
+    site: Optional[str] = None,
+    perRun: bool = False
+):
+    """
+    POST what-if: the engrave energy of past runs priced against another
+    tariff and/or grid-carbon schedule. History itself is not changed.
+    """
+    state = get_state()
+    
+    try:
+        current_tariff, current_emission = billing_schedules(state.config, state.get_device("engraver")["usageBilling"])
+        tariff = requested_schedule(request.tariff, request.tariffFile, "EUR/kWh", current_tariff)
+        emission = requested_schedule(request.emission, request.emissionFile, "g/kWh", current_emission)
+    except (ValueError, KeyError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid schedule: {e}")
+    
+    started = time.perf_counter()
+    jobs = state.billed_engrave_jobs(state.snapshot_run_ids(start, end, site))
+    result = rebill(jobs, tariff, emission, per_run=perRun)
+    result["elapsedMs"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
 @router.delete("")
 async def clear_history():
     """DELETE clear all run history"""
     state = get_state()
     
-    history_dict = state.get_run_history()
-    cleared_count = len(history_dict)
-    
-    # Clear history
-    with state._lock:
-        state.run_history.clear()
+    cleared_count = state.clear_run_history()
     
     return {
         "message": f"History cleared, {cleared_count} runs removed",
@@ -146,7 +271,11 @@ async def clear_history():
 async def get_history_stats():
     """GET summary statistics from history"""
     state = get_state()
-    
+    body = response_cache.get_or_build(("history-stats",), versions.snapshot("history"), lambda: build_history_stats(state))
+    return Response(content=body, media_type="application/json")
+
+def build_history_stats(state) -> Dict[str, Any]:
+    """Build summary statistics payload"""
     history_dict = state.get_run_history()
     history_list = list(history_dict.values())
     
@@ -1,11 +1,151 @@
 """Queue management API endpoints"""
-from fastapi import APIRouter, HTTPException
+import codecs
+import json
+import re
+from fastapi import APIRouter, HTTPException, Request, Query
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from app.core.state import get_state
 from app.core.orchestrator import EngraveJob
+from app.core.presets import resolve_preset
 from app.models import EnqueueJobRequest
 
 router = APIRouter()
 
+# Upper bound on rows admitted per queue lock acquisition during bulk ingest
+BULK_ROWS_PER_CHUNK = 1000
+
+# Longest array element or NDJSON line buffered while waiting for its end
+MAX_BULK_ROW_CHARS = 1 << 20
+
+# Characters that matter when splitting array elements, outside and inside strings
+_STRUCTURE = re.compile(r'["\[\]{},]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+_decoder = json.JSONDecoder()
+
+def element_end(text: str, pos: int) -> Optional[int]:
+    """
+    Index of the ',' or ']' that ends the array element starting at pos
+    (outside strings and brackets), or None if text ends first
+    """
+    depth = 0
+    i = pos
+    while True:
+        match = _STRUCTURE.search(text, i)
+        if match is None:
+            return None
+        c = match.group()
+        i = match.end()
+        if c == '"':
+            # Skip the string, escapes included
+            while True:
+                match = _STRING_SPECIAL.search(text, i)
+                if match is None:
+                    return None
+                i = match.end()
+                if match.group() == '"':
+                    break
+                i += 1
+        elif c in "[{":
+            depth += 1
+        elif c in ",]" and not depth:
+            return i - 1
+        elif c in "]}" and depth:
+            depth -= 1
+
+async def iter_bulk_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[Tuple[Any, Optional[str]]]]:
+    """
+    Incrementally parse an NDJSON or JSON array body.
+    Yields, per received chunk, a list of (row, parse_error) tuples. A row
+    that is not valid JSON is rejected on its own and parsing resumes at the
+    next one; it stops at a row longer than MAX_BULK_ROW_CHARS.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    array_mode = None
+    array_closed = False
+    
+    async for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        rows = []
+        
+        if array_mode is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            array_mode = stripped[0] == "["
+            buffer = stripped[1:] if array_mode else stripped
+        
+        if array_mode:
+            pos, array_closed = _parse_array(buffer, rows, final=False)
+            buffer = buffer[pos:]
+        else:
+            *lines, buffer = buffer.split("\n")
+            rows.extend(_parse_row(line) for line in lines if line.strip())
+        
+        if not array_closed and len(buffer) > MAX_BULK_ROW_CHARS:
+            rows.append((None, f"Row longer than {MAX_BULK_ROW_CHARS} characters; the rest of the body was not read"))
+            yield rows
+            return
+        if rows:
+            yield rows
+        if array_closed:
+            return
+    
+    buffer += utf8.decode(b"", final=True)
+    if array_mode:
+        rows = []
+        _, array_closed = _parse_array(buffer, rows, final=True)
+        if not array_closed:
+            rows.append((None, "Malformed or unterminated JSON array"))
+        yield rows
+    elif array_mode is False and buffer.strip():
+        yield [_parse_row(buffer)]
+
+def _parse_array(buffer: str, rows: List[Tuple[Any, Optional[str]]], final: bool) -> Tuple[int, bool]:
+    """
+    Append the complete array elements in buffer to rows. Returns how much of
+    the buffer was consumed and whether the closing ']' was reached.
+    """
+    pos = 0
+    while True:
+        # Skip separators between array elements
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buffer):
+            return pos, False
+        if buffer[pos] == "]":
+            return pos + 1, True
+        try:
+            row, end = _decoder.raw_decode(buffer, pos)
+            after = end
+            while after < len(buffer) and buffer[after] in " \t\r\n":
+                after += 1
+            if after < len(buffer) and buffer[after] in ",]":
+                rows.append((row, None))
+                pos = after
+                continue
+            if after >= len(buffer) and not final:
+                return pos, False   # a number or literal may continue in the next chunk
+            if after >= len(buffer):
+                rows.append((row, None))
+                return len(buffer), False
+        except json.JSONDecodeError:
+            pass
+        # Not a single valid value up to the next separator: incomplete, or a malformed row to reject
+        end = element_end(buffer, pos)
+        if end is None:
+            return pos, False
+        rows.append(_parse_row(buffer[pos:end]))
+        pos = end
+
+def _parse_row(text: str) -> Tuple[Any, Optional[str]]:
+    try:
+        return json.loads(text), None
+    except json.JSONDecodeError as e:
+        return None, f"Invalid JSON: {e.msg}"
+
 @router.post("/enqueue")
 async def enqueue_job(request: EnqueueJobRequest):
     """POST enqueue a new job"""
@@ -14,20 +154,97 @@ async def enqueue_job(request: EnqueueJobRequest):
     # Validate site exists in coordinates
     if request.site not in state.coords:
         raise HTTPException(status_code=400, detail=f"Invalid site '{request.site}'. Available sites: {list(state.coords.keys())}")
+    if request.powerPreset:
+        try:
+            resolve_preset(state.config["engraver"], request.powerPreset)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     job = EngraveJob(
         orderNo=request.orderNo,
         laserText=request.laserText,
-        site=request.site
+        site=request.site,
+        weightKg=request.weightKg,
+        powerPreset=request.powerPreset
     )
     
-    state.orchestrator.enqueue_job(job)
+    orch = state.orchestrator
+    reason = orch.admit_job(job)
+    if reason == "duplicate":
+        raise HTTPException(status_code=409, detail=f"Job '{request.orderNo}' is already queued")
+    if reason in ("site_full", "queue_full"):
+        limits = orch.queue_limits()
+        # Per-site limit is the client's problem (429), a full queue is ours (503)
+        raise HTTPException(
+            status_code=429 if reason == "site_full" else 503,
+            detail=f"Queue is full for site {request.site}" if reason == "site_full" else "Queue is full",
+            headers={"Retry-After": str(int(limits["retry_after_s"]))}
+        )
     
     return {
         "message": "Job enqueued successfully",
         "orderNo": request.orderNo,
         "site": request.site,
-        "queueLength": len(state.orchestrator.queue)
+        "queueLength": len(orch.queue)
+    }
+
+@router.post("/bulk")
+async def bulk_enqueue(
+    request: Request,
+    report: str = Query(default="all", pattern="^(all|rejected)$", description="Return results for all rows or only rejected ones")
+):
+    """POST enqueue many jobs from an NDJSON or JSON array body, streamed chunk by chunk"""
+    state = get_state()
+    orch = state.orchestrator
+    valid_sites = set(state.coords)
+    valid_presets = set(state.config["engraver"].get("power_presets") or {})
+    
+    results: List[Dict[str, Any]] = []
+    accepted = 0
+    rejected = 0
+    row_no = 0
+    
+    async for rows in iter_bulk_rows(request.stream()):
+        for start in range(0, len(rows), BULK_ROWS_PER_CHUNK):
+            jobs = []
+            job_rows = []
+            for row, error in rows[start:start + BULK_ROWS_PER_CHUNK]:
+                row_no += 1
+                order_no = row.get("orderNo") if isinstance(row, dict) else None
+                if error is None:
+                    try:
+                        job_request = EnqueueJobRequest(**row) if isinstance(row, dict) else None
+                    except ValidationError as e:
+                        job_request = None
+                        error = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+                    if job_request is None and error is None:
+                        error = "Row must be a JSON object"
+                    elif job_request is not None and job_request.site not in valid_sites:
+                        error = f"Invalid site '{job_request.site}'"
+                    elif job_request is not None and job_request.powerPreset and valid_presets and job_request.powerPreset not in valid_presets:
+                        error = f"Unknown power preset '{job_request.powerPreset}'"
+                if error:
+                    rejected += 1
+                    results.append({"row": row_no, "orderNo": order_no, "accepted": False, "reason": error})
+                    continue
+                jobs.append(EngraveJob(job_request.orderNo, job_request.laserText, job_request.site, job_request.weightKg, job_request.powerPreset))
+                job_rows.append(row_no)
+            
+            for job, job_row, reason in zip(jobs, job_rows, orch.admit_jobs(jobs)):
+                if reason:
+                    rejected += 1
+                    results.append({"row": job_row, "orderNo": job.orderNo, "accepted": False, "reason": reason})
+                else:
+                    accepted += 1
+                    if report == "all":
+                        results.append({"row": job_row, "orderNo": job.orderNo, "accepted": True, "reason": None})
+    
+    results.sort(key=lambda r: r["row"])
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "queueLength": len(orch.queue),
+        "results": results
     }
 
 @router.get("")
@@ -42,6 +259,12 @@ async def get_queue():
         "length": len(queue_jobs)
     }
 
+@router.get("/stats")
+async def get_queue_stats():
+    """GET queue depth, admission limits and rejection counters"""
+    state = get_state()
+    return state.orchestrator.get_queue_stats()
+
 @router.delete("/{order_no}")
 async def remove_job_from_queue(order_no: str):
     """DELETE remove a job from queue"""
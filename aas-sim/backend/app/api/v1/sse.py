@@ -5,48 +5,51 @@ from app.core.state import get_state
 import json
 import asyncio
 from datetime import datetime
+from typing import Any, Dict
 
 router = APIRouter()
 
+def build_event(state) -> Dict[str, Any]:
+    """Snapshot of devices, queue and billing sent to SSE clients"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "devices": {
+            "engraver": {
+                "status": state.engraver["operationalData"]["status"],
+                "order": state.engraver["operationalData"]["order"],
+                "pose": state.engraver["operationalData"]["pose"],
+                "billing": state.engraver["usageBilling"]
+            },
+            "agv": {
+                "status": state.agv["operationalData"]["status"], 
+                "order": state.agv["operationalData"]["order"],
+                "pose": state.agv["operationalData"]["pose"],
+                "billing": state.agv["usageBilling"]
+            }
+        },
+        "queue": {
+            "length": len(state.orchestrator.queue),
+            "jobs": state.orchestrator.get_queue_jobs()[:10]  # First 10 jobs
+        },
+        "orchestrator": {
+            "billing_window_active": state.fleet.billing_window_active()
+        },
+        "combined_billing": {
+            "engraver_cost": state.engraver["usageBilling"]["usageCost"],
+            "agv_cost": state.agv["usageBilling"]["usageCost"],
+            "total_cost": round(
+                state.engraver["usageBilling"]["usageCost"] + 
+                state.agv["usageBilling"]["usageCost"], 6
+            )
+        }
+    }
+
 async def event_generator():
     """Generate Server-Sent Events for real-time updates"""
     while True:
         try:
-            state = get_state()
-            
             # Create comprehensive event data
-            event_data = {
-                "timestamp": datetime.now().isoformat(),
-                "devices": {
-                    "engraver": {
-                        "status": state.engraver["operationalData"]["status"],
-                        "order": state.engraver["operationalData"]["order"],
-                        "pose": state.engraver["operationalData"]["pose"],
-                        "billing": state.engraver["usageBilling"]
-                    },
-                    "agv": {
-                        "status": state.agv["operationalData"]["status"], 
-                        "order": state.agv["operationalData"]["order"],
-                        "pose": state.agv["operationalData"]["pose"],
-                        "billing": state.agv["usageBilling"]
-                    }
-                },
-                "queue": {
-                    "length": len(state.orchestrator.queue),
-                    "jobs": state.orchestrator.get_queue_jobs()[:10]  # First 10 jobs
-                },
-                "orchestrator": {
-                    "billing_window_active": state.orchestrator.billing_window_active
-                },
-                "combined_billing": {
-                    "engraver_cost": state.engraver["usageBilling"]["usageCost"],
-                    "agv_cost": state.agv["usageBilling"]["usageCost"],
-                    "total_cost": round(
-                        state.engraver["usageBilling"]["usageCost"] + 
-                        state.agv["usageBilling"]["usageCost"], 6
-                    )
-                }
-            }
+            event_data = build_event(get_state())
             
             yield f"data: {json.dumps(event_data)}\n\n"
             await asyncio.sleep(1)  # Send updates every second
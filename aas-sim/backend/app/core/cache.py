@@ -0,0 +1,76 @@
+"""Version-keyed cache of encoded API responses"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from app.core.context import current_cell
+
+def encode_json(payload: Any) -> bytes:
+    """Encode a payload the same way Starlette's JSONResponse does"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of pre-encoded response bodies.
+    Each entry remembers the version tuple it was built from and is only
+    served while the caller's current version tuple still matches.
+    Keys are namespaced by the current cell.
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, version: Tuple[int, ...]) -> Optional[bytes]:
+        """Get cached body if it was built at this version"""
+        key = (current_cell.get(), key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+    
+    def put(self, key: Hashable, version: Tuple[int, ...], body: bytes) -> None:
+        """Store a body built at this version"""
+        key = (current_cell.get(), key)
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_build(self, key: Hashable, version: Tuple[int, ...], build: Callable[[], Any]) -> bytes:
+        """Get cached body or build, encode and store it"""
+        body = self.get(key, version)
+        if body is None:
+            body = encode_json(build())
+            self.put(key, version, body)
+        return body
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Shared cache for read-heavy aggregate endpoints
+response_cache = ResponseCache()
@@ -0,0 +1,403 @@
+"""
+Discrete-event capacity simulation of a cell over a shift, in virtual time.
+Cycles follow the orchestrator's timing model: two unbilled AGV legs around
+one billed round trip per AGV load, at speed_m_per_s, and
+max(1, letters * seconds_per_letter) of engraving per job, with a device
+pair reserved for the whole cycle. Engraving is priced like live jobs, on
+the tariff and emission schedules over each job's virtual-time interval.
+"""
+import heapq
+import math
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.core.orchestrator import dist, pack_trips, payload_limits
+from app.core.fleet import BatchingPolicy, billed_round_trip_cost
+from app.core.presets import preset_table
+from app.core.tariff import DAY_S, parse_start, billing_schedules, bill_jobs
+
+SHIFT_S = 8 * 3600
+
+# Letters per job -> share of jobs, used when no job mix is given
+DEFAULT_JOB_MIX = {5: 0.5, 10: 0.3, 20: 0.2}
+
+# Points of the layout that are not job sites
+NON_JOB_SITES = ("HOME", "ENGRAVER_DOCK")
+
+# Upper bound on jobs simulated by one request across all of its shifts (fleet sizes, candidate policies),
+# so a request cannot run unbounded
+MAX_SIMULATED_WORK = 200_000
+
+# Policies searched by optimise_batching: jobs per cycle, hold times and round-trip shares
+BATCH_SIZES = (2, 3, 5, 8, 12, 20, 30)
+TIME_WINDOWS_S = (60, 120, 300, 600, 900, 1800)
+COST_SPLITS = (2, 3, 4, 6, 8, 12)
+
+# Event kinds, in the order they are handled when they fall on the same instant
+_CYCLE_DONE, _ARRIVAL, _WAIT_EXPIRED, _SHIFT_END = range(4)
+
+def job_sites(coords: Dict[str, Tuple[float, float]]) -> List[str]:
+    return [site for site in coords if site not in NON_JOB_SITES]
+
+def leg_seconds(coords: Dict[str, Tuple[float, float]], site: str, config: Dict[str, Any]) -> Dict[str, float]:
+    """Travel time of an unbilled HOME-dock leg and a billed dock-site leg, and the billed distance per trip"""
+    speed = config["agv"]["speed_m_per_s"]
+    dock_site = dist(coords["ENGRAVER_DOCK"], coords[site])
+    return {
+        "homeDock": dist(coords["HOME"], coords["ENGRAVER_DOCK"]) / speed,
+        "dockSite": dock_site / speed,
+        "billedMeters": 2 * dock_site
+    }
+
+def shift_start(value: Any = None) -> float:
+    """
+    Epoch seconds a simulated shift starts at, which places it on the tariff
+    and emission schedules: epoch seconds, ISO 8601, "HH:MM" (today, UTC) or
+    None for now
+    """
+    if value is None:
+        return time.time()
+    seconds, daily = parse_start(value)
+    return math.floor(time.time() / DAY_S) * DAY_S + seconds if daily else seconds
+
+def check_work(arrival_rate_per_h: float, shift_s: float, backlog: int = 0, runs: int = 1) -> None:
+    """ValueError if `runs` shifts of these arrivals (plus backlog) would simulate more than MAX_SIMULATED_WORK jobs"""
+    jobs = (arrival_rate_per_h * shift_s / 3600 + backlog) * runs
+    if jobs > MAX_SIMULATED_WORK:
+        raise ValueError(
+            f"About {int(jobs)} jobs to simulate across {runs} shift(s), more than {MAX_SIMULATED_WORK}; "
+            "lower the arrival rate, the shift length or the number of pairs or candidates"
+        )
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    """Mean, nearest-rank percentiles and max, in seconds"""
+    if not values:
+        return {"n": 0, "mean": 0.0, "p50": 0.0, "p90": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(values)
+    rank = lambda pct: ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+    return {
+        "n": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(rank(50), 3),
+        "p90": round(rank(90), 3),
+        "p95": round(rank(95), 3),
+        "p99": round(rank(99), 3),
+        "max": round(ordered[-1], 3)
+    }
+
+def _arrivals(rng: random.Random, rate_per_h: float, shift_s: float, job_mix: Dict[int, float], site_mix: Dict[str, float]) -> List[Tuple[float, int, str]]:
+    """Poisson arrivals over the shift as (time, letters, site)"""
+    letters, letter_weights = list(job_mix), list(job_mix.values())
+    sites, site_weights = list(site_mix), list(site_mix.values())
+    rate_per_s = rate_per_h / 3600
+    arrivals = []
+    t = rng.expovariate(rate_per_s)
+    while t < shift_s:
+        arrivals.append((t, rng.choices(letters, letter_weights)[0], rng.choices(sites, site_weights)[0]))
+        t += rng.expovariate(rate_per_s)
+    return arrivals
+
+def simulate_shift(
+    config: Dict[str, Any],
+    coords: Dict[str, Tuple[float, float]],
+    arrival_rate_per_h: float,
+    pairs: int = 1,
+    policy: Optional[BatchingPolicy] = None,
+    job_mix: Optional[Dict[int, float]] = None,
+    site_mix: Optional[Dict[str, float]] = None,
+    shift_s: float = SHIFT_S,
+    seed: int = 1,
+    backlog: Optional[List[Tuple[int, str]]] = None,
+    drain: bool = True,
+    start_at: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Simulate Poisson job arrivals over one shift, after a backlog of
+    (letters, site) jobs queued at its start, served by `pairs` engraver/AGV
+    pairs, then the drain of what is still queued when it ends. Reports
+    utilisation, queue waits, makespan (until the last AGV is home) and
+    energy, CO2 and cost per job. With drain=False the policy alone keeps
+    deciding after the shift, as it would live; jobs it never sends out are
+    reported as stranded. Virtual time 0 is start_at (epoch seconds, default
+    now) on the tariff and emission schedules.
+    Runs in virtual time: an 8-hour shift takes milliseconds.
+    """
+    started = time.perf_counter()
+    start_at = time.time() if start_at is None else start_at
+    policy = policy or BatchingPolicy()
+    job_mix = job_mix or DEFAULT_JOB_MIX
+    site_mix = site_mix or {site: 1.0 for site in job_sites(coords)}
+    if pairs < 1:
+        raise ValueError("pairs must be at least 1")
+    backlog = backlog or []
+    if arrival_rate_per_h < 0 or shift_s <= 0:
+        raise ValueError("arrival_rate_per_h must not be negative and shift_s must be positive")
+    if not arrival_rate_per_h and not backlog:
+        raise ValueError("Nothing to simulate: no arrivals and no backlog")
+    check_work(arrival_rate_per_h, shift_s, len(backlog))
+    unknown = sorted({site for site in [*site_mix, *(site for _, site in backlog)] if site not in coords or site in NON_JOB_SITES})
+    if unknown:
+        raise ValueError(f"Unknown job sites: {unknown}. Available: {job_sites(coords)}")
+    if any(weight < 0 for weight in (*job_mix.values(), *site_mix.values())) or not sum(job_mix.values()) or not sum(site_mix.values()):
+        raise ValueError("Job and site mix weights must be non-negative and not all zero")
+
+    engraver = config["engraver"]
+    sites = list(dict.fromkeys([*site_mix, *(site for _, site in backlog)]))
+    legs = {site: leg_seconds(coords, site, config) for site in sites}
+    trip_costs = {site: billed_round_trip_cost(config, coords, site) for site in sites}
+    max_load_jobs, max_load_kg, job_kg = payload_limits(config)
+    table = preset_table(engraver)   # simulated jobs run with the default preset
+
+    rng = random.Random(seed)
+    events: List[Tuple[float, int, int, Any]] = []
+    seq = 0
+    def schedule(at: float, kind: int, payload: Any = None) -> None:
+        nonlocal seq
+        heapq.heappush(events, (at, kind, seq, payload))
+        seq += 1
+
+    for letters, site in backlog:
+        schedule(0.0, _ARRIVAL, (0.0, letters, site))
+    if arrival_rate_per_h:
+        for arrival in _arrivals(rng, arrival_rate_per_h, shift_s, job_mix, site_mix):
+            schedule(arrival[0], _ARRIVAL, arrival)
+    schedule(shift_s, _SHIFT_END)
+
+    queues: Dict[str, Deque[Tuple[float, int]]] = {site: deque() for site in sites}
+    free_pairs = list(range(pairs))   # lowest index first, like the registry order
+    busy = [{"agv": 0.0, "engraver": 0.0, "reserved": 0.0, "cycles": 0} for _ in range(pairs)]
+    waits: List[float] = []
+    lead_times: List[float] = []
+    batch_sizes: List[int] = []
+    totals = {"agvMeters": 0.0}
+    engraved: List[Tuple[float, float, float]] = []   # (start, end, kWh) in epoch seconds, for pricing
+    arrived = completed_in_shift = max_depth = depth = trips = 0
+    makespan = 0.0
+    draining = False
+
+    def dispatch(now: float) -> None:
+        nonlocal depth, makespan, completed_in_shift, trips
+        while free_pairs:
+            ready = [site for site, queue in queues.items() if policy.ready(len(queue), now - queue[0][0] if queue else 0.0, trip_costs[site], draining)]
+            if not ready:
+                return
+            # Deepest queue first, as in dispatchable_sites
+            site = max(ready, key=lambda s: len(queues[s]))
+            queue = queues[site]
+            batch = [queue.popleft() for _ in range(min(len(queue), policy.max_jobs or len(queue)))]
+            depth -= len(batch)
+            pair = heapq.heappop(free_pairs)
+            leg = legs[site]
+
+            loads = pack_trips(batch, [job_kg] * len(batch), max_load_jobs, max_load_kg)
+            t = now + leg["homeDock"]
+            engraving = 0.0
+            for load in loads:
+                t += leg["dockSite"]
+                for arrived_at, letters in load:
+                    seconds, energy = table.lookup(letters)
+                    engraving += seconds
+                    engraved.append((start_at + t, start_at + t + seconds, energy))
+                    t += seconds
+                    waits.append(now - arrived_at)
+                    lead_times.append(t - arrived_at)
+                    if t <= shift_s:
+                        completed_in_shift += 1
+                t += leg["dockSite"]
+            done = t + leg["homeDock"]
+            makespan = max(makespan, done)
+            totals["agvMeters"] += leg["billedMeters"] * len(loads)
+            trips += len(loads)
+            usage = busy[pair]
+            usage["agv"] += 2 * leg["homeDock"] + 2 * leg["dockSite"] * len(loads)
+            usage["engraver"] += engraving
+            usage["reserved"] += done - now
+            usage["cycles"] += 1
+            batch_sizes.append(len(batch))
+            schedule(done, _CYCLE_DONE, pair)
+            if queue and policy.max_wait_s is not None:
+                schedule(queue[0][0] + policy.max_wait_s, _WAIT_EXPIRED)
+
+    while events:
+        now, kind, _, payload = heapq.heappop(events)
+        if kind == _ARRIVAL:
+            _, letters, site = payload
+            queue = queues[site]
+            queue.append((now, letters))
+            arrived += 1
+            depth += 1
+            max_depth = max(max_depth, depth)
+            if len(queue) == 1 and policy.max_wait_s is not None:
+                schedule(now + policy.max_wait_s, _WAIT_EXPIRED)
+        elif kind == _CYCLE_DONE:
+            heapq.heappush(free_pairs, payload)
+        elif kind == _SHIFT_END:
+            draining = drain
+        dispatch(now)
+
+    completed = len(lead_times)
+    horizon = max(shift_s, makespan)
+    energy = sum(job[2] for job in engraved)
+    agv_cost = totals["agvMeters"] * config["agv"]["costPerMeter_EUR"]
+    tariff, emission = billing_schedules(config, {"costPerEnergyUnit": engraver["costPerEnergyUnit_EUR_per_kWh"], "emissionFactor": engraver["emissionFactor_g_per_kWh"]})
+    costs, co2s = bill_jobs(engraved, tariff, emission)
+    engraver_cost = sum(costs)
+    co2 = sum(co2s)
+    per_job = lambda value: round(value / completed, 6) if completed else 0.0
+    utilisation = lambda key: round(sum(usage[key] for usage in busy) / (pairs * horizon), 4)
+    return {
+        "pairs": pairs,
+        "arrivalRatePerHour": arrival_rate_per_h,
+        "shiftSeconds": shift_s,
+        "startAt": start_at,
+        "policy": policy.to_dict(),
+        "seed": seed,
+        "jobs": {"arrived": arrived, "completed": completed, "completedInShift": completed_in_shift, "stranded": depth},
+        "cycles": len(batch_sizes),
+        "meanBatchSize": round(completed / len(batch_sizes), 3) if batch_sizes else 0.0,
+        "billedTrips": trips,
+        "billedTripsPerJob": round(trips / completed, 4) if completed else 0.0,
+        "makespanSeconds": round(makespan, 3),
+        "drainSeconds": round(max(0.0, makespan - shift_s), 3),
+        "throughputPerHour": round(completed / horizon * 3600, 3),
+        "maxQueueDepth": max_depth,
+        "utilisation": {
+            "agv": utilisation("agv"),
+            "engraver": utilisation("engraver"),
+            "pairReserved": utilisation("reserved"),
+            "perPair": [
+                {"pair": index, "cycles": usage["cycles"], "agv": round(usage["agv"] / horizon, 4), "engraver": round(usage["engraver"] / horizon, 4), "reserved": round(usage["reserved"] / horizon, 4)}
+                for index, usage in enumerate(busy)
+            ]
+        },
+        "queueWaitSeconds": _summary(waits),
+        "leadTimeSeconds": _summary(lead_times),
+        "perJob": {
+            "energyKWh": per_job(energy),
+            "co2g": per_job(co2),
+            "engraverCostEUR": per_job(engraver_cost),
+            "agvBilledMeters": per_job(totals["agvMeters"]),
+            "agvCostEUR": per_job(agv_cost),
+            "combinedCostEUR": per_job(engraver_cost + agv_cost)
+        },
+        "totals": {
+            "energyKWh": round(energy, 6),
+            "co2g": round(co2, 6),
+            "combinedCostEUR": round(engraver_cost + agv_cost, 6)
+        },
+        "wallMs": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+def size_fleet(
+    config: Dict[str, Any],
+    coords: Dict[str, Tuple[float, float]],
+    arrival_rate_per_h: float,
+    max_pairs: int = 8,
+    target_p95_wait_s: float = 900.0,
+    **options: Any
+) -> Dict[str, Any]:
+    """
+    Simulate the same shift (same seed, so the same arrivals) with 1..max_pairs
+    pairs and recommend the fewest whose 95th percentile queue wait meets the target
+    """
+    check_work(arrival_rate_per_h, options.get("shift_s", SHIFT_S), len(options.get("backlog") or []), runs=max_pairs)
+    results = []
+    recommended = None
+    for pairs in range(1, max_pairs + 1):
+        result = simulate_shift(config, coords, arrival_rate_per_h, pairs=pairs, **options)
+        results.append(result)
+        if result["queueWaitSeconds"]["p95"] <= target_p95_wait_s:
+            recommended = pairs
+            break
+    return {
+        "targetP95WaitS": target_p95_wait_s,
+        "recommendedPairs": recommended,
+        "results": results
+    }
+
+def candidate_policies(trip_cost: float, max_wait_s: float) -> List[Tuple[str, BatchingPolicy]]:
+    """
+    (kind, policy) pairs searched by optimise_batching: everything queued,
+    capped and fixed batch sizes, time windows, and AGV cost thresholds
+    that share a round trip of trip_cost among 2..12 jobs. Every candidate
+    also sends a site out once its oldest job has waited max_wait_s, so
+    none can hold a site that stops receiving jobs forever.
+    """
+    candidates = [("all", BatchingPolicy(max_wait_s=max_wait_s)), ("cap", BatchingPolicy(max_jobs=1, max_wait_s=max_wait_s))]
+    for size in BATCH_SIZES:
+        candidates.append(("cap", BatchingPolicy(max_jobs=size, max_wait_s=max_wait_s)))
+        candidates.append(("fixed", BatchingPolicy(max_jobs=size, min_batch=size, max_wait_s=max_wait_s)))
+    for window in sorted({min(window, max_wait_s) for window in TIME_WINDOWS_S}):
+        candidates.append(("window", BatchingPolicy(min_batch=None, max_wait_s=window)))
+    for split in COST_SPLITS:
+        candidates.append(("cost", BatchingPolicy(min_batch=None, max_wait_s=max_wait_s, max_agv_cost_per_job=round(trip_cost / split, 6))))
+    return candidates
+
+def _evaluation(kind: str, policy: BatchingPolicy, result: Dict[str, Any], max_p95_wait_s: float) -> Dict[str, Any]:
+    waits = result["queueWaitSeconds"]
+    return {
+        "kind": kind,
+        "policy": policy.to_config(),   # as in the config's "batching" section
+        "feasible": waits["p95"] <= max_p95_wait_s and not result["jobs"]["stranded"],
+        "strandedJobs": result["jobs"]["stranded"],
+        "costPerJobEUR": result["perJob"]["combinedCostEUR"],
+        "agvCostPerJobEUR": result["perJob"]["agvCostEUR"],
+        "p95WaitS": waits["p95"],
+        "meanWaitS": waits["mean"],
+        "meanBatchSize": result["meanBatchSize"],
+        "cycles": result["cycles"],
+        "makespanSeconds": result["makespanSeconds"]
+    }
+
+def optimise_batching(
+    config: Dict[str, Any],
+    coords: Dict[str, Tuple[float, float]],
+    backlog: List[Tuple[int, str]],
+    max_p95_wait_s: float,
+    arrival_rate_per_h: float = 0.0,
+    pairs: int = 1,
+    job_mix: Optional[Dict[int, float]] = None,
+    site_mix: Optional[Dict[str, float]] = None,
+    shift_s: float = SHIFT_S,
+    seed: int = 1,
+    start_at: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Simulate the backlog plus expected arrivals under every candidate policy
+    and the configured one, all on the same arrivals, and recommend the
+    cheapest per job whose p95 queue wait stays within max_p95_wait_s (the
+    one with the shortest wait if none does). Shifts end without a forced
+    drain, so a policy is only feasible if it sends every job out itself.
+    Arrivals default to the backlog's mix of lengths and sites.
+    """
+    started = time.perf_counter()
+    if backlog:
+        job_mix = job_mix or dict(Counter(letters for letters, _ in backlog))
+        site_mix = site_mix or dict(Counter(site for _, site in backlog))
+    start_at = time.time() if start_at is None else start_at   # one anchor, so every candidate sees the same prices
+    options = {"pairs": pairs, "job_mix": job_mix, "site_mix": site_mix, "shift_s": shift_s, "seed": seed, "backlog": backlog, "drain": False, "start_at": start_at}
+    sites = list(site_mix or job_sites(coords))
+    trip_cost = sum(billed_round_trip_cost(config, coords, site) for site in sites if site in coords) / len(sites)
+
+    policies = candidate_policies(trip_cost, max_p95_wait_s)
+    check_work(arrival_rate_per_h, shift_s, len(backlog), runs=len(policies) + 1)
+
+    def evaluate(kind: str, policy: BatchingPolicy) -> Dict[str, Any]:
+        return _evaluation(kind, policy, simulate_shift(config, coords, arrival_rate_per_h, policy=policy, **options), max_p95_wait_s)
+
+    current = evaluate("current", BatchingPolicy.from_config(config))
+    candidates = [evaluate(kind, policy) for kind, policy in policies]
+    candidates.sort(key=lambda entry: (not entry["feasible"], entry["strandedJobs"], entry["costPerJobEUR"] if entry["feasible"] else entry["p95WaitS"], entry["p95WaitS"], entry["meanWaitS"]))
+    recommended = candidates[0]
+    return {
+        "maxP95WaitS": max_p95_wait_s,
+        "backlog": len(backlog),
+        "arrivalRatePerHour": arrival_rate_per_h,
+        "pairs": pairs,
+        "recommended": recommended,
+        "current": current,
+        "savingPerJobEUR": round(current["costPerJobEUR"] - recommended["costPerJobEUR"], 6),
+        "candidates": candidates,
+        "wallMs": round((time.perf_counter() - started) * 1000, 3)
+    }
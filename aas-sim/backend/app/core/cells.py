@@ -0,0 +1,196 @@
+"""Named simulation cells hosted side by side in one process"""
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import copy_context
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from app.core.context import DEFAULT_CELL, current_cell
+from app.core.versioning import versions
+from app.core.telemetry import telemetry
+
+# Cell IDs double as directory names, so keep them to a safe alphabet
+CELL_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Storage root for every cell except the default one
+CELLS_DIR = "simulation_cells"
+
+def run_in_cell(cell_id: str, func: Callable[..., Any], *args: Any) -> Any:
+    """Call func with the current cell set to cell_id, without leaking it to the caller"""
+    def call():
+        current_cell.set(cell_id)
+        return func(*args)
+    return copy_context().run(call)
+
+class CellManager:
+    """
+    Creates cell states lazily on first use and evicts idle ones back to storage.
+    Each cell is a full SimulationState with its own config, coords, devices,
+    queue and storage shard. A cell is only evicted when no request is using it
+    and its fleet is idle; the default cell is never evicted.
+    """
+
+    def __init__(self, factory: Callable[[str, Optional[str]], Any], idle_ttl_s: float = 300.0,
+                 max_loaded: int = 256, sweep_interval_s: float = 30.0):
+        self.factory = factory
+        self.idle_ttl_s = idle_ttl_s
+        self.max_loaded = max_loaded
+        self.sweep_interval_s = sweep_interval_s
+        self._cells: "OrderedDict[str, Any]" = OrderedDict()   # least recently used first
+        self._last_used: Dict[str, float] = {}
+        self._active: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.evicted = 0
+
+    def configure(self, idle_ttl_s: Optional[float] = None, max_loaded: Optional[int] = None) -> None:
+        """Adjust eviction settings"""
+        with self._lock:
+            if idle_ttl_s is not None:
+                self.idle_ttl_s = idle_ttl_s
+            if max_loaded is not None:
+                self.max_loaded = max_loaded
+
+    def storage_dir(self, cell_id: str) -> Optional[str]:
+        """Directory holding a cell's files (None for the default cell's legacy layout)"""
+        return None if cell_id == DEFAULT_CELL else os.path.join(CELLS_DIR, cell_id)
+
+    def get(self, cell_id: str) -> Any:
+        """Get a cell's state, loading or creating it on first use"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._cells.get(cell_id)
+            if state is None:
+                state = run_in_cell(cell_id, self.factory, cell_id, self.storage_dir(cell_id))
+                self._cells[cell_id] = state
+                self.created += 1
+            else:
+                self._cells.move_to_end(cell_id)
+            self._last_used[cell_id] = now
+            if len(self._cells) > self.max_loaded or now - self._last_sweep >= self.sweep_interval_s:
+                self.evict_idle(now)
+            return state
+
+    def loaded(self, cell_id: str) -> Optional[Any]:
+        """Get a cell's state only if it is in memory"""
+        with self._lock:
+            return self._cells.get(cell_id)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """(cellId, state) of every loaded cell"""
+        with self._lock:
+            return list(self._cells.items())
+
+    def hold(self, cell_id: str) -> None:
+        """Mark a cell as in use until release(); a held cell is never evicted"""
+        with self._lock:
+            self._active[cell_id] = self._active.get(cell_id, 0) + 1
+
+    def release(self, cell_id: str) -> None:
+        with self._lock:
+            self._active[cell_id] -= 1
+            if not self._active[cell_id]:
+                del self._active[cell_id]
+            self._last_used[cell_id] = time.monotonic()
+
+    @contextmanager
+    def active(self, cell_id: str) -> Iterator[None]:
+        """Mark a cell as in use for the duration of a request"""
+        self.hold(cell_id)
+        try:
+            yield
+        finally:
+            self.release(cell_id)
+
+    def start_thread(self, target: Callable[..., Any], *args: Any) -> threading.Thread:
+        """
+        Run target(*args) in a daemon thread in the current cell. The cell is
+        held from now until target returns, so it cannot be evicted while
+        the thread still uses its state.
+        """
+        cell_id = current_cell.get()
+        self.hold(cell_id)
+
+        def run():
+            try:
+                target(*args)
+            finally:
+                self.release(cell_id)
+
+        thread = threading.Thread(target=copy_context().run, args=(run,), daemon=True)
+        thread.start()
+        return thread
+
+    def _evictable(self, cell_id: str) -> bool:
+        return cell_id != DEFAULT_CELL and not self._active.get(cell_id) and self._cells[cell_id].fleet.is_idle()
+
+    def evict(self, cell_id: str) -> bool:
+        """Write a cell to storage and drop it from memory. Returns False if it is in use."""
+        with self._lock:
+            if cell_id not in self._cells or not self._evictable(cell_id):
+                return False
+            state = self._cells.pop(cell_id)
+            self._last_used.pop(cell_id, None)
+            run_in_cell(cell_id, state.flush)
+            versions.drop_cell(cell_id)
+            self.evicted += 1
+            return True
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """Evict cells idle for longer than idle_ttl_s, then the least recently used beyond max_loaded"""
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._lock:
+            self._last_sweep = now
+            for cell_id in list(self._cells):
+                if now - self._last_used.get(cell_id, now) >= self.idle_ttl_s and self.evict(cell_id):
+                    evicted.append(cell_id)
+            for cell_id in list(self._cells):
+                if len(self._cells) <= self.max_loaded:
+                    break
+                if self.evict(cell_id):
+                    evicted.append(cell_id)
+        return evicted
+
+    def delete(self, cell_id: str) -> bool:
+        """Evict a cell and remove its storage. Returns False if it is in use."""
+        with self._lock:
+            if cell_id in self._cells and not self.evict(cell_id):
+                return False
+            telemetry.drop_cell(cell_id)
+            directory = self.storage_dir(cell_id)
+            if directory and os.path.isdir(directory):
+                shutil.rmtree(directory)
+            return True
+
+    def stored(self) -> List[str]:
+        """IDs of cells with a storage shard on disk"""
+        if not os.path.isdir(CELLS_DIR):
+            return []
+        return sorted(name for name in os.listdir(CELLS_DIR) if CELL_ID_PATTERN.match(name))
+
+    def list_cells(self) -> Dict[str, Any]:
+        """Loaded and stored cells"""
+        now = time.monotonic()
+        with self._lock:
+            loaded = [
+                {
+                    "cellId": cell_id,
+                    "idleSeconds": round(now - self._last_used.get(cell_id, now), 1),
+                    "activeRequests": self._active.get(cell_id, 0),
+                    "queueLength": len(state.orchestrator.queue),
+                    "devices": len(state.devices)
+                }
+                for cell_id, state in self._cells.items()
+            ]
+            stored = [cell_id for cell_id in self.stored() if cell_id not in self._cells]
+            return {
+                "loaded": loaded,
+                "stored": stored,
+                "limits": {"idleTtlSeconds": self.idle_ttl_s, "maxLoaded": self.max_loaded},
+                "counters": {"created": self.created, "evicted": self.evicted}
+            }
@@ -0,0 +1,12 @@
+"""Context variables carrying the simulated cell a request or worker thread belongs to"""
+from contextvars import ContextVar
+
+# Cell served when a request names none; it keeps the original single-cell storage layout
+DEFAULT_CELL = "default"
+
+current_cell: ContextVar[str] = ContextVar("current_cell", default=DEFAULT_CELL)
+
+def scoped_key(key: str) -> str:
+    """Namespace a key by the current cell (keys of the default cell are left as is)"""
+    cell_id = current_cell.get()
+    return key if cell_id == DEFAULT_CELL else f"cell:{cell_id}:{key}"
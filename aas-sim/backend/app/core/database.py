@@ -1,31 +1,217 @@
 import json
 import os
 import threading
-from typing import Dict, Any
+from typing import Dict, Any, List, Iterable, Callable
+from app.core.metrics import metrics, TimedLock
+from app.core.logging import get_logger
+
+logger = get_logger("database")
+
+PERSIST_BYTES = metrics.counter("aas_persist_bytes_total", "Bytes written by the persistence layer", ("store",))
 
 DB_FILE = "simulation_state.json"
-_db_lock = threading.Lock()
+_db_locks: Dict[str, TimedLock] = {}
+_db_locks_guard = threading.Lock()
+
+def _db_lock(path: str) -> TimedLock:
+    """One lock per state file, so cells persist independently"""
+    with _db_locks_guard:
+        lock = _db_locks.get(path)
+        if lock is None:
+            lock = _db_locks[path] = TimedLock("state_file")
+        return lock
 
-def load_db() -> Dict[str, Any]:
+def load_db(path: str = DB_FILE) -> Dict[str, Any]:
     """Load state from JSON file"""
-    with _db_lock:
-        if not os.path.exists(DB_FILE):
+    with _db_lock(path):
+        if not os.path.exists(path):
             return {}
         try:
-            with open(DB_FILE, "r") as f:
+            with open(path, "r") as f:
                 return json.load(f)
         except Exception as e:
-            print(f"Error loading DB: {e}")
+            logger.error("Error loading DB", extra={"path": path, "error": str(e)})
             return {}
 
-def save_db(data: Dict[str, Any]):
+def save_db(data: Dict[str, Any], path: str = DB_FILE):
     """Save state to JSON file"""
-    with _db_lock:
+    with _db_lock(path):
         try:
             # Write to temp file then rename for atomic write
-            temp_file = f"{DB_FILE}.tmp"
+            temp_file = f"{path}.tmp"
+            payload = json.dumps(data, indent=2)
+            with open(temp_file, "w") as f:
+                f.write(payload)
+            os.replace(temp_file, path)
+            PERSIST_BYTES.inc(len(payload), store="state")
+        except Exception as e:
+            logger.error("Error saving DB", extra={"path": path, "error": str(e)})
+
+QUEUE_LOG_FILE = "simulation_queue.jsonl"
+
+class QueueJournal:
+    """
+    Append-only log of the job queue:
+    - one "enq" record per enqueued job
+    - one "deq" tombstone per dequeued job
+    Replaying the log yields the live queue; the file is compacted on load
+    and whenever tombstones outnumber live jobs.
+    """
+    
+    def __init__(self, path: str = QUEUE_LOG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._next_seq = 1
+        self._live = 0
+        self._dead = 0
+    
+    def load(self) -> List[Dict[str, Any]]:
+        """Replay the log and return live job records in queue order"""
+        live: Dict[int, Dict[str, Any]] = {}
+        with self._lock:
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r") as f:
+                        for line in f:
+                            try:
+                                record = json.loads(line)
+                            except json.JSONDecodeError:
+                                continue  # Torn write from a crash
+                            seq = record.get("seq", 0)
+                            self._next_seq = max(self._next_seq, seq + 1)
+                            if record.get("op") == "enq":
+                                live[seq] = record
+                            elif record.get("op") == "deq":
+                                live.pop(seq, None)
+                except Exception as e:
+                    logger.error("Error loading queue journal", extra={"path": self.path, "error": str(e)})
+            records = list(live.values())
+            self._rewrite(records)
+        return records
+    
+    def append(self, records: List[Dict[str, Any]]) -> List[int]:
+        """Append enqueue records and return their sequence numbers"""
+        with self._lock:
+            seqs = list(range(self._next_seq, self._next_seq + len(records)))
+            self._next_seq += len(records)
+            lines = [json.dumps({"op": "enq", "seq": seq, **record}) + "\n" for seq, record in zip(seqs, records)]
+            self._write_lines(lines)
+            self._live += len(records)
+            return seqs
+    
+    def tombstone(self, seqs: List[int]) -> None:
+        """Append dequeue tombstones"""
+        with self._lock:
+            self._write_lines([json.dumps({"op": "deq", "seq": seq}) + "\n" for seq in seqs])
+            self._live = max(0, self._live - len(seqs))
+            self._dead += len(seqs)
+    
+    def needs_compaction(self) -> bool:
+        """True once tombstones dominate the log"""
+        return self._dead > max(self._live, 1000)
+    
+    def compact(self, records: List[Dict[str, Any]]) -> None:
+        """Rewrite the log with only the given live records (which must carry their seq)"""
+        with self._lock:
+            self._rewrite(records)
+    
+    def clear(self) -> None:
+        """Drop every record"""
+        with self._lock:
+            self._rewrite([])
+    
+    def _rewrite(self, records: List[Dict[str, Any]]) -> None:
+        try:
+            temp_file = f"{self.path}.tmp"
             with open(temp_file, "w") as f:
-                json.dump(data, f, indent=2)
-            os.replace(temp_file, DB_FILE)
+                for record in records:
+                    f.write(json.dumps({**record, "op": "enq"}) + "\n")
+            os.replace(temp_file, self.path)
+            self._live = len(records)
+            self._dead = 0
+        except Exception as e:
+            logger.error("Error compacting queue journal", extra={"path": self.path, "error": str(e)})
+    
+    def _write_lines(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        try:
+            with open(self.path, "a") as f:
+                f.writelines(lines)
+            PERSIST_BYTES.inc(sum(map(len, lines)), store="queue_journal")
         except Exception as e:
-            print(f"Error saving DB: {e}")
+            logger.error("Error writing queue journal", extra={"path": self.path, "error": str(e)})
+
+DEVICES_DIR = "simulation_devices"
+
+class DeviceStore:
+    """
+    One JSON file per device. save() rewrites only the devices whose version
+    changed since they were last written, so persisting a large fleet costs
+    one version lookup per device plus the writes for devices that moved.
+    """
+    
+    def __init__(self, directory: str = DEVICES_DIR):
+        self.directory = directory
+        self._saved_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def load(self) -> List[Dict[str, Any]]:
+        """Load every stored device"""
+        devices = []
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return devices
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), "r") as f:
+                        devices.append(json.load(f))
+                except Exception as e:
+                    logger.error("Error loading device", extra={"file": name, "error": str(e)})
+        return devices
+    
+    def mark_saved(self, device_id: str, version: int) -> None:
+        """Record that the stored copy of a device is current at this version"""
+        self._saved_versions[device_id] = version
+    
+    def save(self, devices: Iterable[Dict[str, Any]], version_of: Callable[[str], int]) -> int:
+        """Write devices whose version changed. Returns number of files written."""
+        written = 0
+        with self._lock:
+            for device in devices:
+                device_id = device["deviceId"]
+                version = version_of(device_id)
+                if self._saved_versions.get(device_id) == version:
+                    continue
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    path = os.path.join(self.directory, f"{device_id}.json")
+                    payload = json.dumps(device, indent=2)
+                    with open(f"{path}.tmp", "w") as f:
+                        f.write(payload)
+                    os.replace(f"{path}.tmp", path)
+                    PERSIST_BYTES.inc(len(payload), store="devices")
+                    self._saved_versions[device_id] = version
+                    written += 1
+                except Exception as e:
+                    logger.error("Error saving device", extra={"deviceId": device_id, "error": str(e)})
+        return written
+    
+    def delete(self, device_id: str) -> None:
+        """Remove a stored device"""
+        with self._lock:
+            self._saved_versions.pop(device_id, None)
+            path = os.path.join(self.directory, f"{device_id}.json")
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def clear(self) -> None:
+        """Remove every stored device"""
+        with self._lock:
+            self._saved_versions.clear()
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    if name.endswith(".json"):
+                        os.remove(os.path.join(self.directory, name))
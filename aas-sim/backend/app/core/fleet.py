@@ -0,0 +1,194 @@
+"""Fleet-level dispatch of cycles across AGV/engraver pairs"""
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.core.registry import DeviceRegistry
+from app.core.versioning import versions
+from app.core.tracing import span
+from app.core.orchestrator import dist
+
+DevicePair = Tuple[Dict[str, Any], Dict[str, Any]]  # (engraver, agv)
+
+class FleetDispatcher:
+    """
+    Hands out free engraver/AGV pairs so cycles on different pairs run
+    concurrently. Each device is reserved individually; a cycle holds
+    exactly the two devices it drives instead of one global cycle lock.
+    on_release(pair) is called once a pair is free again, e.g. to persist
+    the devices its cycle changed.
+    """
+
+    def __init__(self, registry: DeviceRegistry, on_release: Optional[Callable[[DevicePair], None]] = None):
+        self.registry = registry
+        self.on_release = on_release
+        self._busy: Set[str] = set()
+        self._exclusive = False
+        self._billing: Set[str] = set()  # AGVs of reserved pairs with an open billing window
+        self._cond = threading.Condition()
+        self.cycles_started = 0
+
+    def _free_pair(self) -> Optional[DevicePair]:
+        if self._exclusive:
+            return None
+        engraver = self._first_free("Engraver")
+        agv = self._first_free("AGV")
+        if engraver is None or agv is None:
+            return None
+        return engraver, agv
+
+    def _first_free(self, device_type: str) -> Optional[Dict[str, Any]]:
+        # Registry order keeps the primaries first, so a single-pair cell behaves as before
+        for device_id in self.registry.ids(device_type):
+            if device_id not in self._busy:
+                return self.registry.get(device_id)
+        return None
+
+    def acquire_pair(self, timeout: Optional[float] = None) -> Optional[DevicePair]:
+        """Reserve a free engraver/AGV pair, waiting up to `timeout` seconds (forever if None)"""
+        with span("wait for device pair", "lock"), self._cond:
+            if not self._cond.wait_for(lambda: self._free_pair() is not None, timeout):
+                return None
+            engraver, agv = self._free_pair()
+            self._busy.update((engraver["deviceId"], agv["deviceId"]))
+            self.cycles_started += 1
+            versions.bump("fleet")
+            return engraver, agv
+
+    def release_pair(self, pair: DevicePair) -> None:
+        """Return a reserved pair to the pool"""
+        with self._cond:
+            for device in pair:
+                self._busy.discard(device["deviceId"])
+                self._billing.discard(device["deviceId"])
+            self._cond.notify_all()
+            versions.bump("fleet")
+        if self.on_release is not None:
+            self.on_release(pair)
+
+    @contextmanager
+    def pair(self, timeout: Optional[float] = None) -> Iterator[DevicePair]:
+        """Context manager reserving a pair for one cycle"""
+        reserved = self.acquire_pair(timeout)
+        if reserved is None:
+            raise TimeoutError("No free engraver/AGV pair")
+        try:
+            yield reserved
+        finally:
+            self.release_pair(reserved)
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Wait for every device to be free and keep the whole fleet for one operation"""
+        with span("wait for whole fleet", "lock"), self._cond:
+            self._cond.wait_for(lambda: not self._exclusive)
+            self._exclusive = True
+            self._cond.wait_for(lambda: not self._busy)
+            versions.bump("fleet")
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+                versions.bump("fleet")
+
+    def set_billing(self, agv_id: str, active: bool) -> None:
+        """Open or close the billing window of the cycle driving this AGV"""
+        with self._cond:
+            if active == (agv_id in self._billing):
+                return
+            if active:
+                self._billing.add(agv_id)
+            else:
+                self._billing.discard(agv_id)
+        versions.bump("fleet")
+
+    def billing_window_active(self) -> bool:
+        """True while any cycle has its AGV billing window open"""
+        with self._cond:
+            return bool(self._billing)
+
+    def is_idle(self) -> bool:
+        """True when no device is reserved"""
+        with self._cond:
+            return not self._busy and not self._exclusive
+
+    def pair_count(self) -> int:
+        """Number of engraver/AGV pairs the fleet can run at once"""
+        return min(len(self.registry.ids("Engraver")), len(self.registry.ids("AGV")))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "pairs": self.pair_count(),
+                "busyDevices": sorted(self._busy),
+                "exclusive": self._exclusive,
+                "billingWindows": sorted(self._billing),
+                "cyclesStarted": self.cycles_started
+            }
+
+    def load_snapshot(self, stats: Dict[str, Any]) -> None:
+        """Mirror the reservations reported by another process's stats()"""
+        with self._cond:
+            self._busy = set(stats["busyDevices"])
+            self._exclusive = stats["exclusive"]
+            self._billing = set(stats["billingWindows"])
+            self.cycles_started = stats["cyclesStarted"]
+            self._cond.notify_all()
+
+def dispatchable_sites(site_depth: Dict[str, int], coords: Dict[str, Any]) -> List[str]:
+    """Sites with queued jobs, deepest queue first"""
+    sites = [site for site, depth in site_depth.items() if depth and site in coords]
+    return sorted(sites, key=lambda site: -site_depth[site])
+
+def billed_round_trip_cost(config: Dict[str, Any], coords: Dict[str, Any], site: str) -> float:
+    """AGV cost of the billed ENGRAVER_DOCK -> site -> ENGRAVER_DOCK legs, shared by a cycle's jobs"""
+    return 2 * dist(coords["ENGRAVER_DOCK"], coords[site]) * config["agv"]["costPerMeter_EUR"]
+
+class BatchingPolicy:
+    """
+    When a site's queued jobs are sent out as a cycle, and how many. A site
+    is ready once min_batch jobs are queued, or its oldest job has waited
+    max_wait_s, or the billed round trip split over the queued jobs costs at
+    most max_agv_cost_per_job; a cycle takes at most max_jobs (None: all).
+    Triggers left as None never fire. The defaults dispatch any queued job.
+    """
+
+    def __init__(
+        self,
+        max_jobs: Optional[int] = None,
+        min_batch: Optional[int] = 1,
+        max_wait_s: Optional[float] = None,
+        max_agv_cost_per_job: Optional[float] = None
+    ):
+        if max_jobs is not None and max_jobs < 1:
+            raise ValueError("max_jobs must be at least 1")
+        if min_batch is not None and min_batch < 1:
+            raise ValueError("min_batch must be at least 1")
+        self.max_jobs = max_jobs
+        self.min_batch = min_batch if min_batch is None or max_jobs is None else min(min_batch, max_jobs)
+        self.max_wait_s = max_wait_s
+        self.max_agv_cost_per_job = max_agv_cost_per_job
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "BatchingPolicy":
+        """The policy in the config's "batching" section"""
+        batching = config.get("batching") or {}
+        return cls(batching.get("max_jobs"), batching.get("min_batch", 1), batching.get("max_wait_s"), batching.get("max_agv_cost_per_job"))
+
+    def ready(self, waiting: int, oldest_wait_s: float, trip_cost: float = 0.0, draining: bool = False) -> bool:
+        if not waiting:
+            return False
+        return (
+            draining
+            or (self.min_batch is not None and waiting >= self.min_batch)
+            or (self.max_wait_s is not None and oldest_wait_s >= self.max_wait_s)
+            or (self.max_agv_cost_per_job is not None and trip_cost / min(waiting, self.max_jobs or waiting) <= self.max_agv_cost_per_job)
+        )
+
+    def to_config(self) -> Dict[str, Any]:
+        return {"max_jobs": self.max_jobs, "min_batch": self.min_batch, "max_wait_s": self.max_wait_s, "max_agv_cost_per_job": self.max_agv_cost_per_job}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"maxJobs": self.max_jobs, "minBatch": self.min_batch, "maxWaitS": self.max_wait_s, "maxAgvCostPerJob": self.max_agv_cost_per_job}
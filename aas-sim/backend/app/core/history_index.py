@@ -0,0 +1,124 @@
+"""Sorted secondary indexes over run history for paginated, filtered queries"""
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple, Any
+
+# (startedAt, runId) - unique and ordered by start time
+IndexKey = Tuple[str, str]
+
+# Run fields that can be used as filters
+INDEXED_FIELDS = ("site", "status", "source")
+
+class HistoryIndex:
+    """
+    Keeps run IDs sorted by startedAt, overall and per value of each indexed field.
+    Pages are read newest-first starting just below a cursor key, so fetching
+    a page costs one bisect plus the page itself.
+    """
+
+    def __init__(self):
+        self._all: List[IndexKey] = []
+        self._by_field: Dict[str, Dict[Any, List[IndexKey]]] = {field: {} for field in INDEXED_FIELDS}
+        self._entries: Dict[str, Tuple[IndexKey, Dict[str, Any]]] = {}  # runId -> (key, indexed values)
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def rebuild(self, runs: Dict[str, Dict[str, Any]]) -> None:
+        """Rebuild every index from a runId -> run mapping"""
+        self.clear()
+        entries = [self._entry(run) for run in runs.values()]
+        entries.sort(key=lambda entry: entry[0])
+        for key, values in entries:
+            self._all.append(key)
+            self._entries[key[1]] = (key, values)
+            for field, value in values.items():
+                self._by_field[field].setdefault(value, []).append(key)
+
+    def clear(self) -> None:
+        self._all = []
+        self._by_field = {field: {} for field in INDEXED_FIELDS}
+        self._entries = {}
+
+    def add(self, run: Dict[str, Any]) -> None:
+        """Index a new run, or re-index it if its indexed fields changed"""
+        key, values = self._entry(run)
+        existing = self._entries.get(key[1])
+        if existing == (key, values):
+            return
+        if existing:
+            self.remove(key[1])
+        insort(self._all, key)
+        self._entries[key[1]] = (key, values)
+        for field, value in values.items():
+            insort(self._by_field[field].setdefault(value, []), key)
+
+    def remove(self, run_id: str) -> None:
+        entry = self._entries.pop(run_id, None)
+        if entry is None:
+            return
+        key, values = entry
+        self._discard(self._all, key)
+        for field, value in values.items():
+            keys = self._by_field[field].get(value)
+            if keys is not None:
+                self._discard(keys, key)
+                if not keys:
+                    del self._by_field[field][value]
+
+    def page(self, limit: int, cursor: Optional[IndexKey] = None, filters: Optional[Dict[str, Any]] = None) -> Tuple[List[str], Optional[IndexKey]]:
+        """
+        Return up to `limit` run IDs, newest first, strictly older than `cursor`.
+        The second element is the cursor for the next page, or None when no
+        run matching the filters is left.
+        """
+        filters, candidates = self._candidates(filters)
+        position = bisect_left(candidates, tuple(cursor)) if cursor else len(candidates)
+        run_ids: List[str] = []
+        last_key = None
+        while position > 0 and len(run_ids) < limit:
+            position -= 1
+            key = candidates[position]
+            if self._matches(key, filters):
+                run_ids.append(key[1])
+                last_key = key
+
+        more = any(self._matches(candidates[i], filters) for i in range(position - 1, -1, -1))
+        return run_ids, last_key if more else None
+
+    def count(self, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Number of runs matching the filters"""
+        filters, candidates = self._candidates(filters)
+        if len(filters) <= 1:
+            return len(candidates)
+        return sum(1 for key in candidates if self._matches(key, filters))
+
+    def _candidates(self, filters: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[IndexKey]]:
+        """The filters that are set, and the keys to walk for them: the most selective index"""
+        filters = {field: value for field, value in (filters or {}).items() if value is not None}
+        if not filters:
+            return filters, self._all
+        return filters, min((self._by_field[field].get(value, []) for field, value in filters.items()), key=len)
+
+    def _matches(self, key: IndexKey, filters: Dict[str, Any]) -> bool:
+        values = self._entries[key[1]][1]
+        return all(values.get(field) == value for field, value in filters.items())
+
+    def range(self, start: Optional[str] = None, end: Optional[str] = None, site: Optional[str] = None) -> List[IndexKey]:
+        """
+        Keys whose startedAt lies in [start, end], oldest first. `end` matches as a
+        prefix, so end="2025-01-31" includes the whole day.
+        """
+        keys = self._by_field["site"].get(site, []) if site is not None else self._all
+        low = bisect_left(keys, (start, "")) if start else 0
+        high = bisect_left(keys, (end + "\uffff", "")) if end else len(keys)
+        return keys[low:high]
+
+    def _entry(self, run: Dict[str, Any]) -> Tuple[IndexKey, Dict[str, Any]]:
+        key = (run.get("startedAt") or "", run["runId"])
+        return key, {field: run.get(field) for field in INDEXED_FIELDS if run.get(field) is not None}
+
+    @staticmethod
+    def _discard(keys: List[IndexKey], key: IndexKey) -> None:
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
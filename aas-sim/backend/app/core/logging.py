@@ -1,25 +1,202 @@
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
-from typing import Any, Dict
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, Optional, TextIO
+from app.core.context import current_cell
 
 # Configure logging format
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
-def setup_logging(log_level: str = "INFO") -> None:
-    """Setup global logging configuration"""
-    
+# Records waiting for the writer thread; beyond this they are dropped instead of blocking the caller
+LOG_QUEUE_SIZE = 10_000
+
+# Records per second (and burst) each logger may emit before further records are suppressed
+DEFAULT_RATE_LIMIT = (100.0, 200)
+
+# Hot loggers that keep only one in N of their INFO/DEBUG records
+DEFAULT_SAMPLING = {"aas_sim.orchestrator.jobs": 10}
+
+# Attributes every LogRecord has; anything else on a record came from `extra` or the context
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "exception"}
+
+# Fields bound by log_context() and added to every record logged inside it
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+_listener: Optional[QueueListener] = None
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Add fields (e.g. runId, orderNo) to every record logged in this with-block"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+class ContextFilter(logging.Filter):
+    """Copies the cell and the log_context() fields onto each record in the logging thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.cell = current_cell.get()
+        for name, value in _log_context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in N INFO/DEBUG records of the configured loggers; warnings and errors always pass"""
+
+    def __init__(self, sampling: Dict[str, int]):
+        super().__init__()
+        self.sampling = {name: max(1, int(every)) for name, every in sampling.items()}
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = self.sampling.get(record.name)
+        if every is None or every == 1 or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            seen = self._seen.get(record.name, 0)
+            self._seen[record.name] = seen + 1
+        if seen % every:
+            return False
+        record.sampled = every
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per logger. Records over the limit are suppressed; the next
+    record that passes carries the number suppressed since the last one.
+    """
+
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._buckets: Dict[str, list] = {}   # logger -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message, its context and any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        entry.update({name: value for name, value in vars(record).items() if name not in _RECORD_ATTRS})
+        exception = getattr(record, "exception", None) or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exception:
+            entry["exception"] = exception
+        return json.dumps(entry, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback here, but keep them apart so the formatter can structure them
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exception = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info, record.exc_text = record.message, None, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def setup_logging(
+    log_level: str = "INFO",
+    fmt: str = "json",
+    stream: Optional[TextIO] = None,
+    rate_limit: Optional[tuple] = DEFAULT_RATE_LIMIT,
+    sampling: Optional[Dict[str, int]] = None
+) -> NonBlockingQueueHandler:
+    """
+    Setup global logging configuration.
+    Loggers only enqueue records; a listener thread formats and writes them,
+    so a slow terminal or pipe never stalls cycles or request handlers.
+    """
+    global _listener
+
     # Create logger
     logger = logging.getLogger("aas_sim")
     logger.setLevel(log_level)
-    
-    # Console handler
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    # Replace the pipeline of an earlier call
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    # Console handler, fed by the listener thread
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(LOG_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(DEFAULT_SAMPLING if sampling is None else sampling))
+    if rate_limit:
+        handler.addFilter(RateLimitFilter(*rate_limit))
     logger.addHandler(handler)
-    
+
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+
     # Set third-party loggers to warning to reduce noise
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
     logging.getLogger("fastapi").setLevel(logging.WARNING)
+    return handler
+
+def flush_logging() -> None:
+    """Write out every queued record (stops and restarts the listener thread)"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+        _listener.start()
+
+@atexit.register
+def _stop_listener() -> None:
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
 
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance with the application prefix"""
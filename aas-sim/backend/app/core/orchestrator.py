@@ -1,23 +1,54 @@
 """Orchestrator for AAS simulation with exact field names"""
 import time
 import math
+import copy
 import threading
 from datetime import datetime, timezone
-from collections import deque
-from typing import Optional, List, Dict, Any, Tuple
+from collections import Counter, deque
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
+from app.core.versioning import touch_device, versions
+from app.core.registry import notify_mode_change
+from app.core.metrics import metrics
+from app.core.tracing import span
+from app.core.logging import get_logger, log_context
+from app.core.tariff import billing_schedules
+from app.core.presets import preset_table
+from app.core.telemetry import telemetry
+
+AGV_LEG_SECONDS = metrics.histogram("aas_agv_leg_duration_seconds", "Duration of one AGV leg", ("billed",))
+AGV_BILLED_METERS = metrics.counter("aas_agv_billed_meters_total", "Meters travelled by AGVs inside the billing window")
+ENGRAVE_JOB_SECONDS = metrics.histogram("aas_engrave_job_duration_seconds", "Duration of one engraving job")
+CYCLE_SECONDS = metrics.histogram("aas_cycle_duration_seconds", "Duration of a complete cycle for a site", ("site",))
+CYCLE_JOBS = metrics.histogram("aas_cycle_jobs", "Jobs processed per cycle", buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250, 500, 1000))
+
+# Per-job messages are hot; this logger is sampled (see app.core.logging.DEFAULT_SAMPLING)
+job_logger = get_logger("orchestrator.jobs")
 
 def now_iso() -> str:
     """Get current ISO8601 timestamp"""
     return datetime.now(timezone.utc).isoformat()
 
 def bump_heartbeat(device: Dict[str, Any]) -> None:
-    """Increment heartbeat counter and update timestamp"""
+    """Increment heartbeat counter and update timestamp; starts a telemetry sample"""
     device["operationalData"]["status"]["heartbeatCounter"] += 1
     device["operationalData"]["status"]["heartbeatTimestamp"] = now_iso()
+    touch_device(device, "status")
+    telemetry.record(device)
 
 def set_progress(device: Dict[str, Any], pct: float) -> None:
     """Set production progress (0-100)"""
     device["operationalData"]["status"]["productionProgress"] = int(max(0, min(100, round(pct))))
+    touch_device(device, "status")
+    telemetry.record(device)
+
+def set_operation_mode(device: Dict[str, Any], mode: str) -> None:
+    """Set operationMode and keep registry status indexes current"""
+    status = device["operationalData"]["status"]
+    if status["operationMode"] != mode:
+        status["operationMode"] = mode
+        notify_mode_change(device)
+        touch_device(device, "status")
+        telemetry.record(device)
 
 def dist(a: Tuple[float, float], b: Tuple[float, float]) -> float:
     """Calculate Euclidean distance between two points"""
@@ -26,7 +57,10 @@ def dist(a: Tuple[float, float], b: Tuple[float, float]) -> float:
     return math.hypot(bx - ax, by - ay)
 
 def move_pose_towards(pose: Dict[str, float], target: Tuple[float, float], step: float) -> bool:
-    """Move pose towards target by step distance. Returns True if arrived."""
+    """
+    Move pose towards target by step distance. Returns True if arrived.
+    The new pose reaches telemetry with the step's heartbeat.
+    """
     tx, ty = target
     x, y = pose["posX"], pose["posY"]
     dx, dy = tx - x, ty - y
@@ -41,73 +75,448 @@ def move_pose_towards(pose: Dict[str, float], target: Tuple[float, float], step:
 
 class EngraveJob:
     """Job for laser engraving"""
-    def __init__(self, orderNo: str, laserText: str, site: str = "JOB_POS1"):
+    def __init__(self, orderNo: str, laserText: str, site: str = "JOB_POS1", weightKg: Optional[float] = None, powerPreset: Optional[str] = None):
         self.orderNo = orderNo
         self.laserText = laserText
         self.site = site
+        self.weightKg = weightKg  # None: the agv config's job_weight_kg
+        self.powerPreset = powerPreset  # None: the engraver config's default_powerPreset
+        self.seq: Optional[int] = None  # Queue journal sequence number
+        self.enqueued_at = time.time()  # Restored jobs count from their restore
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "EngraveJob":
+        return cls(record["orderNo"], record["laserText"], record.get("site", "JOB_POS1"), record.get("weightKg"), record.get("powerPreset"))
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Serializable form used by the queue journal"""
+        record = {"orderNo": self.orderNo, "laserText": self.laserText, "site": self.site}
+        if self.weightKg is not None:
+            record["weightKg"] = self.weightKg
+        if self.powerPreset is not None:
+            record["powerPreset"] = self.powerPreset
+        return record
+
+class JobQueue:
+    """
+    FIFO of queued jobs that removes any job in O(1): a removed job leaves a
+    hole that iteration skips. Holes are dropped as they reach the front, and
+    all at once when they outnumber the queued jobs.
+    """
+
+    def __init__(self):
+        self._slots: deque = deque()                         # [job], or [None] once removed
+        self._slot_of: Dict[int, List[Any]] = {}             # id(job) -> its slot
+        self._by_order: Dict[str, List[EngraveJob]] = {}     # orderNo -> queued jobs, oldest first
+        self._holes = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __iter__(self) -> Iterator[EngraveJob]:
+        return (slot[0] for slot in self._slots if slot[0] is not None)
+
+    def __getitem__(self, index: int) -> EngraveJob:
+        return list(self)[index]
+
+    def append(self, job: EngraveJob) -> None:
+        slot = [job]
+        self._slots.append(slot)
+        self._slot_of[id(job)] = slot
+        self._by_order.setdefault(job.orderNo, []).append(job)
+
+    def remove(self, job: EngraveJob) -> bool:
+        """Remove a job object. Returns False if it is not queued."""
+        slot = self._slot_of.pop(id(job), None)
+        if slot is None:
+            return False
+        slot[0] = None
+        self._holes += 1
+        same_order = self._by_order[job.orderNo]
+        same_order.remove(job)
+        if not same_order:
+            del self._by_order[job.orderNo]
+        while self._slots and self._slots[0][0] is None:
+            self._slots.popleft()
+            self._holes -= 1
+        if self._holes > len(self._slot_of):
+            self._slots = deque(slot for slot in self._slots if slot[0] is not None)
+            self._holes = 0
+        return True
+
+    def find(self, order_no: str) -> Optional[EngraveJob]:
+        """Oldest queued job with an orderNo, if any"""
+        jobs = self._by_order.get(order_no)
+        return jobs[0] if jobs else None
+
+    def clear(self) -> None:
+        self._slots.clear()
+        self._slot_of.clear()
+        self._by_order.clear()
+        self._holes = 0
+
+def payload_limits(config: Dict[str, Any]) -> Tuple[Optional[int], Optional[float], float]:
+    """AGV payload per trip as (max jobs, max kg, default job kg); a missing or 0 limit means none"""
+    agv = config["agv"]
+    return agv.get("payload_max_jobs") or None, agv.get("payload_max_kg") or None, agv.get("job_weight_kg", 1.0)
+
+def pack_trips(items: List[Any], weights: List[float], max_jobs: Optional[int], max_kg: Optional[float]) -> List[List[Any]]:
+    """
+    Split items into AGV loads of at most max_jobs items and max_kg, using
+    first-fit decreasing: heaviest first, each into the first load it fits.
+    An item heavier than max_kg rides alone. Loads keep the items' order.
+    """
+    if (not max_jobs or len(items) <= max_jobs) and (not max_kg or sum(weights) <= max_kg):
+        return [list(items)] if items else []
+    lightest = min(weights)
+    if lightest == max(weights):
+        # Uniform weights (the usual case): first-fit fills loads in queue order, so chunk them
+        per_load, kg = 1, lightest
+        while (not max_jobs or per_load < max_jobs) and (not max_kg or kg + lightest <= max_kg) and per_load < len(items):
+            per_load += 1
+            kg += lightest
+        return [list(items[start:start + per_load]) for start in range(0, len(items), per_load)]
+    loads: List[List[int]] = []
+    load_kg: List[float] = []
+    open_loads: List[int] = []   # loads that can still take the lightest item, in creation order
+    for index in sorted(range(len(items)), key=lambda i: -weights[i]):
+        for load in open_loads:
+            if not max_kg or load_kg[load] + weights[index] <= max_kg:
+                break
+        else:
+            load = len(loads)
+            loads.append([])
+            load_kg.append(0.0)
+            open_loads.append(load)
+        loads[load].append(index)
+        load_kg[load] += weights[index]
+        if (max_jobs and len(loads[load]) >= max_jobs) or (max_kg and load_kg[load] + lightest > max_kg):
+            open_loads.remove(load)
+    # Trips leave in the order of their oldest job, and load it in queue order
+    return [[items[i] for i in sorted(load)] for load in sorted(loads, key=min)]
+
+# Fallback admission limits when the config has no "queue" section
+DEFAULT_QUEUE_LIMITS = {
+    "max_length": 1000,
+    "max_per_site": 500,
+    "retry_after_s": 5
+}
 
 class Orchestrator:
     """
     Orchestrates AGV + Engraver cycles:
     - Non-billed legs: HOME→ENGRAVER_DOCK, ENGRAVER_DOCK→HOME
-    - Billed legs: ENGRAVER_DOCK→JOB_POSx→ENGRAVER_DOCK
-    - Batching: process all jobs for a site in one cycle
+    - Billed legs: ENGRAVER_DOCK→JOB_POSx→ENGRAVER_DOCK, once per AGV load
+    - Batching: process all jobs for a site in one cycle, in as few loads as the payload allows
     """
     
-    def __init__(self, engraver: Dict[str, Any], agv: Dict[str, Any], config: Dict[str, Any], coords: Dict[str, Tuple[float, float]]):
+    def __init__(self, engraver: Dict[str, Any], agv: Dict[str, Any], config: Dict[str, Any], coords: Dict[str, Tuple[float, float]], journal=None, on_billing=None):
         self.engraver = engraver
         self.agv = agv
         self.config = config
         self.coords = coords
-        self.queue = deque()
+        self.queue = JobQueue()
+        self.queue_lock = threading.RLock()
+        self.journal = journal  # Optional QueueJournal for durability
+        self.on_billing = on_billing  # Optional callback(agv_id, active), e.g. FleetDispatcher.set_billing
+        self._in_flight: Dict[int, EngraveJob] = {}  # Dequeued but not yet acknowledged
         self.billing_window_active = False
+        
+        # Queue indexes so admission checks never scan the queue
+        self._order_index: Dict[str, int] = {}  # orderNo -> number of queued jobs
+        self._site_depth: Dict[str, int] = {}   # site -> number of queued jobs
+        self.queue_stats = {
+            "enqueued": 0,
+            "dequeued": 0,
+            "rejected_duplicate": 0,
+            "rejected_site_full": 0,
+            "rejected_queue_full": 0
+        }
+    
+    def for_devices(self, engraver: Dict[str, Any], agv: Dict[str, Any]) -> "Orchestrator":
+        """
+        Get an orchestrator bound to another engraver/AGV pair that shares this
+        one's queue, indexes, journal and config, so several pairs can run cycles
+        against the same queue concurrently.
+        """
+        view = copy.copy(self)
+        view.engraver = engraver
+        view.agv = agv
+        view.billing_window_active = False
+        return view
+    
+    def claim_batch(self, site: str, max_jobs: Optional[int] = None, order_nos: Optional[List[str]] = None) -> List[EngraveJob]:
+        """
+        Atomically take up to max_jobs queued jobs for a site (only those with the
+        given order numbers, if any). Claimed jobs leave the queue but stay in the
+        journal until acknowledged, so concurrent cycles never share a job and a
+        crash mid-cycle restores them.
+        """
+        wanted = set(order_nos) if order_nos is not None else None
+        with self.queue_lock:
+            batch = []
+            if not self._site_depth.get(site):
+                return batch
+            for job in self.queue:
+                if job.site == site and (wanted is None or job.orderNo in wanted):
+                    batch.append(job)
+                    if max_jobs and len(batch) >= max_jobs:
+                        break
+            for job in batch:
+                self.dequeue_job(job, acknowledge=False)
+            return batch
+    
+    def queue_limits(self) -> Dict[str, Any]:
+        """Get effective queue admission limits"""
+        return {**DEFAULT_QUEUE_LIMITS, **(self.config.get("queue") or {})}
+    
+    def _index_add(self, job: EngraveJob) -> None:
+        self._order_index[job.orderNo] = self._order_index.get(job.orderNo, 0) + 1
+        self._site_depth[job.site] = self._site_depth.get(job.site, 0) + 1
+    
+    def _index_remove(self, job: EngraveJob) -> None:
+        for index, key in ((self._order_index, job.orderNo), (self._site_depth, job.site)):
+            remaining = index.get(key, 0) - 1
+            if remaining > 0:
+                index[key] = remaining
+            else:
+                index.pop(key, None)
+    
+    def check_admission(self, job: EngraveJob) -> Optional[str]:
+        """Return the rejection reason for a job, or None if it may be queued"""
+        limits = self.queue_limits()
+        if job.orderNo in self._order_index:
+            return "duplicate"
+        if limits["max_length"] and len(self.queue) >= limits["max_length"]:
+            return "queue_full"
+        if limits["max_per_site"] and self._site_depth.get(job.site, 0) >= limits["max_per_site"]:
+            return "site_full"
+        return None
+    
+    def admit_job(self, job: EngraveJob) -> Optional[str]:
+        """Enqueue job if admission limits allow it. Returns rejection reason or None."""
+        with self.queue_lock:
+            reason = self.check_admission(job)
+            if reason:
+                self.queue_stats[f"rejected_{reason}"] += 1
+                versions.bump("queue")
+                return reason
+            self.enqueue_job(job)
+            return None
+    
+    def admit_jobs(self, jobs: List[EngraveJob]) -> List[Optional[str]]:
+        """Admit many jobs under a single lock acquisition. Returns one rejection reason (or None) per job."""
+        results = []
+        admitted = []
+        with self.queue_lock:
+            for job in jobs:
+                reason = self.check_admission(job)
+                if reason:
+                    self.queue_stats[f"rejected_{reason}"] += 1
+                else:
+                    self._append_job(job)
+                    admitted.append(job)
+                results.append(reason)
+            self._journal_enqueue(admitted)
+            versions.bump("queue")
+        return results
+    
+    def admit_batch(self, jobs: List[EngraveJob]) -> Optional[str]:
+        """
+        Enqueue all jobs or none, so a batch never runs partly. Returns the
+        reason the batch was rejected ("duplicate", "queue_full" or
+        "site_full", as for admit_job) or None once every job is queued.
+        """
+        limits = self.queue_limits()
+        per_site = Counter(job.site for job in jobs)
+        with self.queue_lock:
+            orders = [job.orderNo for job in jobs]
+            if len(set(orders)) < len(orders) or any(order in self._order_index for order in orders):
+                reason = "duplicate"
+            elif limits["max_length"] and len(self.queue) + len(jobs) > limits["max_length"]:
+                reason = "queue_full"
+            elif limits["max_per_site"] and any(self._site_depth.get(site, 0) + count > limits["max_per_site"] for site, count in per_site.items()):
+                reason = "site_full"
+            else:
+                self.enqueue_jobs(jobs)
+                versions.bump("queue")
+                return None
+            self.queue_stats[f"rejected_{reason}"] += len(jobs)
+            versions.bump("queue")
+            return reason
     
     def enqueue_job(self, job: EngraveJob) -> None:
         """Add job to queue"""
+        self.enqueue_jobs([job])
+    
+    def enqueue_jobs(self, jobs: List[EngraveJob]) -> None:
+        """Add jobs to queue under one lock acquisition and one journal write"""
+        with self.queue_lock:
+            for job in jobs:
+                self._append_job(job)
+            self._journal_enqueue(jobs)
+    
+    def restore_jobs(self, records: List[Dict[str, Any]]) -> int:
+        """Rebuild the queue from journal records without journaling them again"""
+        with self.queue_lock:
+            for record in records:
+                job = EngraveJob.from_record(record)
+                job.seq = record.get("seq")
+                self._append_job(job)
+            return len(records)
+    
+    def dequeue_job(self, job: EngraveJob, acknowledge: bool = True) -> bool:
+        """
+        Remove a specific job object from the queue. Returns True if it was queued.
+        With acknowledge=False the job stays in the journal until acknowledge_job()
+        is called, so a crash while it is being processed restores it on restart.
+        """
+        with self.queue_lock:
+            if not self.queue.remove(job):
+                return False
+            self._index_remove(job)
+            self.queue_stats["dequeued"] += 1
+            versions.bump("queue")
+            if acknowledge:
+                self._journal_dequeue([job])
+            elif job.seq is not None:
+                self._in_flight[job.seq] = job
+            return True
+    
+    def acknowledge_job(self, job: EngraveJob) -> None:
+        """Mark a job taken with dequeue_job(acknowledge=False) as finished"""
+        self.acknowledge_jobs([job])
+    
+    def acknowledge_jobs(self, jobs: List[EngraveJob]) -> None:
+        """Mark several claimed jobs as finished with one journal write"""
+        with self.queue_lock:
+            done = [job for job in jobs if job.seq is not None and self._in_flight.pop(job.seq, None) is not None]
+            if done:
+                self._journal_dequeue(done)
+    
+    def _append_job(self, job: EngraveJob) -> None:
         self.queue.append(job)
+        self._index_add(job)
+        self.queue_stats["enqueued"] += 1
+        versions.bump("queue")
+    
+    def _journal_enqueue(self, jobs: List[EngraveJob]) -> None:
+        if self.journal is None or not jobs:
+            return
+        seqs = self.journal.append([job.to_record() for job in jobs])
+        for job, seq in zip(jobs, seqs):
+            job.seq = seq
+    
+    def _journal_dequeue(self, jobs: List[EngraveJob]) -> None:
+        if self.journal is None:
+            return
+        seqs = [job.seq for job in jobs if job.seq is not None]
+        if seqs:
+            self.journal.tombstone(seqs)
+        if self.journal.needs_compaction():
+            live = list(self._in_flight.values()) + list(self.queue)
+            self.journal.compact([{**job.to_record(), "seq": job.seq} for job in live if job.seq is not None])
+    
+    def site_depth(self, site: str) -> int:
+        """Number of queued jobs for a site"""
+        return self._site_depth.get(site, 0)
+    
+    def oldest_wait_s(self, site: str) -> float:
+        """Seconds the oldest queued job for a site has waited (0 if none)"""
+        with self.queue_lock:
+            if not self._site_depth.get(site):
+                return 0.0
+            for job in self.queue:
+                if job.site == site:
+                    return max(0.0, time.time() - job.enqueued_at)
+        return 0.0
+    
+    def get_queue_stats(self) -> Dict[str, Any]:
+        """Get queue depth, limits and admission counters"""
+        with self.queue_lock:
+            return {
+                "depth": len(self.queue),
+                "siteDepth": dict(self._site_depth),
+                "limits": self.queue_limits(),
+                "counters": dict(self.queue_stats)
+            }
     
     def get_queue_jobs(self) -> List[Dict[str, str]]:
         """Get current queue as list of dicts"""
-        return [{"orderNo": j.orderNo, "laserText": j.laserText, "site": j.site} for j in self.queue]
+        with self.queue_lock:
+            return [{"orderNo": j.orderNo, "laserText": j.laserText, "site": j.site} for j in self.queue]
     
     def remove_job(self, order_no: str) -> bool:
         """Remove job from queue by orderNo. Returns True if found and removed."""
-        for job in list(self.queue):
-            if job.orderNo == order_no:
-                self.queue.remove(job)
-                return True
-        return False
+        with self.queue_lock:
+            job = self.queue.find(order_no)
+            return job is not None and self.dequeue_job(job)
     
     def clear_queue(self) -> int:
         """Clear all jobs from queue. Returns number of jobs cleared."""
-        count = len(self.queue)
-        self.queue.clear()
-        return count
+        with self.queue_lock:
+            count = len(self.queue)
+            self.queue.clear()
+            self._order_index.clear()
+            self._site_depth.clear()
+            self.queue_stats["dequeued"] += count
+            if self.journal is not None:
+                # Keep in-flight jobs recoverable, drop everything else
+                self.journal.compact([{**job.to_record(), "seq": job.seq} for job in self._in_flight.values()])
+            versions.bump("queue")
+            return count
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Queued jobs and admission counters, for replicas"""
+        with self.queue_lock:
+            return {
+                "jobs": [job.to_record() for job in self.queue],
+                "counters": dict(self.queue_stats)
+            }
+    
+    def load_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """Replace the queue with one taken by snapshot()"""
+        with self.queue_lock:
+            self.queue.clear()
+            self._order_index.clear()
+            self._site_depth.clear()
+            for record in snapshot["jobs"]:
+                job = EngraveJob.from_record(record)
+                self.queue.append(job)
+                self._index_add(job)
+            self.queue_stats.update(snapshot["counters"])
     
     def _toggle_billing(self, active: bool) -> None:
         """Toggle billing window active/inactive"""
         self.billing_window_active = active
+        if self.on_billing is not None:
+            self.on_billing(self.agv["deviceId"], active)
     
     def _agv_add_distance_if_billed(self, delta_m: float) -> None:
         """Add distance to AGV billing only if billing window is active"""
         if self.billing_window_active:
             self.agv["usageBilling"]["distanceTraveled"] += delta_m
+            touch_device(self.agv, "billing")
+            AGV_BILLED_METERS.inc(delta_m)
     
     def _agv_move_to(self, target_xy: Tuple[float, float], billed: bool = False) -> None:
         """Move AGV to target position"""
+        started = time.perf_counter()
         pose = self.agv["operationalData"]["pose"]
         speed = self.config["agv"]["speed_m_per_s"]
         step = speed * 0.1  # 100ms time steps
+        step_sleep_s = 0.1 * self.config.get("time_scale", 1.0)
         
         self._toggle_billing(billed)
         start_xy = (pose["posX"], pose["posY"])
         leg_len = dist(start_xy, target_xy) or 1.0
         
-        self.agv["operationalData"]["status"]["operationMode"] = "Running"
+        set_operation_mode(self.agv, "Running")
         
         while True:
             before = (pose["posX"], pose["posY"])
             arrived = move_pose_towards(pose, target_xy, step)
+            touch_device(self.agv, "pose")
             after = (pose["posX"], pose["posY"])
             moved = dist(before, after)
             
@@ -121,14 +530,22 @@ class Orchestrator:
             if arrived:
                 break
                 
-            time.sleep(0.1)  # 100ms simulation step
+            if step_sleep_s:
+                time.sleep(step_sleep_s)  # 100ms simulation step, scaled
         
-        self.agv["operationalData"]["status"]["operationMode"] = "Idle"
+        set_operation_mode(self.agv, "Idle")
         set_progress(self.agv, 100)
+        AGV_LEG_SECONDS.observe(time.perf_counter() - started, billed="true" if billed else "false")
 
-def run_engrave_job(device: Dict[str, Any], orderNo: str, laserText: str, config: Dict[str, Any]) -> Dict[str, Any]:
+def run_engrave_job(device: Dict[str, Any], orderNo: str, laserText: str, config: Dict[str, Any], power_preset: Optional[str] = None) -> Dict[str, Any]:
     """Run engraving job with exact AAS field updates and return job details"""
     assert device["deviceType"] == "Engraver"
+    with log_context(orderNo=orderNo), span(f"engrave {orderNo}", "engrave", orderNo=orderNo, letters=len(laserText or ""), deviceId=device["deviceId"]):
+        return _run_engrave_job(device, orderNo, laserText, config, power_preset)
+
+def _run_engrave_job(device: Dict[str, Any], orderNo: str, laserText: str, config: Dict[str, Any], power_preset: Optional[str] = None) -> Dict[str, Any]:
+    started = time.perf_counter()
+    started_at = time.time()
     
     progress_step = config["progress_step"]
     sleep_s = config["poll_interval_s"]
@@ -143,43 +560,51 @@ def run_engrave_job(device: Dict[str, Any], orderNo: str, laserText: str, config
     od_order["transportRequired"] = False
     od_order["orderState"] = "Created"
     od_order["lastChangeAt"] = now_iso()
+    touch_device(device, "order")
     
-    od_status["operationMode"] = "Running"
+    set_operation_mode(device, "Running")
     set_progress(device, 0)
     
-    # Calculate runtime and energy
+    # Runtime and energy come from the preset's precomputed table
+    # (the default config's Standard preset gives the paper's 0.074 kWh / 31.08 g for 5 letters)
     letters = len(laserText or "")
-    seconds_per_letter = config["engraver"]["seconds_per_letter"]
-    total_time_s = max(1.0, letters * seconds_per_letter)
+    table = preset_table(config["engraver"], power_preset)
+    total_time_s, energy = table.lookup(letters)
     
     # Simulate progress based on actual job time
     elapsed = 0.0
     total_loops = int(100 / progress_step)  # Number of iterations needed
-    sleep_per_loop = total_time_s / total_loops  # Time per iteration based on actual job duration
+    sleep_per_loop = total_time_s / total_loops * config.get("time_scale", 1.0)  # Time per iteration based on actual job duration
 
     while od_status["productionProgress"] < 100:
         bump_heartbeat(device)
         set_progress(device, od_status["productionProgress"] + progress_step)
-        time.sleep(sleep_per_loop)  # Sleep proportional to actual job time
+        if sleep_per_loop:
+            time.sleep(sleep_per_loop)  # Sleep proportional to actual job time
         elapsed += sleep_per_loop
     
     # Finish order
     od_order["orderState"] = "Done"
     od_order["lastChangeAt"] = now_iso()
-    od_status["operationMode"] = "Idle"
+    touch_device(device, "order")
+    set_operation_mode(device, "Idle")
     set_progress(device, 100)
     
     # Calculate and update billing with exact AAS fields
-    # Force EXACT parameters from Paper to ensure 0.074 kWh / 31.08g result
-    base_idle = 0.02
-    k_laser = 0.002
-    power_factor = 1.0
-    print(f"DEBUG: Billing Job {orderNo} | Letters {len(laserText)} | Time {total_time_s:.2f}s | Base {base_idle} | Cost {base_idle + (k_laser * power_factor * total_time_s):.6f}")
-    
-    energy = base_idle + (k_laser * power_factor * total_time_s)
-    emission_factor = device["usageBilling"]["emissionFactor"]
+    # Price and emission factor averaged over the job's engraving time [start, start + total_time_s]
+    tariff, emission = billing_schedules(config, device["usageBilling"])
+    price = tariff.mean(started_at, started_at + total_time_s)
+    emission_factor = emission.mean(started_at, started_at + total_time_s)
     co2 = energy * emission_factor
-    cost = energy * device["usageBilling"]["costPerEnergyUnit"]
+    cost = energy * price
+    job_logger.info("Billed engrave job", extra={
+        "letters": letters,
+        "seconds": round(total_time_s, 3),
+        "powerPreset": table.name,
+        "energy_kWh": round(energy, 6),
+        "price_eur_per_kWh": round(price, 6),
+        "cost_eur": round(cost, 6)
+    })
     
     ub = device["usageBilling"]
     ub["energyConsumed"] = round(energy, 6)
@@ -189,36 +614,54 @@ def run_engrave_job(device: Dict[str, Any], orderNo: str, laserText: str, config
     ub["billingStatus"] = "Open"
     ub["lastBilledAt"] = now_iso()
     ub["lastUpdated"] = now_iso()
+    touch_device(device, "billing")
+    ENGRAVE_JOB_SECONDS.observe(time.perf_counter() - started)
     
     # Return individual job details for tracking
     return {
         "order_no": orderNo,
         "laser_text": laserText,
         "letters": letters,
+        "power_preset": table.name,
+        "seconds": round(total_time_s, 3),
         "energy_kWh": round(energy, 6),
         "co2_g": round(co2, 6), 
         "cost_eur": round(cost, 6),
+        "tariff_eur_per_kWh": round(price, 6),
+        "emission_factor_g_per_kWh": round(emission_factor, 6),
+        "started_at": datetime.fromtimestamp(started_at, timezone.utc).isoformat(),
         "completed_at": now_iso()
     }
 
-def run_cycle_for_site(orch: Orchestrator, site_key: str = "JOB_POS1", max_jobs_in_cycle: Optional[int] = None) -> Dict[str, Any]:
+def run_cycle_for_site(orch: Orchestrator, site_key: str = "JOB_POS1", max_jobs_in_cycle: Optional[int] = None, order_nos: Optional[List[str]] = None, on_billed: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
     """
     Run complete cycle for a site with exact billed/non-billed leg tracking:
     1. HOME → ENGRAVER_DOCK (non-billed)
     2. ENGRAVER_DOCK → JOB_POSx (billed) 
-    3. Process all jobs at site (continuous mode)
+    3. Process all jobs of the AGV load at site (continuous mode)
     4. JOB_POSx → ENGRAVER_DOCK (billed)
     5. ENGRAVER_DOCK → HOME (non-billed)
+    Legs 2-4 repeat for each load when the batch exceeds the AGV payload.
+    With order_nos, only those queued jobs are claimed (a composer run's own).
+    Each job leaves the queue journal once engraved; with on_billed the whole
+    batch stays until on_billed(summary) has recorded the bill, so a crash in
+    between re-runs the jobs instead of losing their billing.
     """
+    with span(f"cycle {site_key}", site=site_key, engraverId=orch.engraver["deviceId"], agvId=orch.agv["deviceId"]):
+        return _run_cycle_for_site(orch, site_key, max_jobs_in_cycle, order_nos, on_billed)
+
+def _agv_leg(orch: Orchestrator, number: int, origin: str, target: str, billed: bool, **args: Any) -> None:
+    """Drive one numbered leg of a cycle as its own span"""
+    with span(f"leg {number}: {origin} -> {target}", "agv", billed=billed, **args):
+        orch._agv_move_to(orch.coords[target], billed=billed)
+
+def _run_cycle_for_site(orch: Orchestrator, site_key: str, max_jobs_in_cycle: Optional[int], order_nos: Optional[List[str]] = None, on_billed: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
     start_time = now_iso()
+    started = time.perf_counter()
     
-    # Find jobs for this site
-    batch = []
-    for job in list(orch.queue):
-        if job.site == site_key:
-            batch.append(job)
-            if max_jobs_in_cycle and len(batch) >= max_jobs_in_cycle:
-                break
+    # Claim jobs for this site
+    with span("claim batch", "queue"):
+        batch = orch.claim_batch(site_key, max_jobs_in_cycle, order_nos)
     
     if not batch:
         return {"error": "No jobs found for site", "site": site_key}
@@ -233,33 +676,45 @@ def run_cycle_for_site(orch: Orchestrator, site_key: str = "JOB_POS1", max_jobs_
     eng_ub["energyConsumed"] = 0.0
     eng_ub["carbonEmissions"] = 0.0
     eng_ub["usageCost"] = 0.0
+    touch_device(orch.agv, "billing")
+    touch_device(orch.engraver, "billing")
     
-    # 1. HOME → ENGRAVER_DOCK (non-billed)
-    orch._agv_move_to(orch.coords["ENGRAVER_DOCK"], billed=False)
+    # Pack the batch into as few AGV loads as the payload limits allow
+    max_load_jobs, max_load_kg, job_kg = payload_limits(orch.config)
+    weights = [job.weightKg or job_kg for job in batch]
+    loads = pack_trips(list(zip(batch, weights)), weights, max_load_jobs, max_load_kg)
     
-    # 2. ENGRAVER_DOCK → JOB_POSx (billed)
-    orch._agv_move_to(orch.coords[site_key], billed=True)
+    # 1. HOME → ENGRAVER_DOCK (non-billed)
+    _agv_leg(orch, 1, "HOME", "ENGRAVER_DOCK", billed=False)
     
-    # 3. Process all jobs at site (continuous mode - no AGV movement between jobs)
     jobs_processed = []
     individual_jobs = []
-    for job in list(orch.queue):
-        if job in batch:
-            orch.queue.remove(job)
-            job_details = run_engrave_job(orch.engraver, job.orderNo, job.laserText, orch.config)
-            jobs_processed.append(job.orderNo)
-            individual_jobs.append(job_details)
-            
-            # Accumulate energy and CO2 for the cycle
-            eng_ub["energyConsumed"] += job_details["energy_kWh"]
-            eng_ub["carbonEmissions"] += job_details["co2_g"]
-            eng_ub["usageCost"] += job_details["cost_eur"]
-    
-    # 4. JOB_POSx → ENGRAVER_DOCK (billed)
-    orch._agv_move_to(orch.coords["ENGRAVER_DOCK"], billed=True)
+    trips = []
+    for trip, load in enumerate(loads, 1):
+        # 2. ENGRAVER_DOCK → JOB_POSx (billed)
+        _agv_leg(orch, 2, "ENGRAVER_DOCK", site_key, billed=True, trip=trip)
+        
+        # 3. Process the load's jobs at site (continuous mode - no AGV movement between jobs)
+        with span(f"leg 3: engrave {len(load)} jobs at {site_key}", "engrave", jobs=len(load), trip=trip):
+            for job, _ in load:
+                job_details = run_engrave_job(orch.engraver, job.orderNo, job.laserText, orch.config, job.powerPreset)
+                if on_billed is None:
+                    orch.acknowledge_job(job)
+                jobs_processed.append(job.orderNo)
+                individual_jobs.append(job_details)
+                
+                # Accumulate energy and CO2 for the cycle
+                eng_ub["energyConsumed"] += job_details["energy_kWh"]
+                eng_ub["carbonEmissions"] += job_details["co2_g"]
+                eng_ub["usageCost"] += job_details["cost_eur"]
+                touch_device(orch.engraver, "billing")
+        
+        # 4. JOB_POSx → ENGRAVER_DOCK (billed)
+        _agv_leg(orch, 4, site_key, "ENGRAVER_DOCK", billed=True, trip=trip)
+        trips.append({"jobs": [job.orderNo for job, _ in load], "weightKg": round(sum(kg for _, kg in load), 6)})
     
     # 5. ENGRAVER_DOCK → HOME (non-billed)
-    orch._agv_move_to(orch.coords["HOME"], billed=False)
+    _agv_leg(orch, 5, "ENGRAVER_DOCK", "HOME", billed=False)
     
     # Finalize billing
     end_time = now_iso()
@@ -272,12 +727,17 @@ def run_cycle_for_site(orch: Orchestrator, site_key: str = "JOB_POS1", max_jobs_
     ub["billingStatus"] = "Open"
     ub["lastBilledAt"] = end_time
     ub["lastUpdated"] = end_time
+    touch_device(orch.agv, "billing")
     
     # Create cycle summary
     summary = {
         "site": site_key,
+        "engraverId": orch.engraver["deviceId"],
+        "agvId": orch.agv["deviceId"],
         "jobsProcessed": jobs_processed,
         "individualJobs": individual_jobs,  # Include individual job details
+        "trips": trips,  # AGV loads, each one billed round trip
+        "billedTrips": len(trips),
         "agvBilledMeters": ub["distanceTraveled"],
         "agvCostEUR": ub["usageCost"],
         "engraverEnergyKWh": eng_ub["energyConsumed"],
@@ -288,7 +748,13 @@ def run_cycle_for_site(orch: Orchestrator, site_key: str = "JOB_POS1", max_jobs_
         "startedAt": start_time,
         "endedAt": end_time
     }
+    CYCLE_SECONDS.observe(time.perf_counter() - started, site=site_key)
+    CYCLE_JOBS.observe(len(jobs_processed))
     
+    if on_billed is not None:
+        # Record the bill before the jobs leave the journal
+        on_billed(summary)
+        orch.acknowledge_jobs(batch)
     return summary
 
 def run_scenario_1(orch: Orchestrator) -> Dict[str, Any]:
@@ -0,0 +1,167 @@
+"""Engraver power presets and their precomputed time/energy tables"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.logging import get_logger
+from app.core.tariff import billing_schedules, bill_jobs
+
+logger = get_logger("presets")
+
+# Letter counts covered by each table; longer texts are computed on the fly
+TABLE_LETTERS = 512
+
+# Tables kept across all cells' configs; each is a few KB
+MAX_TABLES = 64
+
+# Neutral factors for a preset that leaves a value out (idle_kWh falls back to baseIdle_kWh)
+PRESET_DEFAULTS = {"power_factor": 1.0, "speed_multiplier": 1.0, "idle_kWh": None}
+
+class PresetTable:
+    """
+    Engraving seconds and kWh per letter count for one preset:
+    seconds = max(1, letters x seconds_per_letter / speed_multiplier),
+    kWh = idle_kWh + k_laser x power_factor x seconds
+    """
+
+    def __init__(self, name: str, seconds_per_letter: float, k_laser: float, idle_kWh: float, power_factor: float, speed_multiplier: float):
+        self.name = name
+        self.seconds_per_letter = seconds_per_letter
+        self.k_laser = k_laser
+        self.idle_kWh = idle_kWh
+        self.power_factor = power_factor
+        self.speed_multiplier = speed_multiplier
+        self.seconds = [self._seconds(letters) for letters in range(TABLE_LETTERS + 1)]
+        self.energy = [self._energy(seconds) for seconds in self.seconds]
+
+    def _seconds(self, letters: int) -> float:
+        return max(1.0, letters * self.seconds_per_letter / self.speed_multiplier)
+
+    def _energy(self, seconds: float) -> float:
+        return self.idle_kWh + self.k_laser * self.power_factor * seconds
+
+    def lookup(self, letters: int) -> Tuple[float, float]:
+        """(seconds, kWh) of engraving this many letters"""
+        if letters <= TABLE_LETTERS:
+            return self.seconds[letters], self.energy[letters]
+        seconds = self._seconds(letters)
+        return seconds, self._energy(seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "powerFactor": self.power_factor,
+            "speedMultiplier": self.speed_multiplier,
+            "idleKWh": self.idle_kWh,
+            "secondsPerLetter": round(self.seconds_per_letter / self.speed_multiplier, 6),
+            "tableLetters": TABLE_LETTERS
+        }
+
+_tables: "OrderedDict[Tuple, PresetTable]" = OrderedDict()
+_tables_lock = threading.Lock()
+
+def resolve_preset(engraver: Dict[str, Any], name: Optional[str] = None) -> str:
+    """The preset a job runs with: its own, else default_powerPreset; ValueError if it is not configured"""
+    presets = engraver.get("power_presets") or {}
+    name = name or engraver.get("default_powerPreset") or "Standard"
+    if presets and name not in presets:
+        raise ValueError(f"Unknown power preset '{name}'. Available: {list(presets)}")
+    return name
+
+def _signature(engraver: Dict[str, Any], name: str) -> Tuple:
+    preset = {**PRESET_DEFAULTS, **((engraver.get("power_presets") or {}).get(name) or {})}
+    idle = preset["idle_kWh"] if preset["idle_kWh"] is not None else engraver["baseIdle_kWh"]
+    return (name, engraver["seconds_per_letter"], engraver["k_laser_kWh_per_sec_at_power1"], idle, preset["power_factor"], preset["speed_multiplier"])
+
+def _table(signature: Tuple) -> Tuple[PresetTable, bool]:
+    """Cached table for a signature, and whether it had to be built"""
+    with _tables_lock:
+        table = _tables.get(signature)
+        if table is not None:
+            _tables.move_to_end(signature)
+            return table, False
+    table = PresetTable(*signature)
+    with _tables_lock:
+        _tables[signature] = table
+        while len(_tables) > MAX_TABLES:
+            _tables.popitem(last=False)
+    return table, True
+
+def preset_table(engraver: Dict[str, Any], name: Optional[str] = None) -> PresetTable:
+    """
+    Table of the named (or default) preset for this engraver config. A preset
+    that is no longer configured falls back to the default one, so jobs queued
+    before a preset was removed still run.
+    """
+    try:
+        name = resolve_preset(engraver, name)
+    except ValueError:
+        # Removed since the job was queued: run as the default (neutral factors if that is missing too)
+        name = engraver.get("default_powerPreset") or "Standard"
+    return _table(_signature(engraver, name))[0]
+
+def merge_presets(engraver: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The engraver's presets after a config PATCH: fields merge into existing
+    presets, new names are added, a null preset removes it and a null field
+    resets to its PRESET_DEFAULTS value. ValueError if the default preset
+    would no longer exist.
+    """
+    presets = {name: dict(preset) for name, preset in (engraver.get("power_presets") or {}).items()}
+    for name, preset in (updates.get("power_presets") or {}).items():
+        if preset is None:
+            presets.pop(name, None)
+        else:
+            fields = {key: PRESET_DEFAULTS.get(key) if value is None else value for key, value in preset.items()}
+            presets[name] = {**PRESET_DEFAULTS, **presets.get(name, {}), **fields}
+    default = updates.get("default_powerPreset") or engraver.get("default_powerPreset")
+    if presets and default not in presets:
+        raise ValueError(f"Default power preset '{default}' is not one of the presets {list(presets)}")
+    return presets
+
+def build_preset_tables(engraver: Dict[str, Any]) -> List[str]:
+    """
+    Precompute the tables of every configured preset. Only presets whose
+    parameters changed since they were last built are recomputed; returns them.
+    ValueError if a preset's parameters cannot be computed with.
+    """
+    names = list(engraver.get("power_presets") or {}) or [resolve_preset(engraver)]
+    try:
+        rebuilt = [name for name in names if _table(_signature(engraver, name))[1]]
+    except (TypeError, ZeroDivisionError) as e:
+        raise ValueError(f"Invalid power preset parameters: {e}")
+    if rebuilt:
+        logger.debug("Built power preset tables", extra={"presets": rebuilt})
+    return rebuilt
+
+def quote_jobs(config: Dict[str, Any], usage_billing: Dict[str, Any], jobs: List[Tuple[str, Optional[str]]], start: float) -> Dict[str, Any]:
+    """
+    Engraving time, energy, cost and CO2 of (laserText, preset) jobs from
+    table lookups, priced as if run back to back from start. ValueError for
+    an unknown preset.
+    """
+    engraver = config["engraver"]
+    tables = {}
+    quoted = []
+    t = start
+    for text, name in jobs:
+        name = resolve_preset(engraver, name)
+        if name not in tables:
+            tables[name] = preset_table(engraver, name)
+        seconds, energy = tables[name].lookup(len(text or ""))
+        quoted.append((name, t, t + seconds, energy))
+        t += seconds
+    tariff, emission = billing_schedules(config, usage_billing)
+    costs, co2s = bill_jobs([job[1:] for job in quoted], tariff, emission)
+    return {
+        "jobs": [
+            {"powerPreset": name, "seconds": round(t1 - t0, 3), "energyKWh": round(energy, 6), "costEUR": round(cost, 6), "co2g": round(co2, 6)}
+            for (name, t0, t1, energy), cost, co2 in zip(quoted, costs, co2s)
+        ],
+        "totals": {
+            "jobs": len(quoted),
+            "seconds": round(t - start, 3),
+            "energyKWh": round(sum(job[3] for job in quoted), 6),
+            "costEUR": round(sum(costs), 6),
+            "co2g": round(sum(co2s), 6)
+        }
+    }
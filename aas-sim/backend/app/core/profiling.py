@@ -0,0 +1,232 @@
+"""Opt-in profiling of selected routes and cycle runs, aggregated in memory"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+PROFILE_MODES = ("off", "sample", "cprofile")
+
+# Distinct collapsed stacks kept; samples of further stacks are counted under TRUNCATED_STACK
+MAX_STACKS = 10_000
+TRUNCATED_STACK = "[other stacks]"
+
+# Frames kept per sample, innermost first
+MAX_STACK_DEPTH = 64
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+class ProfileBlock:
+    """One profiled with-block; its samples are merged when it ends unless discard() was called"""
+
+    __slots__ = ("target", "stacks", "keep")
+
+    def __init__(self, target: str):
+        self.target = target
+        self.stacks: Counter = Counter()
+        self.keep = True
+
+    def discard(self) -> None:
+        """Drop what this block collected, e.g. because other work shared its thread"""
+        self.keep = False
+
+class Profiler:
+    """
+    Profiles with-blocks wrapped in profile(target) while enabled.
+    "sample" mode records the stack of every profiled thread each
+    interval_s into collapsed-stack counts (flamegraph.pl / speedscope);
+    "cprofile" mode runs cProfile around each block and merges the
+    results into one pstats table. Only one cProfile profiler can be
+    active per process, so cProfile blocks never overlap: a block that
+    starts while another one runs is not profiled and is counted as
+    skipped. When disabled nothing is recorded and callers only pay for
+    checking `enabled`.
+    """
+
+    def __init__(self):
+        self.mode = "off"
+        self.routes: List[str] = ["/api/v1"]
+        self.cycles = True
+        self.interval_s = 0.005
+        self.started_at: Optional[float] = None
+        self._active: Dict[int, ProfileBlock] = {}   # thread ident -> block being profiled
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._profiled = 0
+        self._skipped = 0     # blocks not profiled because another cProfile block was running
+        self._discarded = 0   # blocks whose data was dropped by discard()
+        self._cprofile_guard = threading.Lock()   # held by the one running cProfile block
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def configure(self, mode: str, routes: Optional[List[str]] = None, cycles: Optional[bool] = None, interval_s: Optional[float] = None) -> None:
+        """Switch mode ("off", "sample" or "cprofile") and what to profile; collected data is kept"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'. Available: {list(PROFILE_MODES)}")
+        if routes is not None:
+            self.routes = [route for route in routes if route]
+        if cycles is not None:
+            self.cycles = cycles
+        if interval_s is not None:
+            self.interval_s = max(interval_s, 0.001)
+        self.mode = mode
+        if mode == "off":
+            return
+        if self.started_at is None:
+            self.started_at = time.time()
+        if mode == "sample" and (self._sampler is None or not self._sampler.is_alive()):
+            self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+            self._sampler.start()
+
+    def reset(self) -> None:
+        """Drop everything collected so far"""
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+            self._stats = None
+            self._profiled = 0
+            self._skipped = 0
+            self._discarded = 0
+            self.started_at = time.time() if self.enabled else None
+
+    def wants_route(self, path: str) -> bool:
+        return self.enabled and any(path.startswith(route) for route in self.routes)
+
+    def wants_cycles(self) -> bool:
+        return self.enabled and self.cycles
+
+    @contextmanager
+    def profile(self, target: str) -> Iterator[Optional[ProfileBlock]]:
+        """
+        Profile a with-block under `target`, yielding its ProfileBlock (None
+        when it is not profiled). A thread that is already being profiled is
+        not profiled twice.
+        """
+        ident = threading.get_ident()
+        if not self.enabled or ident in self._active:
+            yield None
+            return
+        profile = None
+        if self.mode == "cprofile":
+            # Never waits: a block that would overlap the running one just goes unprofiled
+            if not self._cprofile_guard.acquire(blocking=False):
+                with self._lock:
+                    self._skipped += 1
+                yield None
+                return
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler (e.g. an external tool) owns the profiling hook
+                self._cprofile_guard.release()
+                with self._lock:
+                    self._skipped += 1
+                yield None
+                return
+        block = ProfileBlock(target)
+        self._active[ident] = block
+        try:
+            yield block
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._cprofile_guard.release()
+            del self._active[ident]
+            self._record_profile(block, profile)
+
+    def _record_profile(self, block: ProfileBlock, profile: Optional[cProfile.Profile]) -> None:
+        with self._lock:
+            if not block.keep:
+                self._discarded += 1
+                return
+            self._profiled += 1
+            for stack, count in block.stacks.items():
+                if stack not in self._stacks and len(self._stacks) >= MAX_STACKS:
+                    stack = f"{block.target};{TRUNCATED_STACK}"
+                self._stacks[stack] += count
+                self._samples += count
+            if profile is None:
+                return
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def _sample_loop(self) -> None:
+        while self.mode == "sample":
+            time.sleep(self.interval_s)
+            active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, block in active:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        self._count_stack(block, frame)
+
+    def _count_stack(self, block: ProfileBlock, frame) -> None:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        stack = ";".join([block.target] + names[::-1])
+        if stack not in block.stacks and len(block.stacks) >= MAX_STACKS:
+            stack = f"{block.target};{TRUNCATED_STACK}"
+        block.stacks[stack] += 1
+
+    def collapsed(self) -> str:
+        """Samples as "target;outer;...;inner count" lines"""
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def pstats_text(self, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+        """Merged cProfile statistics as a pstats report (None before anything was profiled in cprofile mode)"""
+        with self._lock:
+            if self._stats is None:
+                return None
+            stream = io.StringIO()
+            self._stats.stream = stream
+            self._stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def pstats_dump(self) -> Optional[bytes]:
+        """Merged statistics in the binary format written by pstats.Stats.dump_stats"""
+        with self._lock:
+            if self._stats is None:
+                return None
+            return marshal.dumps(self._stats.stats)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "mode": self.mode,
+                "routes": self.routes,
+                "cycles": self.cycles,
+                "intervalMs": round(self.interval_s * 1000, 3),
+                "startedAt": self.started_at,
+                "profiledBlocks": self._profiled,
+                "skippedBlocks": self._skipped,
+                "discardedBlocks": self._discarded,
+                "samples": self._samples,
+                "distinctStacks": len(self._stacks),
+                "activeThreads": len(self._active)
+            }
+
+profiler = Profiler()
@@ -0,0 +1,108 @@
+"""Device registry with O(1) lookup and secondary indexes"""
+import weakref
+from typing import Any, Dict, Iterator, List, Optional
+from app.core.context import current_cell
+
+# Aliases accepted wherever a deviceId is, resolving to the primary device of a type
+DEVICE_ALIASES = {"engraver": "Engraver", "agv": "AGV"}
+
+# Registries that want to hear about operation mode changes, by the cell that created them
+_registries: Dict[str, "weakref.WeakSet[DeviceRegistry]"] = {}
+
+def notify_mode_change(device: Dict[str, Any]) -> None:
+    """Re-index a device whose operationMode changed, in the registries of the current cell only"""
+    for registry in list(_registries.get(current_cell.get(), ())):
+        registry.refresh_status(device)
+
+class DeviceRegistry:
+    """
+    Devices keyed by deviceId, with secondary indexes by deviceType and
+    operationMode. The first device registered for a type is its primary,
+    which the "engraver"/"agv" aliases resolve to.
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, Dict[str, Any]] = {}
+        self._by_type: Dict[str, Dict[str, None]] = {}   # insertion-ordered ID sets
+        self._by_status: Dict[str, Dict[str, None]] = {}
+        self._status_of: Dict[str, str] = {}
+        self._primary: Dict[str, str] = {}
+        _registries.setdefault(current_cell.get(), weakref.WeakSet()).add(self)
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(list(self._devices.values()))
+
+    def register(self, device: Dict[str, Any], primary: bool = False) -> None:
+        """Add or replace a device"""
+        device_id = device["deviceId"]
+        if device_id in self._devices:
+            self.unregister(device_id)
+        device_type = device["deviceType"]
+        self._devices[device_id] = device
+        self._by_type.setdefault(device_type, {})[device_id] = None
+        if primary or device_type not in self._primary:
+            self._primary[device_type] = device_id
+        self._index_status(device_id, device["operationalData"]["status"]["operationMode"])
+
+    def unregister(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a device and return it"""
+        device = self._devices.pop(device_id, None)
+        if device is None:
+            return None
+        device_type = device["deviceType"]
+        self._by_type.get(device_type, {}).pop(device_id, None)
+        self._index_status(device_id, None)
+        if self._primary.get(device_type) == device_id:
+            remaining = self._by_type.get(device_type)
+            if remaining:
+                self._primary[device_type] = next(iter(remaining))
+            else:
+                del self._primary[device_type]
+        return device
+
+    def get(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Get device by deviceId or alias"""
+        device = self._devices.get(device_id)
+        if device is None and device_id in DEVICE_ALIASES:
+            primary_id = self._primary.get(DEVICE_ALIASES[device_id])
+            device = self._devices.get(primary_id) if primary_id else None
+        return device
+
+    def primary(self, device_type: str) -> Optional[Dict[str, Any]]:
+        """Get the primary device of a type"""
+        primary_id = self._primary.get(device_type)
+        return self._devices.get(primary_id) if primary_id else None
+
+    def is_primary(self, device_id: str) -> bool:
+        return device_id in self._primary.values()
+
+    def ids(self, device_type: Optional[str] = None, status: Optional[str] = None) -> List[str]:
+        """Device IDs, optionally filtered by type and/or operationMode"""
+        candidates = []
+        if device_type is not None:
+            candidates.append(self._by_type.get(device_type, {}))
+        if status is not None:
+            candidates.append(self._by_status.get(status, {}))
+        if not candidates:
+            return list(self._devices)
+        smallest = min(candidates, key=len)
+        return [device_id for device_id in smallest if all(device_id in index for index in candidates)]
+
+    def refresh_status(self, device: Dict[str, Any]) -> None:
+        """Re-index a device after its operationMode changed (ignored if not ours)"""
+        if self._devices.get(device["deviceId"]) is device:
+            self._index_status(device["deviceId"], device["operationalData"]["status"]["operationMode"])
+
+    def _index_status(self, device_id: str, status: Optional[str]) -> None:
+        previous = self._status_of.pop(device_id, None)
+        if previous is not None:
+            index = self._by_status.get(previous, {})
+            index.pop(device_id, None)
+            if not index:
+                self._by_status.pop(previous, None)
+        if status is not None:
+            self._status_of[device_id] = status
+            self._by_status.setdefault(status, {})[device_id] = None
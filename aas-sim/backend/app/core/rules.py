@@ -1,6 +1,9 @@
 """Core business rules and constants for AAS simulation"""
 import os
 import yaml
+from app.core.logging import get_logger
+
+logger = get_logger("rules")
 
 def load_config():
     """Load configuration from yaml file"""
@@ -9,7 +12,7 @@ def load_config():
         with open(config_path, "r") as f:
             return yaml.safe_load(f)
     except Exception as e:
-        print(f"Error loading config.yaml: {e}. Using defaults.")
+        logger.warning("Error loading config.yaml, using defaults", extra={"path": config_path, "error": str(e)})
         return {
             "currency": "EUR",
             "engraver": {
@@ -18,14 +21,36 @@ def load_config():
                 "baseIdle_kWh": 0.02,
                 "k_laser_kWh_per_sec_at_power1": 0.002,
                 "default_powerPreset": "Standard",
-                "seconds_per_letter": 0.5
+                "power_presets": {
+                    "Eco": {"power_factor": 0.6, "speed_multiplier": 0.75, "idle_kWh": 0.015},
+                    "Standard": {"power_factor": 1.0, "speed_multiplier": 1.0, "idle_kWh": None},
+                    "High": {"power_factor": 1.5, "speed_multiplier": 1.4, "idle_kWh": 0.03}
+                },
+                "seconds_per_letter": 0.5,
+                "tariff_file": "",
+                "emission_factor_file": ""
             },
             "agv": {
                 "costPerMeter_EUR": 0.02,
-                "speed_m_per_s": 0.5
+                "speed_m_per_s": 0.5,
+                "payload_max_jobs": 10,
+                "payload_max_kg": 20.0,
+                "job_weight_kg": 1.0
+            },
+            "queue": {
+                "max_length": 1000,
+                "max_per_site": 500,
+                "retry_after_s": 5
+            },
+            "batching": {
+                "max_jobs": None,
+                "min_batch": 1,
+                "max_wait_s": None,
+                "max_agv_cost_per_job": None
             },
             "progress_step": 5,
             "poll_interval_s": 0.05,
+            "time_scale": 1.0,
             "coords": {
                 "HOME": (0.0, 0.0),
                 "ENGRAVER_DOCK": (5.0, 0.0),
@@ -0,0 +1,350 @@
+"""Shared-state mode: one owner process publishes cell state to SQLite, HTTP workers serve read-only replicas"""
+import copy
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from app.core.cells import run_in_cell
+from app.core.context import current_cell
+from app.core.history_index import HistoryIndex
+from app.core.logging import get_logger
+from app.core.orchestrator import Orchestrator
+from app.core.rules import DEFAULT_CONFIG, DEFAULT_COORDS
+from app.core.state import SimulationState, make_engraver, make_agv
+from app.core.versioning import versions, touch_device, BOOT_ID
+
+logger = get_logger("shared")
+
+SHARED_DB_FILE = "simulation_shared.db"
+
+# Bumps arriving within this window are published together
+PUBLISH_INTERVAL_S = 0.02
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    cell TEXT NOT NULL,
+    name TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    body TEXT,
+    PRIMARY KEY (cell, name)
+);
+CREATE INDEX IF NOT EXISTS sections_by_generation ON sections (cell, generation);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+"""
+
+class SharedStore:
+    """
+    SQLite file holding the published sections of every cell.
+    The owner is the only writer and commits each publish as one
+    BEGIN IMMEDIATE transaction that also advances the cell's generation;
+    workers read in WAL mode, so readers never block the writer.
+    A NULL body is the tombstone of a removed section.
+    """
+
+    def __init__(self, path: str = SHARED_DB_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must stay on the thread that opened them
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def reset(self, boot_id: str) -> None:
+        """Drop every section and record the boot of a new owner"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM sections")
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('boot', ?)", (boot_id,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def publish(self, cell_id: str, changes: Dict[str, Optional[str]]) -> int:
+        """Write encoded section bodies (None removes a section). Returns the cell's new generation."""
+        connection = self._connection()
+        generation_key = f"generation:{cell_id}"
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT value FROM meta WHERE key = ?", (generation_key,)).fetchone()
+            generation = (row[0] if row else 0) + 1
+            connection.executemany(
+                "INSERT OR REPLACE INTO sections (cell, name, generation, body) VALUES (?, ?, ?, ?)",
+                [(cell_id, name, generation, body) for name, body in changes.items()]
+            )
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (generation_key, generation))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return generation
+
+    def head(self, cell_id: str) -> Tuple[Optional[str], Optional[int]]:
+        """Owner boot ID and the cell's generation (None if the cell was never published)"""
+        rows = dict(self._connection().execute(
+            "SELECT key, value FROM meta WHERE key IN ('boot', ?)", (f"generation:{cell_id}",)
+        ).fetchall())
+        return rows.get("boot"), rows.get(f"generation:{cell_id}")
+
+    def changes(self, cell_id: str, since: int) -> List[Tuple[str, Optional[str]]]:
+        """(name, body) of sections published after generation `since`"""
+        return self._connection().execute(
+            "SELECT name, body FROM sections WHERE cell = ? AND generation > ? ORDER BY generation",
+            (cell_id, since)
+        ).fetchall()
+
+# Sections named after a state-wide version key; devices and runs add one per entry
+CELL_SECTIONS = ("config", "billing", "jobs", "queue", "fleet")
+
+def section_of(key: str) -> Optional[str]:
+    """Name of the section a version key covers, if any (device submodel keys map to their device)"""
+    kind, _, rest = key.partition(":")
+    if kind == "device":
+        return f"device:{rest.partition(':')[0]}"
+    if kind == "run" or key in CELL_SECTIONS:
+        return key
+    return None
+
+def section_names(state: SimulationState) -> List[str]:
+    """Every publishable section of a cell. Must be called with the state lock held."""
+    names = list(CELL_SECTIONS)
+    names.extend(f"device:{device['deviceId']}" for device in state.devices)
+    names.extend(f"run:{run_id}" for run_id in state.run_history)
+    return names
+
+def detach_section(state: SimulationState, name: str) -> Optional[Callable[[], str]]:
+    """
+    Capture a section while the state lock is held and return a function that
+    encodes it once the lock is released, or None if the section is gone.
+    Small sections are encoded right away; the queue and fleet have their own
+    locks and job entries are never changed once recorded, so those are left
+    to the returned function.
+    """
+    kind, _, key = name.partition(":")
+    if name == "config":
+        return _encoded({"config": state.config, "coords": state.coords})
+    if name == "billing":
+        return _encoded(state.cumulative_billing)
+    if name == "jobs":
+        jobs = list(state.individual_jobs)
+        return lambda: json.dumps(jobs)
+    if name == "queue":
+        return lambda orchestrator=state.orchestrator: json.dumps(orchestrator.snapshot())
+    if name == "fleet":
+        return lambda fleet=state.fleet: json.dumps(fleet.stats())
+    if kind == "device":
+        device = state.devices.get(key)
+        if device is None or device["deviceId"] != key:
+            return None
+        return _encoded({"device": device, "primary": state.devices.is_primary(key)})
+    if kind == "run":
+        run = state.run_history.get(key)
+        return _encoded(run) if run is not None else None
+    return None
+
+def _encoded(value: Any) -> Callable[[], str]:
+    body = json.dumps(value)
+    return lambda: body
+
+class StatePublisher:
+    """
+    Owner side. Every version bump marks the sections it covers dirty; a
+    background thread (and any mutating request, before it responds) publishes
+    the dirty sections whose version moved since they were last published.
+    A cell's first publish, and its first after a reload, covers every section.
+    """
+
+    def __init__(self, store: SharedStore, cells):
+        self.store = store
+        self.cells = cells
+        self._published: Dict[str, Dict[str, Tuple[int, int]]] = {}   # cell -> section -> published (epoch, version)
+        self._epochs: Dict[str, int] = {}                              # cell -> epoch of its last publish
+        self._dirty: Dict[str, Set[str]] = {}                          # cell -> sections bumped since then
+        self._dirty_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self.publishes = 0
+        versions.subscribe(self._mark_dirty)
+
+    def _mark_dirty(self, keys: Tuple[str, ...]) -> None:
+        names = {name for name in map(section_of, keys) if name is not None}
+        if not names:
+            return
+        with self._dirty_lock:
+            self._dirty.setdefault(current_cell.get(), set()).update(names)
+        self._wake.set()
+
+    def start(self) -> None:
+        """Reset the store for this boot, publish the default cell and keep publishing in the background"""
+        self.store.reset(BOOT_ID)
+        self._published.clear()
+        self._epochs.clear()
+        self.cells.get(current_cell.get())
+        with self._dirty_lock:
+            self._dirty.setdefault(current_cell.get(), set())
+        self.flush()
+        threading.Thread(target=self._run, name="state-publisher", daemon=True).start()
+
+    def close(self) -> None:
+        """Stop tracking version bumps"""
+        versions.unsubscribe(self._mark_dirty)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(PUBLISH_INTERVAL_S)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error publishing shared state")
+
+    def flush(self) -> None:
+        """Publish every dirty cell now"""
+        with self._flush_lock:
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, {}
+            for cell_id, names in dirty.items():
+                state = self.cells.loaded(cell_id)
+                if state is not None:
+                    run_in_cell(cell_id, self._publish_cell, state, names)
+
+    def _publish_cell(self, state: SimulationState, names: Set[str]) -> None:
+        published = self._published.setdefault(state.cell_id, {})
+        pending: Dict[str, Tuple[Optional[Tuple[int, int]], Optional[Callable[[], str]]]] = {}
+        with state._lock:
+            epoch = versions.epoch()
+            if self._epochs.get(state.cell_id) != epoch:
+                # Versions restarted (or were never seen), so compare everything
+                names = set(section_names(state)) | published.keys()
+                self._epochs[state.cell_id] = epoch
+            for name in names:
+                # Read the version before the data, so a body is never older than its version
+                version = (epoch, versions.get(name))
+                if published.get(name) == version:
+                    continue
+                encode = detach_section(state, name)
+                if encode is not None:
+                    pending[name] = (version, encode)
+                elif name in published:
+                    pending[name] = (None, None)
+        if not pending:
+            return
+        changes = {name: (version, encode() if encode else None) for name, (version, encode) in pending.items()}
+        self.store.publish(state.cell_id, {name: body for name, (_, body) in changes.items()})
+        self.publishes += 1
+        for name, (version, _) in changes.items():
+            if version is None:
+                published.pop(name, None)
+            else:
+                published[name] = version
+
+class ReplicaState(SimulationState):
+    """
+    Worker side: a read-only copy of one cell rebuilt from the sections its
+    owner publishes. sync() costs one indexed read when nothing changed and
+    otherwise applies just the sections published since the last sync.
+    """
+
+    def __init__(self, cell_id: str, storage_dir: Optional[str], store: SharedStore):
+        self.store = store
+        self.boot: Optional[str] = None
+        self.generation = 0
+        super().__init__(cell_id)
+
+    def init_from_db(self):
+        """Start empty; the first sync fills in the owner's state"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        self.config = copy.deepcopy(DEFAULT_CONFIG)
+        self.coords = copy.deepcopy(DEFAULT_COORDS)
+        self.engraver = make_engraver()
+        self.agv = make_agv()
+        self._init_registry()
+        self.cumulative_billing = self._default_billing()
+        self.individual_jobs = []
+        self.run_history = {}
+        self.history_index = HistoryIndex()
+        self.queue_journal = None
+        self.orchestrator = Orchestrator(self.engraver, self.agv, self.config, self.coords)
+
+    def _persist(self):
+        raise RuntimeError(f"Cell {self.cell_id} is a read-only replica; mutations must go to the owner process")
+
+    def flush(self):
+        """Nothing to write; the owner holds the authoritative copy"""
+
+    def sync(self):
+        """Apply sections the owner published since the last sync"""
+        boot, generation = self.store.head(self.cell_id)
+        if generation is None or (boot == self.boot and generation == self.generation):
+            return
+        with self._lock:
+            if boot != self.boot:
+                # A new owner republished everything from scratch
+                self._reset()
+                self.generation = 0
+                self._touch_all()
+            for name, body in self.store.changes(self.cell_id, self.generation):
+                self._apply(name, json.loads(body) if body is not None else None)
+            self.boot, self.generation = boot, max(self.generation, generation)
+
+    def _apply(self, name: str, body: Any) -> None:
+        kind, _, key = name.partition(":")
+        if kind == "device":
+            self._apply_device(key, body)
+            return
+        if kind == "run":
+            if body is None:
+                self.run_history.pop(key, None)
+                self.history_index.remove(key)
+            else:
+                self.run_history[key] = body
+                self.history_index.add(body)
+            versions.bump("history", name)
+            if body is None:
+                versions.discard(name)
+            return
+        if body is None:
+            return
+        if name == "config":
+            self.config.clear()
+            self.config.update(body["config"])
+            self.coords.clear()
+            self.coords.update({site: tuple(xy) for site, xy in body["coords"].items()})
+        elif name == "billing":
+            self.cumulative_billing = body
+        elif name == "jobs":
+            self.individual_jobs = body
+        elif name == "queue":
+            self.orchestrator.load_snapshot(body)
+        elif name == "fleet":
+            self.fleet.load_snapshot(body)
+        versions.bump(name)
+
+    def _apply_device(self, device_id: str, body: Optional[Dict[str, Any]]) -> None:
+        current = self.devices.get(device_id)
+        if body is None:
+            if current is not None and not self.devices.is_primary(device_id):
+                self.devices.unregister(device_id)
+            return
+        if current is None:
+            current = body["device"]
+            self.devices.register(current, primary=body["primary"])
+        else:
+            # Update in place so the registry, orchestrator and primaries keep pointing at it
+            current.clear()
+            current.update(body["device"])
+            self.devices.refresh_status(current)
+        touch_device(current)
@@ -1,12 +1,25 @@
 """In-memory state management for AAS simulation with JSON persistence"""
-import threading
+import os
+import time
 import copy
 from datetime import datetime, timezone
 from collections import deque
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 from app.core.rules import DEFAULT_CONFIG, DEFAULT_COORDS
 from app.core.orchestrator import Orchestrator
-from app.core.database import load_db, save_db
+from app.core.database import load_db, save_db, QueueJournal, DeviceStore, DB_FILE, QUEUE_LOG_FILE, DEVICES_DIR
+from app.core.history_index import HistoryIndex
+from app.core.registry import DeviceRegistry, DEVICE_ALIASES
+from app.core.fleet import FleetDispatcher
+from app.core.versioning import versions, touch_device, device_key, STATE_SECTIONS
+from app.core.cells import CellManager
+from app.core.context import DEFAULT_CELL, current_cell
+from app.core.metrics import metrics, TimedLock
+from app.core.tracing import span
+from app.core.presets import build_preset_tables, merge_presets
+from app.core.telemetry import telemetry
+
+PERSIST_SECONDS = metrics.histogram("aas_persist_duration_seconds", "Time to persist a cell's state")
 
 def now_iso() -> str:
     """Get current ISO8601 timestamp"""
@@ -82,40 +95,59 @@ def make_agv(device_id: str = "agv-001") -> Dict[str, Any]:
         }
     }
 
+# Templates used to create new devices by deviceType
+DEVICE_TEMPLATES = {
+    "Engraver": make_engraver,
+    "AGV": make_agv
+}
+
 class SimulationState:
-    """Thread-safe singleton state for the simulation with JSON Persistence"""
+    """Thread-safe state of one simulated cell with JSON Persistence"""
     
-    def __init__(self):
-        self._lock = threading.Lock()
+    def __init__(self, cell_id: str = DEFAULT_CELL, storage_dir: Optional[str] = None):
+        self._lock = TimedLock("state")
+        self.cell_id = cell_id
+        self.storage_dir = storage_dir
+        if storage_dir:
+            os.makedirs(storage_dir, exist_ok=True)
         self.init_from_db()
     
+    def _storage_path(self, name: str) -> str:
+        """Path of a storage file within this cell's shard"""
+        return os.path.join(self.storage_dir, name) if self.storage_dir else name
+    
     def init_from_db(self):
         """Initialize state from database or defaults"""
         with self._lock:
+            db_data = load_db(self._storage_path(DB_FILE))
+            
+            # Load Config, keeping defaults for settings added since it was saved
             self.config = copy.deepcopy(DEFAULT_CONFIG)
+            for section, value in db_data.get("config", {}).items():
+                if isinstance(value, dict) and isinstance(self.config.get(section), dict):
+                    self.config[section].update(value)
+                else:
+                    self.config[section] = value
             self.coords = copy.deepcopy(DEFAULT_COORDS)
-            self._cycle_lock = threading.Lock()
-            
-            db_data = load_db()
+            self.coords.update({site: tuple(xy) for site, xy in db_data.get("coords", {}).items()})
+            build_preset_tables(self.config["engraver"])
             
             # Load Devices
             devices = db_data.get("devices", {})
             self.engraver = devices.get("engraver", make_engraver())
             self.agv = devices.get("agv", make_agv())
+            self._init_registry()
+            for device in self.device_store.load():
+                if not self.devices.get(device["deviceId"]):
+                    self.devices.register(device)
+                    self.device_store.mark_saved(device["deviceId"], versions.get(device_key(device)))
             
             # Load Billing
             billing = db_data.get("billing", {})
-            current_time = now_iso()
-            
-            default_billing = {
-                "engraver_energy_kWh": 0.0, "engraver_co2_g": 0.0, "engraver_cost_eur": 0.0,
-                "agv_distance_m": 0.0, "agv_cost_eur": 0.0, "total_cost_eur": 0.0,
-                "jobs_processed": [], "last_updated": current_time
-            }
-            
+            default_billing = self._default_billing()
             self.cumulative_billing = {
-                "user_jobs": billing.get("user_jobs", copy.deepcopy(default_billing)),
-                "scenario_jobs": billing.get("scenario_jobs", copy.deepcopy(default_billing))
+                "user_jobs": billing.get("user_jobs", default_billing["user_jobs"]),
+                "scenario_jobs": billing.get("scenario_jobs", default_billing["scenario_jobs"])
             }
             
             # Load Jobs
@@ -123,17 +155,71 @@ class SimulationState:
             
             # Load History
             self.run_history = db_data.get("history", {})
+            interrupted = self._mark_interrupted_runs()
+            self.history_index = HistoryIndex()
+            self.history_index.rebuild(self.run_history)
             
-            # Initialize Orchestrator
-            self.orchestrator = Orchestrator(self.engraver, self.agv, self.config, self.coords)
+            # Initialize Orchestrator and restore queued jobs from the journal
+            self.queue_journal = QueueJournal(self._storage_path(QUEUE_LOG_FILE))
+            self.orchestrator = Orchestrator(self.engraver, self.agv, self.config, self.coords, journal=self.queue_journal, on_billing=self.fleet.set_billing)
+            self.orchestrator.restore_jobs(self.queue_journal.load())
             
             # Save initial state if DB was empty
-            if not db_data:
+            if not db_data or interrupted:
                 self._persist()
+            self._touch_all()
+    
+    def _init_registry(self):
+        """Create the device registry with the primary engraver and AGV"""
+        self.devices = DeviceRegistry()
+        self.devices.register(self.engraver, primary=True)
+        self.devices.register(self.agv, primary=True)
+        self.fleet = FleetDispatcher(self.devices, on_release=self.save_devices)
+        if not hasattr(self, "device_store"):
+            self.device_store = DeviceStore(self._storage_path(DEVICES_DIR))
+    
+    @staticmethod
+    def _default_billing() -> Dict[str, Dict[str, Any]]:
+        """Empty cumulative billing for user and scenario jobs"""
+        current_time = now_iso()
+        return {
+            source: {
+                "engraver_energy_kWh": 0.0, "engraver_co2_g": 0.0, "engraver_cost_eur": 0.0,
+                "agv_distance_m": 0.0, "agv_cost_eur": 0.0, "total_cost_eur": 0.0,
+                "jobs_processed": [], "last_updated": current_time
+            }
+            for source in ("user_jobs", "scenario_jobs")
+        }
+    
+    def _touch_all(self):
+        """Invalidate everything derived from this state"""
+        versions.bump(*STATE_SECTIONS)
+        for device in self.devices:
+            touch_device(device)
+    
+    def _mark_interrupted_runs(self) -> int:
+        """Mark runs left in "running" by a previous process as interrupted"""
+        interrupted = 0
+        for run in self.run_history.values():
+            if run.get("status") == "running":
+                run.update({
+                    "status": "interrupted",
+                    "endedAt": now_iso(),
+                    "error": "Interrupted by restart; unfinished jobs were restored to the queue"
+                })
+                interrupted += 1
+        return interrupted
 
     def _persist(self):
         """Save current state to JSON"""
+        with span("persist", "io", cell=self.cell_id):
+            self._write_storage()
+
+    def _write_storage(self):
+        started = time.perf_counter()
         data = {
+            "config": self.config,
+            "coords": self.coords,
             "devices": {
                 "engraver": self.engraver,
                 "agv": self.agv
@@ -142,73 +228,235 @@ class SimulationState:
             "jobs": self.individual_jobs,
             "history": self.run_history
         }
-        save_db(data)
+        save_db(data, self._storage_path(DB_FILE))
+        # Primaries live in the main file; the rest of the fleet is stored per device
+        self.device_store.save(
+            (device for device in self.devices if not self.devices.is_primary(device["deviceId"])),
+            lambda device_id: versions.get(f"device:{device_id}")
+        )
+        PERSIST_SECONDS.observe(time.perf_counter() - started)
 
+    def save_devices(self, devices: Iterable[Dict[str, Any]]) -> None:
+        """Write devices changed since they were last stored, e.g. the pair a cycle just released"""
+        devices = list(devices)
+        with self._lock:
+            if any(self.devices.is_primary(device["deviceId"]) for device in devices):
+                # Primaries live in the main file, which also saves the rest of the fleet
+                self._persist()
+            else:
+                self.device_store.save(devices, lambda device_id: versions.get(f"device:{device_id}"))
+    
+    def flush(self):
+        """Write the whole state to storage"""
+        with self._lock:
+            self._persist()
+    
+    def sync(self):
+        """Bring the state up to date before a read (only replicas have anything to do)"""
+    
     def reset_to_defaults(self):
         """Reset all state to defaults"""
         with self._lock:
             self.config = copy.deepcopy(DEFAULT_CONFIG)
             self.coords = copy.deepcopy(DEFAULT_COORDS)
+            removed_devices = [device for device in self.devices if not self.devices.is_primary(device["deviceId"])]
+            run_keys = [f"run:{run_id}" for run_id in self.run_history]
             self.engraver = make_engraver()
             self.agv = make_agv()
+            self._init_registry()
+            self.device_store.clear()
             self.run_history = {}
-            self.orchestrator = Orchestrator(self.engraver, self.agv, self.config, self.coords)
-            self._cycle_lock = threading.Lock()
+            self.history_index.clear()
+            self.queue_journal.clear()
+            self.orchestrator = Orchestrator(self.engraver, self.agv, self.config, self.coords, journal=self.queue_journal, on_billing=self.fleet.set_billing)
+            telemetry.drop_cell(self.cell_id)
             
-            current_time = now_iso()
-            self.cumulative_billing = {
-                "user_jobs": {
-                    "engraver_energy_kWh": 0.0, "engraver_co2_g": 0.0, "engraver_cost_eur": 0.0,
-                    "agv_distance_m": 0.0, "agv_cost_eur": 0.0, "total_cost_eur": 0.0,
-                    "jobs_processed": [], "last_updated": current_time
-                },
-                "scenario_jobs": {
-                    "engraver_energy_kWh": 0.0, "engraver_co2_g": 0.0, "engraver_cost_eur": 0.0,
-                    "agv_distance_m": 0.0, "agv_cost_eur": 0.0, "total_cost_eur": 0.0,
-                    "jobs_processed": [], "last_updated": current_time
-                }
-            }
+            self.cumulative_billing = self._default_billing()
             self.individual_jobs = []
             
             self._persist()
+            # Removed devices and runs are bumped too, so listeners see them go
+            for device in removed_devices:
+                touch_device(device)
+            versions.bump(*run_keys)
+            versions.discard(*run_keys)
+            self._touch_all()
+    
+    def _find_device(self, device_id: str) -> Optional[Dict[str, Any]]:
+        return self.devices.get(device_id)
+    
+    def _all_devices(self) -> List[Dict[str, Any]]:
+        return list(self.devices)
+    
+    def _apply_billing_rates(self, device: Dict[str, Any]) -> None:
+        ub = device["usageBilling"]
+        if device["deviceType"] == "Engraver":
+            ub["emissionFactor"] = self.config["engraver"]["emissionFactor_g_per_kWh"]
+            ub["costPerEnergyUnit"] = self.config["engraver"]["costPerEnergyUnit_EUR_per_kWh"]
+        elif device["deviceType"] == "AGV":
+            ub["costPerMeter"] = self.config["agv"]["costPerMeter_EUR"]
+    
+    def add_device(self, device_type: str, device_id: str) -> Optional[Dict[str, Any]]:
+        """Create a device from its type's template. Returns None if the ID is taken."""
+        with self._lock:
+            if device_id in DEVICE_ALIASES or self.devices.get(device_id):
+                return None
+            device = DEVICE_TEMPLATES[device_type](device_id)
+            self._apply_billing_rates(device)
+            self.devices.register(device)
+            touch_device(device)
+            self._persist()
+            return copy.deepcopy(device)
+    
+    def remove_device(self, device_id: str) -> bool:
+        """Remove a non-primary device. Returns True if removed."""
+        with self._lock:
+            device = self.devices.get(device_id)
+            if not device or self.devices.is_primary(device["deviceId"]):
+                return False
+            self.devices.unregister(device["deviceId"])
+            self.device_store.delete(device["deviceId"])
+            touch_device(device)
+            return True
+    
+    def list_devices(self, device_type: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get device summaries, optionally filtered by type and operationMode"""
+        with self._lock:
+            summaries = []
+            for device_id in self.devices.ids(device_type, status):
+                device = self.devices.get(device_id)
+                summaries.append({
+                    "deviceId": device_id,
+                    "deviceType": device["deviceType"],
+                    "operationMode": device["operationalData"]["status"]["operationMode"],
+                    "primary": self.devices.is_primary(device_id)
+                })
+            return summaries
+    
+    def project_devices(self, fields: List[str], device_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Resolve field paths like "agv.operationalData.pose" or "*.usageBilling.usageCost"
+        against one consistent snapshot and return only the projected values.
+        "*" expands to `device_ids` if given, otherwise to every device.
+        IDs that match no device are listed under "unknownDevices".
+        """
+        with self._lock:
+            unknown: List[str] = []
+            if device_ids is None:
+                selected = self._all_devices()
+            else:
+                selected = []
+                for device_id in device_ids:
+                    device = self._find_device(device_id)
+                    if device:
+                        selected.append(device)
+                    elif device_id not in unknown:
+                        unknown.append(device_id)
+            
+            result: Dict[str, Dict[str, Any]] = {}
+            missing: List[str] = []
+            for field in fields:
+                selector, _, path = field.partition(".")
+                if selector == "*":
+                    targets = selected
+                else:
+                    device = self._find_device(selector)
+                    targets = [device] if device else []
+                    if not device and selector not in unknown:
+                        unknown.append(selector)
+                if not targets or not path:
+                    missing.append(field)
+                    continue
+                
+                segments = path.split(".")
+                for device in targets:
+                    value = device
+                    for segment in segments:
+                        if not isinstance(value, dict) or segment not in value:
+                            missing.append(f"{device['deviceId']}.{path}")
+                            break
+                        value = value[segment]
+                    else:
+                        # Rebuild only the requested branch of the device
+                        node = result.setdefault(device["deviceId"], {})
+                        for segment in segments[:-1]:
+                            node = node.setdefault(segment, {})
+                        node[segments[-1]] = copy.deepcopy(value)
+            
+            return {"devices": result, "missing": missing, "unknownDevices": unknown}
     
     def get_device(self, device_id: str) -> Optional[Dict[str, Any]]:
         """Get device by ID"""
         with self._lock:
-            if device_id == self.engraver["deviceId"] or device_id == "engraver":
-                return copy.deepcopy(self.engraver)
-            elif device_id == self.agv["deviceId"] or device_id == "agv":
-                return copy.deepcopy(self.agv)
-            return None
+            device = self._find_device(device_id)
+            return copy.deepcopy(device) if device else None
+    
+    def resolve_device_id(self, device_id: str) -> Optional[str]:
+        """Resolve a device ID or alias ("engraver"/"agv") to the canonical deviceId"""
+        device = self._find_device(device_id)
+        return device["deviceId"] if device else None
+    
+    def get_submodel(self, device_id: str, submodel: str) -> Optional[Dict[str, Any]]:
+        """Get a copy of a single device submodel (status, order, pose or billing)"""
+        with self._lock:
+            device = self._find_device(device_id)
+            if not device:
+                return None
+            if submodel == "billing":
+                return copy.deepcopy(device["usageBilling"])
+            return copy.deepcopy(device["operationalData"][submodel])
     
     def update_config(self, updates: Dict[str, Any]) -> Dict[str, Any]:
-        """Update configuration"""
+        """Update configuration. ValueError (nothing applied) if the power presets would lose the default or cannot be built."""
         with self._lock:
+            engraver = None
+            if "engraver" in updates and updates["engraver"]:
+                engraver = {
+                    **self.config["engraver"],
+                    **{key: value for key, value in updates["engraver"].items()
+                       if value is not None and key in self.config["engraver"] and key != "power_presets"},
+                    "power_presets": merge_presets(self.config["engraver"], updates["engraver"])
+                }
+                # Only presets whose parameters changed get new tables; built before anything is applied
+                build_preset_tables(engraver)
+            
             if "currency" in updates and updates["currency"]:
                 self.config["currency"] = updates["currency"]
             
-            if "engraver" in updates and updates["engraver"]:
-                for key, value in updates["engraver"].items():
-                    if value is not None and key in self.config["engraver"]:
-                        self.config["engraver"][key] = value
+            if engraver is not None:
+                self.config["engraver"] = engraver
             
             if "agv" in updates and updates["agv"]:
                 for key, value in updates["agv"].items():
                     if value is not None and key in self.config["agv"]:
                         self.config["agv"][key] = value
             
+            if "queue" in updates and updates["queue"]:
+                queue_config = self.config.setdefault("queue", {})
+                for key, value in updates["queue"].items():
+                    if value is not None:
+                        queue_config[key] = value
+            
+            if "batching" in updates and updates["batching"] is not None:
+                # null is meaningful here (no limit / trigger off), so explicit nulls are applied
+                self.config.setdefault("batching", {}).update(updates["batching"])
+            
             if "progress_step" in updates and updates["progress_step"] is not None:
                 self.config["progress_step"] = updates["progress_step"]
             
             if "poll_interval_s" in updates and updates["poll_interval_s"] is not None:
                 self.config["poll_interval_s"] = updates["poll_interval_s"]
             
+            if "time_scale" in updates and updates["time_scale"] is not None:
+                self.config["time_scale"] = updates["time_scale"]
+            
             # Update device billing rates
-            self.engraver["usageBilling"]["emissionFactor"] = self.config["engraver"]["emissionFactor_g_per_kWh"]
-            self.engraver["usageBilling"]["costPerEnergyUnit"] = self.config["engraver"]["costPerEnergyUnit_EUR_per_kWh"]
-            self.agv["usageBilling"]["costPerMeter"] = self.config["agv"]["costPerMeter_EUR"]
+            for device in self.devices:
+                self._apply_billing_rates(device)
+                touch_device(device, "billing")
             
             self._persist()
+            versions.bump("config")
             return copy.deepcopy(self.config)
     
     def update_coords(self, coords_updates: Dict[str, Any]) -> Dict[str, Any]:
@@ -217,20 +465,80 @@ class SimulationState:
             for key, value in coords_updates.items():
                 if isinstance(value, (list, tuple)) and len(value) == 2:
                     self.coords[key] = tuple(value)
+            self._persist()
+            versions.bump("config")
             return copy.deepcopy(self.coords)
     
     def add_run_history(self, run_data: Dict[str, Any]) -> None:
         """Add run to history"""
         with self._lock:
             self.run_history[run_data["runId"]] = copy.deepcopy(run_data)
+            self.history_index.add(self.run_history[run_data["runId"]])
             self._persist()
+            versions.bump("history", f"run:{run_data['runId']}")
     
     def update_run_history(self, run_id: str, run_data: Dict[str, Any]) -> None:
         """Update existing run in history"""
         with self._lock:
             if run_id in self.run_history:
                 self.run_history[run_id].update(run_data)
+                self.history_index.add(self.run_history[run_id])
                 self._persist()
+                versions.bump("history", f"run:{run_id}")
+    
+    def get_run_status(self, run_id: str) -> Optional[str]:
+        """Get just the status of a run, without copying it"""
+        with self._lock:
+            run = self.run_history.get(run_id)
+            return run.get("status") if run else None
+    
+    def query_run_history(self, limit: int, cursor: Optional[Tuple[str, str]] = None, filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """Get one page of runs (newest first) and the cursor for the next page"""
+        with self._lock:
+            run_ids, next_cursor = self.history_index.page(limit, cursor, filters)
+            return [copy.deepcopy(self.run_history[run_id]) for run_id in run_ids], next_cursor
+    
+    def snapshot_run_ids(self, start: Optional[str] = None, end: Optional[str] = None, site: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """Get run IDs (newest first) in a startedAt range, without copying the runs"""
+        with self._lock:
+            keys = self.history_index.range(start, end, site)
+            if limit:
+                keys = keys[-limit:]
+            return [key[1] for key in reversed(keys)]
+    
+    def billed_engrave_jobs(self, run_ids: List[str]) -> List[Tuple[str, str, float, float, float, float]]:
+        """
+        (runId, started_at, seconds, kWh, cost, CO2) of each engrave job in the
+        given runs, without copying the runs; jobs billed before started_at was
+        recorded use their completion time and zero seconds
+        """
+        jobs = []
+        with self._lock:
+            for run_id in run_ids:
+                run = self.run_history.get(run_id)
+                summary = (run or {}).get("cycleSummary") or {}
+                for job in summary.get("individualJobs") or ():
+                    started_at = job.get("started_at") or job.get("completed_at")
+                    if started_at:
+                        jobs.append((run_id, started_at, job.get("seconds", 0.0) if job.get("started_at") else 0.0, job.get("energy_kWh", 0.0), job.get("cost_eur", 0.0), job.get("co2_g", 0.0)))
+        return jobs
+    
+    def count_run_history(self, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Get number of runs in history, or of those matching the filters"""
+        with self._lock:
+            return self.history_index.count(filters) if filters else len(self.run_history)
+    
+    def clear_run_history(self) -> int:
+        """Clear all run history. Returns number of runs removed."""
+        with self._lock:
+            count = len(self.run_history)
+            run_keys = [f"run:{run_id}" for run_id in self.run_history]
+            self.run_history.clear()
+            self.history_index.clear()
+            self._persist()
+            versions.bump("history", *run_keys)
+            versions.discard(*run_keys)
+            return count
     
     def get_run_history(self, run_id: Optional[str] = None) -> Any:
         """Get run history"""
@@ -240,8 +548,8 @@ class SimulationState:
             return copy.deepcopy(self.run_history)
     
     def get_cycle_lock(self):
-        """Get lock for cycle operations"""
-        return self._cycle_lock
+        """Get a context manager that reserves the whole fleet (e.g. for scenarios that reset the queue)"""
+        return self.fleet.exclusive()
     
     def update_cumulative_billing(self, job_source: str, engraver_data: Dict[str, Any], agv_data: Dict[str, Any], jobs_processed: List[str]) -> None:
         """Update cumulative billing"""
@@ -259,6 +567,7 @@ class SimulationState:
             billing["last_updated"] = now_iso()
             
             self._persist()
+            versions.bump("billing")
     
     def get_cumulative_billing(self) -> Dict[str, Any]:
         """Get cumulative billing data"""
@@ -293,15 +602,17 @@ class SimulationState:
             self.individual_jobs = []
             
             # Reset device billing state
-            self.engraver["usageBilling"]["energyConsumed"] = 0.0
-            self.engraver["usageBilling"]["carbonEmissions"] = 0.0
-            self.engraver["usageBilling"]["usageCost"] = 0.0
-            self.engraver["usageBilling"]["distanceTraveled"] = 0.0 # Not used but for consistency
-            
-            self.agv["usageBilling"]["distanceTraveled"] = 0.0
-            self.agv["usageBilling"]["usageCost"] = 0.0
+            for device in self.devices:
+                ub = device["usageBilling"]
+                if device["deviceType"] == "Engraver":
+                    ub["energyConsumed"] = 0.0
+                    ub["carbonEmissions"] = 0.0
+                ub["distanceTraveled"] = 0.0 # Not used by engravers but for consistency
+                ub["usageCost"] = 0.0
+                touch_device(device, "billing")
             
             self._persist()
+            versions.bump("billing", "jobs")
     
     def add_individual_job(self, job_details: Dict[str, Any]) -> None:
         """Add individual job details"""
@@ -311,6 +622,7 @@ class SimulationState:
                 "timestamp": now_iso()
             })
             self._persist()
+            versions.bump("jobs")
     
     def get_individual_jobs(self, job_source: str = None) -> List[Dict[str, Any]]:
         """Get individual job details"""
@@ -324,29 +636,34 @@ class SimulationState:
         with self._lock:
             self.individual_jobs.clear()
             self._persist()
+            versions.bump("jobs")
     
     # Helper for testing to force save
     def _save_device(self, device_data: Dict[str, Any]):
         """Helper to save device (updates in-memory ref is already done by caller usually, but we ensure persist)"""
         # In this JSON implementation, we just persist everything
+        touch_device(device_data)
         self._persist()
 
-# Global singleton instance
-_state_instance: Optional[SimulationState] = None
-_state_lock = threading.Lock()
+# Cells hosted by this process; requests pick one via the current_cell context
+cells = CellManager(SimulationState)
+
+metrics.gauge("aas_cells_loaded", "Cells held in memory").set_function(lambda: {(): len(cells.items())})
+metrics.gauge("aas_queue_depth", "Jobs waiting in each loaded cell's queue", ("cell",)).set_function(
+    lambda: {(cell_id,): len(state.orchestrator.queue) for cell_id, state in cells.items()}
+)
+metrics.gauge("aas_fleet_busy_devices", "Devices reserved by running cycles in each loaded cell", ("cell",)).set_function(
+    lambda: {(cell_id,): len(state.fleet.stats()["busyDevices"]) for cell_id, state in cells.items()}
+)
 
 def get_state() -> SimulationState:
-    """Get the global simulation state instance"""
-    global _state_instance
-    if _state_instance is None:
-        with _state_lock:
-            if _state_instance is None:
-                _state_instance = SimulationState()
-    return _state_instance
+    """Get the simulation state of the current cell"""
+    state = cells.get(current_cell.get())
+    state.sync()
+    return state
 
 def reset_state():
-    """Reset the global state (for testing)"""
-    global _state_instance
-    with _state_lock:
-        if _state_instance is not None:
-            _state_instance.reset_to_defaults()
\ No newline at end of file
+    """Reset the current cell's state (for testing)"""
+    state = cells.loaded(current_cell.get())
+    if state is not None:
+        state.reset_to_defaults()
@@ -0,0 +1,208 @@
+"""Time-of-use tariff and grid-carbon schedules for billing engraver energy"""
+import csv
+import json
+import math
+import os
+import threading
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DAY_S = 86400.0
+
+# Schedule files are named relative to this directory and may not leave it
+TARIFF_DIR = os.getenv("TARIFF_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tariffs"))
+
+def parse_start(value: Any) -> Tuple[float, bool]:
+    """Seconds and whether they are a time of day: "HH:MM[:SS]" (daily, UTC), ISO8601 or epoch seconds"""
+    if isinstance(value, (int, float)):
+        return float(value), False
+    text = str(value).strip()
+    try:
+        return float(text), False   # epoch seconds, e.g. read from a CSV
+    except ValueError:
+        pass
+    if len(text) <= 8 and ":" in text:
+        parts = [int(part) for part in text.split(":")]
+        hours, minutes, seconds = (parts + [0, 0])[:3]
+        return hours * 3600.0 + minutes * 60.0 + seconds, True
+    moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp(), False
+
+class Schedule:
+    """
+    Step function over time: values[i] applies from starts[i] until
+    starts[i+1]. Absolute schedules (epoch seconds) hold their first value
+    before they start and their last after they end; daily schedules repeat
+    every 24 hours (UTC). Integrals are kept cumulatively, so the integral
+    over any interval - however many steps it spans - is two bisects.
+    """
+
+    def __init__(self, starts: Sequence[float], values: Sequence[float], daily: bool = False, unit: str = ""):
+        if not starts or len(starts) != len(values):
+            raise ValueError("A schedule needs as many values as start times, and at least one")
+        points = sorted(zip(starts, values))
+        if any(a[0] == b[0] for a, b in zip(points, points[1:])):
+            raise ValueError("Schedule start times must be unique")
+        if daily:
+            if points[0][0] < 0 or points[-1][0] >= DAY_S:
+                raise ValueError("Daily schedule times must lie within 00:00-24:00")
+            if points[0][0] > 0:
+                # Midnight continues the last step of the previous day
+                points.insert(0, (0.0, points[-1][1]))
+        self.starts = [float(start) for start, _ in points]
+        self.values = [float(value) for _, value in points]
+        self.daily = daily
+        self.unit = unit
+        self._cumulative = [0.0]
+        for i in range(1, len(self.starts)):
+            self._cumulative.append(self._cumulative[-1] + self.values[i - 1] * (self.starts[i] - self.starts[i - 1]))
+        self._per_day = self._cumulative[-1] + self.values[-1] * (DAY_S - self.starts[-1]) if daily else 0.0
+
+    @classmethod
+    def constant(cls, value: float, unit: str = "") -> "Schedule":
+        return cls([0.0], [value], unit=unit)
+
+    @classmethod
+    def from_points(cls, points: Sequence[Tuple[Any, float]], unit: str = "") -> "Schedule":
+        """Build from (start, value) pairs; all starts are times of day or all are absolute"""
+        parsed = [(parse_start(start), float(value)) for start, value in points]
+        kinds = {daily for (_, daily), _ in parsed}
+        if len(kinds) > 1:
+            raise ValueError("Mix of times of day and absolute timestamps in one schedule")
+        return cls([start for (start, _), _ in parsed], [value for _, value in parsed], daily=kinds == {True}, unit=unit)
+
+    @classmethod
+    def from_file(cls, path: str, unit: str = "") -> "Schedule":
+        """
+        Load a CSV with start,value columns or JSON ({"points": [[start, value], ...]}
+        or a bare list of pairs); starts as in parse_start
+        """
+        with open(path, newline="") as f:
+            if path.endswith(".json"):
+                data = json.load(f)
+                points = data["points"] if isinstance(data, dict) else data
+                unit = data.get("unit", unit) if isinstance(data, dict) else unit
+            else:
+                points = [(row["start"], row["value"]) for row in csv.DictReader(f)]
+        return cls.from_points(points, unit)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _antiderivative(self, t: float) -> float:
+        day, i = self._step(t)
+        return day * self._per_day + self._cumulative[i] + self.values[i] * (t - day * DAY_S - self.starts[i])
+
+    def _step(self, t: float) -> Tuple[float, int]:
+        """(day, step index) of t; day is 0 for absolute schedules"""
+        day = math.floor(t / DAY_S) if self.daily else 0
+        return day, max(0, bisect_right(self.starts, t - day * DAY_S) - 1)
+
+    def value_at(self, t: float) -> float:
+        return self.values[self._step(t)[1]]
+
+    def integral(self, t0: float, t1: float) -> float:
+        """Integral of the schedule over [t0, t1] (value x seconds)"""
+        return self._antiderivative(t1) - self._antiderivative(t0)
+
+    def mean(self, t0: float, t1: float) -> float:
+        """Average value over [t0, t1]; the value at t0 for an empty interval"""
+        step = self._step(t0)
+        if t1 <= t0 or self._step(t1) == step:
+            # Within one step (the common case) the value is exact, with no large-timestamp rounding
+            return self.values[step[1]]
+        return self.integral(t0, t1) / (t1 - t0)
+
+    def means(self, t0s: Sequence[float], t1s: Sequence[float]) -> List[float]:
+        """mean() of many intervals at once"""
+        return [self.mean(t0, t1) for t0, t1 in zip(t0s, t1s)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"daily": self.daily, "unit": self.unit, "steps": len(self.starts), "min": min(self.values), "max": max(self.values)}
+
+_cache: Dict[str, Tuple[float, Schedule]] = {}
+_cache_lock = threading.Lock()
+
+def load_schedule(name: str, unit: str = "") -> Schedule:
+    """Schedule from a file in TARIFF_DIR, parsed once and reloaded when the file changes"""
+    root = os.path.realpath(TARIFF_DIR)
+    full_path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, full_path]) != root:
+        raise ValueError(f"Schedule file '{name}' is outside the tariff directory")
+    try:
+        mtime = os.path.getmtime(full_path)
+    except OSError:
+        raise ValueError(f"Schedule file '{name}' not found in the tariff directory")
+    with _cache_lock:
+        cached = _cache.get(full_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    schedule = Schedule.from_file(full_path, unit)
+    with _cache_lock:
+        _cache[full_path] = (mtime, schedule)
+    return schedule
+
+def billing_schedules(config: Dict[str, Any], usage_billing: Dict[str, Any]) -> Tuple[Schedule, Schedule]:
+    """
+    Tariff (EUR/kWh) and emission factor (g/kWh) schedules for an engraver:
+    the engraver config's tariff_file / emission_factor_file when set,
+    otherwise the device's scalar costPerEnergyUnit / emissionFactor
+    """
+    engraver = config["engraver"]
+    tariff_file = engraver.get("tariff_file")
+    emission_file = engraver.get("emission_factor_file")
+    tariff = load_schedule(tariff_file, "EUR/kWh") if tariff_file else Schedule.constant(usage_billing["costPerEnergyUnit"], "EUR/kWh")
+    emission = load_schedule(emission_file, "g/kWh") if emission_file else Schedule.constant(usage_billing["emissionFactor"], "g/kWh")
+    return tariff, emission
+
+def rebill(jobs: Sequence[Tuple[str, str, float, float, float, float]], tariff: Schedule, emission: Schedule, per_run: bool = False) -> Dict[str, Any]:
+    """
+    What the (runId, started_at, seconds, kWh, cost, CO2) jobs of
+    SimulationState.billed_engrave_jobs would have cost under other schedules,
+    next to what they were billed
+    """
+    intervals = []
+    for _, started_at, seconds, energy, _, _ in jobs:
+        start = parse_start(started_at)[0]
+        intervals.append((start, start + seconds, energy))
+    costs, co2s = bill_jobs(intervals, tariff, emission)
+
+    runs: Dict[str, Dict[str, float]] = {}
+    for job, cost, co2 in zip(jobs, costs, co2s):
+        run = runs.setdefault(job[0], {"jobs": 0, "energyKWh": 0.0, "billedCostEUR": 0.0, "billedCO2g": 0.0, "costEUR": 0.0, "co2g": 0.0})
+        run["jobs"] += 1
+        run["energyKWh"] += job[3]
+        run["billedCostEUR"] += job[4]
+        run["billedCO2g"] += job[5]
+        run["costEUR"] += cost
+        run["co2g"] += co2
+
+    billed_cost = sum(job[4] for job in jobs)
+    billed_co2 = sum(job[5] for job in jobs)
+    result = {
+        "runs": len(runs),
+        "jobs": len(jobs),
+        "energyKWh": round(sum(job[3] for job in jobs), 6),
+        "billed": {"costEUR": round(billed_cost, 6), "co2g": round(billed_co2, 6)},
+        "rebilled": {"costEUR": round(sum(costs), 6), "co2g": round(sum(co2s), 6)},
+        "delta": {"costEUR": round(sum(costs) - billed_cost, 6), "co2g": round(sum(co2s) - billed_co2, 6)},
+        "tariff": tariff.to_dict(),
+        "emission": emission.to_dict()
+    }
+    if per_run:
+        result["perRun"] = [{"runId": run_id, **{key: round(value, 6) for key, value in run.items()}} for run_id, run in runs.items()]
+    return result
+
+def bill_jobs(jobs: Sequence[Tuple[float, float, float]], tariff: Schedule, emission: Schedule) -> Tuple[List[float], List[float]]:
+    """
+    Cost and CO2 of (start, end, kWh) jobs, each drawing its energy evenly
+    over [start, end] so jobs spanning a step pay each price for its share
+    """
+    t0s = [job[0] for job in jobs]
+    t1s = [job[1] for job in jobs]
+    prices = tariff.means(t0s, t1s)
+    factors = emission.means(t0s, t1s)
+    return [job[2] * price for job, price in zip(jobs, prices)], [job[2] * factor for job, factor in zip(jobs, factors)]
@@ -0,0 +1,168 @@
+"""Per-device pose/progress/mode history in fixed-size ring buffers"""
+import array
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.core.context import current_cell
+
+# Samples kept per device: 30 minutes of 100 ms AGV steps
+TELEMETRY_SAMPLES = int(os.getenv("TELEMETRY_SAMPLES", "18000"))
+
+# Buffers kept across all cells; the one written longest ago is dropped beyond this
+MAX_BUFFERS = 256
+
+MODES = ("Idle", "Running", "Error")
+MODE_CODES = {mode: code for code, mode in enumerate(MODES)}
+UNKNOWN_MODE = 255
+
+FIELDS = ("t", "x", "y", "progress", "mode")
+
+class TelemetryBuffer:
+    """
+    Ring buffer of (t, x, y, progress, mode) samples, one per heartbeat.
+    Progress, pose or mode changes before the next heartbeat refresh the
+    latest sample instead of adding one, so a simulation step is one sample.
+    Storage is allocated once, as preallocated array.array columns; writes
+    only assign into it.
+    """
+
+    def __init__(self, capacity: int = TELEMETRY_SAMPLES):
+        self.capacity = capacity
+        self._columns = tuple(array.array(code, bytes(size * capacity)) for code, size in (("d", 8), ("f", 4), ("f", 4), ("B", 1), ("B", 1)))
+        self.written = 0   # samples ever written; the newest is at (written - 1) % capacity
+        self.last_write = time.monotonic()
+        self._heartbeat: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def write(self, t: float, x: float, y: float, progress: int, mode: int, heartbeat: int) -> None:
+        with self._lock:
+            if heartbeat != self._heartbeat or not self.written:
+                self.written += 1
+                self._heartbeat = heartbeat
+            i = (self.written - 1) % self.capacity
+            columns = self._columns
+            columns[0][i] = t
+            columns[1][i] = x
+            columns[2][i] = y
+            columns[3][i] = progress
+            columns[4][i] = mode
+            self.last_write = time.monotonic()
+
+    def __len__(self) -> int:
+        return min(self.written, self.capacity)
+
+    def snapshot(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[Any, ...]:
+        """Columns (t, x, y, progress, mode) of the samples in [start, end], oldest first"""
+        with self._lock:
+            count = len(self)
+            head = self.written % self.capacity if self.written >= self.capacity else 0
+            columns = tuple(column[head:count] + column[:head] for column in self._columns)
+        times = columns[0]
+        lo = bisect_left(times, start) if start is not None else 0
+        hi = bisect_right(times, end) if end is not None else len(times)
+        return tuple(column[lo:hi] for column in columns)
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets: indices of at most threshold points that
+    keep the shape of the (xs, ys) line. The first and last point are kept;
+    from each bucket in between, the point forming the largest triangle with
+    the previous kept point and the next bucket's average. Thresholds
+    below 3 keep every point.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    bucket = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for b in range(threshold - 2):
+        lo = int(b * bucket) + 1
+        hi = int((b + 1) * bucket) + 1
+        next_lo, next_hi = hi, min(int((b + 2) * bucket) + 1, n)
+        ax, ay = xs[a], ys[a]
+        span = next_hi - next_lo
+        cx = sum(xs[next_lo:next_hi]) / span
+        cy = sum(ys[next_lo:next_hi]) / span
+        best = -1.0
+        for i in range(lo, hi):
+            area = abs((ax - cx) * (ys[i] - ay) - (ax - xs[i]) * (cy - ay))
+            if area > best:
+                best, a = area, i
+        kept.append(a)
+    kept.append(n - 1)
+    return kept
+
+class TelemetryStore:
+    """
+    Buffers by (cell, deviceId), created on a device's first sample. Beyond
+    max_buffers the one written to longest ago is dropped.
+    """
+
+    def __init__(self, capacity: int = TELEMETRY_SAMPLES, max_buffers: int = MAX_BUFFERS):
+        self.capacity = capacity
+        self.max_buffers = max_buffers
+        self._buffers: Dict[Tuple[str, str], TelemetryBuffer] = {}
+        self._lock = threading.Lock()
+
+    def record(self, device: Dict[str, Any]) -> None:
+        """Sample a device's current pose, progress and mode"""
+        key = (current_cell.get(), device["deviceId"])
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            with self._lock:
+                buffer = self._buffers.get(key)
+                if buffer is None:
+                    while len(self._buffers) >= self.max_buffers:
+                        # Found only when a buffer is created, so writes stay lock-free
+                        del self._buffers[min(self._buffers, key=lambda key: self._buffers[key].last_write)]
+                    buffer = self._buffers[key] = TelemetryBuffer(self.capacity)
+        operational = device["operationalData"]
+        status = operational["status"]
+        pose = operational["pose"]
+        buffer.write(time.time(), pose["posX"], pose["posY"], status["productionProgress"],
+                     MODE_CODES.get(status["operationMode"], UNKNOWN_MODE), status["heartbeatCounter"])
+
+    def get(self, device_id: str) -> Optional[TelemetryBuffer]:
+        return self._buffers.get((current_cell.get(), device_id))
+
+    def drop_cell(self, cell_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._buffers if key[0] == cell_id]:
+                del self._buffers[key]
+
+    def query(self, device_id: str, start: Optional[float] = None, end: Optional[float] = None,
+              max_points: int = 500, by: str = "pose") -> Dict[str, Any]:
+        """
+        Samples of a device in [start, end] (epoch seconds) as columns,
+        downsampled with LTTB to at most max_points (0: all) along the
+        trajectory (by="pose") or the progress curve (by="progress")
+        """
+        buffer = self.get(device_id)
+        t, x, y, progress, mode = buffer.snapshot(start, end) if buffer else ([], [], [], [], [])
+        total = len(t)
+        if max_points and total > max_points:
+            keep = lttb(x, y, max_points) if by == "pose" else lttb(t, progress, max_points)
+            t, x, y, progress, mode = ([column[i] for i in keep] for column in (t, x, y, progress, mode))
+
+        def values(column, digits=None):
+            column = column.tolist() if hasattr(column, "tolist") else column
+            return column if digits is None else [round(value, digits) for value in column]
+
+        return {
+            "deviceId": device_id,
+            "capacity": buffer.capacity if buffer else self.capacity,
+            "samples": total,
+            "returned": len(t),
+            "downsampledBy": by if len(t) < total else None,
+            "t": values(t),
+            "x": values(x, 4),
+            "y": values(y, 4),
+            "progress": values(progress),
+            "mode": [MODES[code] if code < len(MODES) else "Unknown" for code in values(mode)]
+        }
+
+# Telemetry of every device in this process
+telemetry = TelemetryStore()
@@ -0,0 +1,129 @@
+"""Per-run span recording, exported as Chrome trace-event JSON"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from app.core.context import scoped_key
+
+# Runs whose spans are kept; the oldest run's trace is dropped first
+MAX_TRACED_RUNS = 256
+
+# Spans kept per run; older spans are overwritten once a run records more
+MAX_SPANS_PER_RUN = 10_000
+
+# perf_counter() is monotonic but has no epoch; this offset turns it into wall-clock microseconds
+_EPOCH_OFFSET_S = time.time() - time.perf_counter()
+
+def trace_clock() -> float:
+    """Current time in microseconds, the unit of Chrome trace timestamps"""
+    return (time.perf_counter() + _EPOCH_OFFSET_S) * 1e6
+
+class RunTrace:
+    """Ring buffer of the complete ("X") events recorded for one run"""
+
+    def __init__(self, run_id: str, max_spans: int = MAX_SPANS_PER_RUN):
+        self.run_id = run_id
+        self.events: deque = deque(maxlen=max_spans)
+        self.threads: Dict[int, str] = {}
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, category: str, start_us: float, end_us: float, args: Optional[Dict[str, Any]] = None) -> None:
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round(start_us, 3),
+            "dur": round(end_us - start_us, 3),
+            "pid": os.getpid(),
+            "tid": thread.ident
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+            self.threads.setdefault(thread.ident, thread.name)
+            self.recorded += 1
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Trace-event JSON object, loadable by chrome://tracing and Perfetto"""
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+            threads = dict(self.threads)
+            dropped = self.recorded - len(events)
+        pid = os.getpid()
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"aas-sim {self.run_id}"}}]
+        metadata += [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        return {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"runId": self.run_id, "droppedEvents": dropped}
+        }
+
+class TraceStore:
+    """Traces of the most recent runs, keyed by cell-scoped run ID"""
+
+    def __init__(self, max_runs: int = MAX_TRACED_RUNS):
+        self.max_runs = max_runs
+        self._traces: "OrderedDict[str, RunTrace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, run_id: str) -> RunTrace:
+        """Trace of run_id in the current cell, created (and the oldest dropped) if needed"""
+        key = scoped_key(run_id)
+        with self._lock:
+            trace = self._traces.get(key)
+            if trace is None:
+                trace = self._traces[key] = RunTrace(run_id)
+                while len(self._traces) > self.max_runs:
+                    self._traces.popitem(last=False)
+            return trace
+
+    def get(self, run_id: str) -> Optional[RunTrace]:
+        with self._lock:
+            return self._traces.get(scoped_key(run_id))
+
+    def record(self, run_id: str, name: str, category: str, start_us: float, args: Optional[Dict[str, Any]] = None) -> None:
+        """Record a span that started at start_us and ends now, if run_id is being traced"""
+        trace = self.get(run_id)
+        if trace is not None:
+            trace.add(name, category, start_us, trace_clock(), args)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+traces = TraceStore()
+
+# Trace that span() records into; None outside traced runs, which makes span() nearly free
+current_trace: ContextVar[Optional[RunTrace]] = ContextVar("current_trace", default=None)
+
+@contextmanager
+def trace_run(run_id: str) -> Iterator[RunTrace]:
+    """Record the spans of this thread's work for run_id into its trace"""
+    trace = traces.start(run_id)
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+
+@contextmanager
+def span(name: str, category: str = "cycle", **args: Any) -> Iterator[None]:
+    """Time a with-block as one span of the current run's trace"""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = trace_clock()
+    try:
+        yield
+    finally:
+        trace.add(name, category, start, trace_clock(), args)
@@ -0,0 +1,137 @@
+"""Mutation version counters for cache validation, ETags and change notification"""
+import asyncio
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Tuple
+from app.core.context import current_cell, scoped_key
+
+# State sections tracked by SimulationState
+STATE_SECTIONS = ("config", "billing", "jobs", "history", "queue", "fleet")
+
+# AAS submodels tracked per device
+DEVICE_SUBMODELS = ("status", "order", "pose", "billing")
+
+# Distinguishes versions issued by this process from those of a previous run
+BOOT_ID = uuid.uuid4().hex[:8]
+
+class VersionClock:
+    """
+    Monotonic per-key mutation counters.
+    Writers bump a key *after* mutating the data it covers, so a reader that
+    sees an unchanged version knows anything it derived earlier is still valid.
+    Async readers can park until a key moves past a version they have seen.
+    Keys are namespaced by the current cell, so cells never share versions.
+    An evicted cell's keys are dropped and restart at 0 when it is loaded
+    again, under a newer epoch; ETags and snapshots include the epoch so
+    they never repeat one issued before.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._epochs: Dict[str, int] = {}   # loaded cell -> generation its keys were created in
+        self._generation = 0                # moves on every drop_cell()
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._listeners: List[Callable[[Tuple[str, ...]], None]] = []
+    
+    def subscribe(self, listener: Callable[[Tuple[str, ...]], None]) -> None:
+        """Call listener with the bumped keys after every bump, in the bumping thread and cell"""
+        self._listeners.append(listener)
+    
+    def unsubscribe(self, listener: Callable[[Tuple[str, ...]], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def bump(self, *keys: str) -> None:
+        """Increment the version of each key and wake its waiters"""
+        with self._lock:
+            for key in map(scoped_key, keys):
+                self._versions[key] = self._versions.get(key, 0) + 1
+                waiters = self._waiters.pop(key, None)
+                if waiters:
+                    for future in waiters:
+                        # Bumps usually come from cycle threads, not the event loop
+                        future.get_loop().call_soon_threadsafe(_resolve, future)
+        for listener in self._listeners:
+            listener(keys)
+    
+    def get(self, key: str) -> int:
+        """Get the current version of a key"""
+        return self._versions.get(scoped_key(key), 0)
+    
+    def snapshot(self, *keys: str) -> Tuple[int, ...]:
+        """Get the current cell's epoch and the current versions of several keys at once"""
+        return (self.epoch(),) + tuple(self._versions.get(scoped_key(key), 0) for key in keys)
+    
+    def epoch(self) -> int:
+        """Epoch of the current cell's versions; newer after each time the cell was dropped"""
+        cell_id = current_cell.get()
+        with self._lock:
+            return self._epochs.setdefault(cell_id, self._generation)
+    
+    def discard(self, *keys: str) -> None:
+        """Forget keys whose data is gone, e.g. cleared runs (they read as 0 again)"""
+        with self._lock:
+            for key in map(scoped_key, keys):
+                self._versions.pop(key, None)
+    
+    def drop_cell(self, cell_id: str) -> None:
+        """Forget every key of a cell that was unloaded"""
+        prefix = f"cell:{cell_id}:"
+        with self._lock:
+            for key in [key for key in self._versions if key.startswith(prefix)]:
+                del self._versions[key]
+            self._epochs.pop(cell_id, None)
+            self._generation += 1
+    
+    async def wait_for_change(self, key: str, since: int, timeout: float) -> int:
+        """Wait until the key's version differs from `since` or the timeout expires. Returns the current version."""
+        future = asyncio.get_running_loop().create_future()
+        key = scoped_key(key)
+        with self._lock:
+            if self._versions.get(key, 0) != since:
+                return self._versions.get(key, 0)
+            self._waiters.setdefault(key, []).append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters and future in waiters:
+                    waiters.remove(future)
+                    if not waiters:
+                        del self._waiters[key]
+        return self._versions.get(key, 0)
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+# Process-wide clock shared by state, orchestrator and API layers
+versions = VersionClock()
+
+def device_key(device: Dict[str, Any], submodel: str = None) -> str:
+    """Version key for a device, or for one of its submodels"""
+    if submodel:
+        return submodel_key(device["deviceId"], submodel)
+    return f"device:{device['deviceId']}"
+
+def submodel_key(device_id: str, submodel: str) -> str:
+    """Version key for one submodel of a device"""
+    return f"device:{device_id}:{submodel}"
+
+def touch_device(device: Dict[str, Any], *submodels: str) -> None:
+    """Record that a device dict was mutated (all submodels if none are given)"""
+    keys = [device_key(device, submodel) for submodel in (submodels or DEVICE_SUBMODELS)]
+    versions.bump(device_key(device), *keys)
+
+def make_etag(key: str, version: int) -> str:
+    """Strong ETag for a version key"""
+    return f'"{BOOT_ID}-{versions.epoch()}-{scoped_key(key)}-{version}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag"""
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
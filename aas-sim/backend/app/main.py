@@ -5,15 +5,28 @@ from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1 import aas, queue, cycle, config, history, sse
-from app.api import composer
+from app.api.v1 import aas, queue, cycle, config, history, sse, cells, capacity
+from app.api.v1.cells import CellMiddleware
+from app.api import composer, metrics, profiling
 from app.core.logging import setup_logging, get_logger
+from app.core.state import cells as cell_states
+from app.core.profiling import profiler
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging
-setup_logging(os.getenv("LOG_LEVEL", "INFO"))
+# Setup logging: JSON lines written by a background thread, rate limited per logger
+# (LOG_RATE_LIMIT records/s, 0 disables) and sampled for hot loggers (LOG_SAMPLE="logger=N,...")
+log_rate = float(os.getenv("LOG_RATE_LIMIT", "100"))
+setup_logging(
+    os.getenv("LOG_LEVEL", "INFO"),
+    fmt=os.getenv("LOG_FORMAT", "json"),
+    rate_limit=(log_rate, max(1, int(log_rate * 2))) if log_rate > 0 else None,
+    sampling=dict(
+        (name.strip(), int(every)) for name, _, every in
+        (item.partition("=") for item in os.getenv("LOG_SAMPLE", "").split(",") if "=" in item)
+    ) or None
+)
 logger = get_logger("main")
 
 app = FastAPI(
@@ -43,6 +56,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Route each request to its cell (/api/v1/cells/{cellId}/... or X-Cell-Id)
+cell_states.configure(
+    idle_ttl_s=float(os.getenv("CELL_IDLE_TTL_S", "300")),
+    max_loaded=int(os.getenv("MAX_LOADED_CELLS", "256"))
+)
+
+# Shared-state mode (see run_shared_workers): the owner holds the state and
+# publishes it, workers serve reads from replicas and forward the rest
+state_role = os.getenv("STATE_ROLE", "single")
+shared_db = os.getenv("SHARED_DB", "simulation_shared.db")
+if state_role == "owner":
+    from app.core.shared import SharedStore, StatePublisher
+    from app.api.forwarding import PublishMiddleware
+    publisher = StatePublisher(SharedStore(shared_db), cell_states)
+    publisher.start()
+    app.add_middleware(PublishMiddleware, publisher=publisher)
+elif state_role == "worker":
+    from app.core.shared import SharedStore, ReplicaState
+    from app.api.forwarding import ForwardingMiddleware
+    shared_store = SharedStore(shared_db)
+    cell_states.factory = lambda cell_id, storage_dir: ReplicaState(cell_id, storage_dir, shared_store)
+    app.add_middleware(ForwardingMiddleware, owner_url=os.getenv("OWNER_URL", "http://127.0.0.1:8011"), store=shared_store)
+
+# Opt-in profiling; off unless PROFILE_MODE is set or POST /api/v1/profile/start is called
+profiler.configure(
+    os.getenv("PROFILE_MODE", "off"),
+    routes=os.getenv("PROFILE_ROUTES", "/api/v1").split(","),
+    cycles=os.getenv("PROFILE_CYCLES", "true").lower() in ("1", "true", "yes", "on"),
+    interval_s=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+)
+
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.RequestMetricsMiddleware)
+app.add_middleware(CellMiddleware)
+
 # Include API routers
 app.include_router(aas.router, prefix="/api/v1/aas", tags=["AAS"])
 app.include_router(queue.router, prefix="/api/v1/queue", tags=["Queue"])
@@ -51,6 +99,10 @@ app.include_router(config.router, prefix="/api/v1/config", tags=["Configuration"
 app.include_router(history.router, prefix="/api/v1/history", tags=["History"])
 app.include_router(sse.router, prefix="/api/v1", tags=["Events"])
 app.include_router(composer.router, prefix="/api/v1", tags=["Composer"])
+app.include_router(cells.router, prefix="/api/v1/cells", tags=["Cells"])
+app.include_router(capacity.router, prefix="/api/v1/capacity", tags=["Capacity"])
+app.include_router(metrics.router, tags=["Monitoring"])
+app.include_router(profiling.router, prefix="/api/v1/profile", tags=["Monitoring"])
 
 @app.get("/")
 async def root():
@@ -66,30 +118,71 @@ async def root():
             "run_cycle": "/api/v1/cycle/run",
             "configuration": "/api/v1/config",
             "history": "/api/v1/history",
-            "events_sse": "/api/v1/events"
+            "capacity": "/api/v1/capacity/simulate",
+            "events_sse": "/api/v1/events",
+            "metrics": "/metrics"
         }
     }
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    from app.core.state import get_state
+    from app.core.state import get_state, now_iso
+    from app.core.cache import response_cache
     
     state = get_state()
     
     return {
         "status": "healthy",
-        "timestamp": "2025-01-21T10:00:00Z",
+        "timestamp": now_iso(),
         "devices": {
             "engraver": state.engraver["operationalData"]["status"]["operationMode"],
             "agv": state.agv["operationalData"]["status"]["operationMode"]
         },
-        "queue_length": len(state.orchestrator.queue)
+        "cell": state.cell_id,
+        "role": state_role,
+        "queue_length": len(state.orchestrator.queue),
+        "response_cache": response_cache.stats()
     }
 
+def run_shared_workers(host: str, port: int, workers: int):
+    """Start the owner process on a private port, then serve the public port with several replica workers"""
+    import subprocess
+    import sys
+    import time
+    import httpx
+    import uvicorn
+    
+    owner_port = int(os.getenv("OWNER_PORT", "8011"))
+    owner_url = f"http://127.0.0.1:{owner_port}"
+    owner = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(owner_port)],
+        env={**os.environ, "STATE_ROLE": "owner"}
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{owner_url}/health").raise_for_status()
+                break
+            except httpx.HTTPError:
+                if owner.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("Owner process failed to start")
+                time.sleep(0.2)
+        logger.info(f"Owner process ready on {owner_url}; starting {workers} workers on {host}:{port}")
+        os.environ.update({"STATE_ROLE": "worker", "OWNER_URL": owner_url})
+        uvicorn.run("app.main:app", host=host, port=port, workers=workers)
+    finally:
+        owner.terminate()
+        owner.wait()
+
 if __name__ == "__main__":
     import uvicorn
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8001"))
-    logger.info(f"Starting server on {host}:{port}")
-    uvicorn.run("app.main:app", host=host, port=port, reload=True)
\ No newline at end of file
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1:
+        run_shared_workers(host, port, workers)
+    else:
+        logger.info(f"Starting server on {host}:{port}")
+        uvicorn.run("app.main:app", host=host, port=port, reload=True)
\ No newline at end of file
@@ -1,6 +1,6 @@
 """Pydantic models for AAS simulation"""
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Tuple, Union, Literal
 from datetime import datetime
 from enum import Enum
 
@@ -95,6 +95,16 @@ class EnqueueJobRequest(BaseModel):
     orderNo: str = Field(..., min_length=1)
     laserText: str = Field(..., min_length=1)
     site: str = Field(default="JOB_POS1")
+    weightKg: Optional[float] = Field(default=None, gt=0, description="Payload weight (default: agv.job_weight_kg)")
+    powerPreset: Optional[str] = Field(default=None, description="Engraver power preset (default: engraver.default_powerPreset)")
+
+class DeviceCreateRequest(BaseModel):
+    deviceId: str = Field(..., min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_-]+$")
+    deviceType: Literal["Engraver", "AGV"]
+
+class DeviceBatchReadRequest(BaseModel):
+    devices: Optional[List[str]] = Field(default=None, description="Device IDs or aliases that '*' expands to (default: all)")
+    fields: List[str] = Field(..., min_length=1, description="Field paths, e.g. 'agv.operationalData.pose' or '*.usageBilling.usageCost'")
 
 class RunCycleRequest(BaseModel):
     site: str = Field(default="JOB_POS1")
@@ -114,24 +124,85 @@ class CycleSummaryResponse(BaseModel):
     endedAt: str
 
 # Configuration Models
+class PowerPresetModel(BaseModel):
+    power_factor: Optional[float] = Field(default=None, gt=0, description="Multiplier on k_laser")
+    speed_multiplier: Optional[float] = Field(default=None, gt=0, description="Engraving speed relative to seconds_per_letter")
+    idle_kWh: Optional[float] = Field(default=None, ge=0, description="Idle draw per job; null uses baseIdle_kWh")
+
 class EngraverConfigModel(BaseModel):
     emissionFactor_g_per_kWh: Optional[float] = None
     costPerEnergyUnit_EUR_per_kWh: Optional[float] = None
     baseIdle_kWh: Optional[float] = None
     k_laser_kWh_per_sec_at_power1: Optional[float] = None
     default_powerPreset: Optional[str] = None
+    power_presets: Optional[Dict[str, Optional[PowerPresetModel]]] = Field(default=None, description="Presets to add or change; a null preset is removed")
     seconds_per_letter: Optional[float] = None
+    tariff_file: Optional[str] = Field(default=None, description="Price schedule in the tariff directory; empty for the flat device price")
+    emission_factor_file: Optional[str] = Field(default=None, description="Grid-carbon schedule in the tariff directory; empty for the flat factor")
+
+class QuoteJobModel(BaseModel):
+    laserText: str = Field(..., max_length=1000)
+    powerPreset: Optional[str] = Field(default=None, description="Defaults to default_powerPreset")
+
+class QuoteRequest(BaseModel):
+    jobs: List[QuoteJobModel] = Field(..., min_length=1, max_length=100000)
 
 class AGVConfigModel(BaseModel):
     costPerMeter_EUR: Optional[float] = None
     speed_m_per_s: Optional[float] = None
+    payload_max_jobs: Optional[int] = Field(default=None, ge=0, description="Jobs per trip; 0 disables the limit")
+    payload_max_kg: Optional[float] = Field(default=None, ge=0, description="Weight per trip; 0 disables the limit")
+    job_weight_kg: Optional[float] = Field(default=None, gt=0, description="Weight of a job without weightKg")
+
+class QueueConfigModel(BaseModel):
+    max_length: Optional[int] = Field(default=None, ge=0, description="0 disables the limit")
+    max_per_site: Optional[int] = Field(default=None, ge=0, description="0 disables the limit")
+    retry_after_s: Optional[int] = Field(default=None, ge=0)
+
+class BatchingConfigModel(BaseModel):
+    max_jobs: Optional[int] = Field(default=None, ge=1, description="Jobs per cycle; null takes all queued for the site")
+    min_batch: Optional[int] = Field(default=None, ge=1, description="Queued jobs that start a cycle; null disables this trigger")
+    max_wait_s: Optional[float] = Field(default=None, ge=0, description="Oldest job's wait that starts a cycle")
+    max_agv_cost_per_job: Optional[float] = Field(default=None, ge=0, description="Billed round-trip cost per job (EUR) that starts a cycle")
 
 class ConfigUpdateRequest(BaseModel):
     currency: Optional[str] = None
     engraver: Optional[EngraverConfigModel] = None
     agv: Optional[AGVConfigModel] = None
+    queue: Optional[QueueConfigModel] = None
+    batching: Optional[BatchingConfigModel] = None
     progress_step: Optional[int] = None
     poll_interval_s: Optional[float] = None
+    time_scale: Optional[float] = Field(default=None, ge=0, description="Multiplier for simulated sleeps; 0 disables them")
+
+# Capacity Planning Models
+class CapacitySimulationRequest(BaseModel):
+    arrivalRatePerHour: float = Field(..., gt=0, description="Mean Poisson job arrivals per hour")
+    shiftHours: float = Field(default=8.0, gt=0, le=24)
+    pairs: Optional[int] = Field(default=None, ge=1, le=64, description="Engraver/AGV pairs (default: the cell's current fleet)")
+    jobMix: Optional[Dict[int, float]] = Field(default=None, description="Letters per job -> relative share, e.g. {5: 0.5, 20: 0.5}")
+    siteMix: Optional[Dict[str, float]] = Field(default=None, description="Job site -> relative share (default: all sites equally)")
+    maxJobs: Optional[int] = Field(default=None, ge=1, description="Most jobs per cycle (default: all queued for the site)")
+    minBatch: int = Field(default=1, ge=1, description="Jobs a site needs queued before a cycle starts")
+    maxWaitS: Optional[float] = Field(default=None, ge=0, description="Start a smaller cycle once the oldest job waited this long")
+    maxAgvCostPerJob: Optional[float] = Field(default=None, ge=0, description="...or once the billed round trip costs at most this per queued job (EUR)")
+    seed: int = Field(default=1)
+    startAt: Optional[Union[float, str]] = Field(default=None, description="Shift start on the tariff/emission schedules: epoch seconds, ISO 8601 or HH:MM (today, UTC); default now")
+
+class FleetSizingRequest(CapacitySimulationRequest):
+    maxPairs: int = Field(default=8, ge=1, le=64)
+    targetP95WaitS: float = Field(default=900.0, ge=0, description="Acceptable 95th percentile queue wait in seconds")
+
+class BatchingOptimisationRequest(BaseModel):
+    maxP95WaitS: float = Field(default=900.0, ge=0, description="Latency bound: 95th percentile queue wait in seconds")
+    arrivalRatePerHour: float = Field(default=0.0, ge=0, description="Expected arrivals per hour on top of the current queue")
+    shiftHours: float = Field(default=8.0, gt=0, le=24)
+    pairs: Optional[int] = Field(default=None, ge=1, le=64, description="Engraver/AGV pairs (default: the cell's current fleet)")
+    jobMix: Optional[Dict[int, float]] = Field(default=None, description="Letters per job -> share of arrivals (default: as in the queue)")
+    siteMix: Optional[Dict[str, float]] = Field(default=None, description="Job site -> share of arrivals (default: as in the queue)")
+    seed: int = Field(default=1)
+    startAt: Optional[Union[float, str]] = Field(default=None, description="Shift start on the tariff/emission schedules: epoch seconds, ISO 8601 or HH:MM (today, UTC); default now")
+    apply: bool = Field(default=False, description="Write the recommended policy to the config's batching section")
 
 # History Models
 class RunHistoryModel(BaseModel):
@@ -145,6 +216,15 @@ class RunHistoryModel(BaseModel):
     configSnapshot: Dict[str, Any]
     error: Optional[str] = None
 
+class ScheduleModel(BaseModel):
+    points: List[Tuple[Union[str, float], float]] = Field(..., min_length=1, description="(start, value) steps; starts are HH:MM (daily, UTC), ISO8601 or epoch seconds")
+
+class RebillRequest(BaseModel):
+    tariff: Optional[ScheduleModel] = Field(default=None, description="Price steps in EUR/kWh")
+    tariffFile: Optional[str] = Field(default=None, description="Price schedule file in the tariff directory")
+    emission: Optional[ScheduleModel] = Field(default=None, description="Grid-carbon steps in g/kWh")
+    emissionFile: Optional[str] = Field(default=None, description="Grid-carbon schedule file in the tariff directory")
+
 # Queue Models
 class QueueJobModel(BaseModel):
     orderNo: str
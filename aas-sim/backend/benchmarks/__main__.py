@@ -0,0 +1,58 @@
+"""
+Run the benchmarks and write the results as JSON.
+
+    python -m benchmarks [--quick] [--only orchestrator,api] [--output results.json]
+                         [--compare baseline.json] [--threshold 1.25] [--metric p50_ms]
+
+Exits with status 1 if --compare finds a result slower than threshold x baseline.
+"""
+import argparse
+import json
+import os
+import sys
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="AAS simulation performance benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes and fewer repetitions")
+    parser.add_argument("--only", default="", help="Comma-separated benchmark groups to run")
+    parser.add_argument("--output", default=None, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio counted as a regression")
+    parser.add_argument("--metric", default="p50_ms", help="Result field compared against the baseline")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    from benchmarks.harness import BENCHMARKS, report, compare, write_json, isolate_workdir
+    isolate_workdir()
+    from benchmarks import bench_orchestrator, bench_persistence, bench_getters, bench_sse, bench_api, bench_billing, bench_telemetry  # noqa: F401 (registration)
+
+    selected = [name for name in args.only.split(",") if name] or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark groups {unknown}. Available: {list(BENCHMARKS)}")
+
+    results = []
+    for name in selected:
+        print(f"Running {name} ...", file=sys.stderr)
+        results.extend(BENCHMARKS[name](args.quick))
+    payload = report(results, args.quick)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            payload["regressions"] = compare(payload, json.load(f), args.metric, args.threshold)
+
+    if output:
+        write_json(output, payload)
+        print(f"Wrote {len(results)} results to {output}", file=sys.stderr)
+    else:
+        json.dump(payload, sys.stdout, indent=2)
+        print()
+
+    for regression in payload.get("regressions", []):
+        print(f"REGRESSION {regression['benchmark']}: {regression['metric']} {regression['baseline']} -> {regression['current']} (x{regression['ratio']})", file=sys.stderr)
+    return 1 if payload.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""API latency percentiles through an in-process ASGI client"""
+import asyncio
+import time
+import httpx
+from benchmarks.harness import benchmark, summarize, result
+
+ENDPOINTS = [
+    "/health",
+    "/api/v1/config",
+    "/api/v1/queue",
+    "/api/v1/aas/devices",
+    "/api/v1/aas/combined-billing",
+    "/api/v1/history?limit=50",
+    "/api/v1/cycle/status"
+]
+
+async def timed_get(client: httpx.AsyncClient, path: str, samples: list) -> None:
+    start = time.perf_counter()
+    response = await client.get(path)
+    samples.append(time.perf_counter() - start)
+    response.raise_for_status()
+
+async def run_endpoint(client: httpx.AsyncClient, path: str, requests: int, concurrency: int):
+    samples = []
+    for _ in range(5):
+        await client.get(path)
+    for _ in range(0, requests, concurrency):
+        await asyncio.gather(*(timed_get(client, path, samples) for _ in range(concurrency)))
+    return summarize(samples)
+
+async def run_all(quick: bool):
+    from app.main import app
+    from app.core.state import get_state
+    from benchmarks.fixtures import make_jobs, seed
+
+    state = get_state()
+    state.orchestrator.clear_queue()
+    state.orchestrator.admit_jobs(make_jobs(200))
+    seed(state, runs=1000, jobs=1000)
+
+    results = []
+    requests = 100 if quick else 500
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for concurrency in (1, 10):
+            for path in ENDPOINTS:
+                stats = await run_endpoint(client, path, requests, concurrency)
+                results.append(result("api", f"GET {path}", stats, concurrency=concurrency))
+    return results
+
+@benchmark("api")
+def bench_api(quick: bool):
+    return asyncio.run(run_all(quick))
@@ -0,0 +1,49 @@
+"""Repricing a month of engrave jobs against time-of-use schedules, and bulk preset quotes"""
+from datetime import datetime, timedelta, timezone
+from benchmarks.fixtures import fresh_state, make_run
+from benchmarks.harness import benchmark, measure, result
+from app.core.tariff import Schedule, rebill
+from app.core.presets import quote_jobs
+
+MONTH_START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+def seed_month(state, runs: int):
+    """Runs spread evenly over 30 days, each job stamped with its engraving interval"""
+    step = timedelta(days=30) / runs
+    with state._lock:
+        for i in range(runs):
+            run = make_run(i)
+            started = MONTH_START + i * step
+            run["startedAt"] = started.isoformat()
+            for j, job in enumerate(run["cycleSummary"]["individualJobs"]):
+                job["started_at"] = (started + timedelta(seconds=10 * j)).isoformat()
+                job["seconds"] = 2.5
+            state.run_history[run["runId"]] = run
+        state.history_index.rebuild(state.run_history)
+    return state
+
+@benchmark("billing")
+def bench_billing(quick: bool):
+    results = []
+    hourly = Schedule.from_points([(f"{hour:02d}:00", 0.2 + 0.3 * (7 <= hour < 21)) for hour in range(24)], "EUR/kWh")
+    carbon = Schedule.from_points([(f"{hour:02d}:30", 300 + 5 * hour) for hour in range(24)], "g/kWh")
+    for runs in ([1000] if quick else [1000, 10000]):
+        state = seed_month(fresh_state(), runs)
+        repeat = 5 if runs >= 10000 else 20
+        run_ids = state.snapshot_run_ids()
+        jobs = state.billed_engrave_jobs(run_ids)
+        cases = {
+            "collect_jobs": lambda: state.billed_engrave_jobs(run_ids),
+            "rebill": lambda: rebill(jobs, hourly, carbon),
+            "rebill_month": lambda: rebill(state.billed_engrave_jobs(state.snapshot_run_ids()), hourly, carbon, per_run=True)
+        }
+        for name, func in cases.items():
+            results.append(result("billing", name, measure(func, repeat=repeat), runs=runs, jobs=len(jobs)))
+
+    state = fresh_state()
+    usage_billing = state.get_device("engraver")["usageBilling"]
+    for count in ([1000] if quick else [1000, 10000]):
+        jobs = [("BENCHMARK"[: 1 + i % 9] * (1 + i % 4), ("Eco", None, "High")[i % 3]) for i in range(count)]
+        stats = measure(lambda: quote_jobs(state.config, usage_billing, jobs, 0.0), repeat=5 if count >= 10000 else 20)
+        results.append(result("billing", "quote", stats, jobs=count))
+    return results
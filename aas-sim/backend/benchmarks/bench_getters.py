@@ -0,0 +1,22 @@
+"""Getters that deep-copy state before returning it"""
+from benchmarks.fixtures import fresh_state, seed
+from benchmarks.harness import benchmark, measure, result
+
+@benchmark("getters")
+def bench_getters(quick: bool):
+    results = []
+    for size in ([100, 1000] if quick else [100, 1000, 10000]):
+        state = seed(fresh_state(), runs=size, jobs=size)
+        repeat = 5 if size >= 10000 else 30
+        cases = {
+            "get_run_history_all": state.get_run_history,
+            "get_run_history_one": lambda: state.get_run_history("run_000000"),
+            "query_run_history_page": lambda: state.query_run_history(50),
+            "get_individual_jobs": state.get_individual_jobs,
+            "get_cumulative_billing": state.get_cumulative_billing,
+            "get_device": lambda: state.get_device("engraver"),
+            "project_devices": lambda: state.project_devices(["operationalData.status", "usageBilling.usageCost"])
+        }
+        for name, func in cases.items():
+            results.append(result("getters", name, measure(func, repeat=repeat), runs=size, jobs=size))
+    return results
@@ -0,0 +1,30 @@
+"""run_cycle_for_site and queue admission with large queues"""
+from app.core.orchestrator import run_cycle_for_site
+from benchmarks.fixtures import fresh_state, make_jobs
+from benchmarks.harness import benchmark, measure, result
+
+@benchmark("orchestrator")
+def bench_orchestrator(quick: bool):
+    results = []
+    for size in ([100, 1000] if quick else [100, 1000, 5000]):
+        state = fresh_state()
+        orch = state.orchestrator
+
+        stats = measure(lambda: orch.admit_jobs(make_jobs(size)), repeat=3 if quick else 5, setup=orch.clear_queue)
+        results.append(result("orchestrator", "admit_jobs", stats, queue=size))
+
+        # One cycle drains the whole site: 4 AGV legs plus one engrave job per queued order, without sleeps
+        stats = measure(
+            lambda: run_cycle_for_site(orch, "JOB_POS1"),
+            repeat=2 if quick else 3,
+            warmup=0,
+            setup=lambda: (orch.clear_queue(), orch.admit_jobs(make_jobs(size)))
+        )
+        stats["per_job_us"] = round(stats["p50_ms"] * 1000 / size, 2)
+        results.append(result("orchestrator", "run_cycle_for_site", stats, queue=size))
+
+        orch.clear_queue()
+        orch.admit_jobs(make_jobs(size) + make_jobs(size, "JOB_POS2", "C"))
+        stats = measure(orch.get_queue_stats, repeat=200)
+        results.append(result("orchestrator", "get_queue_stats", stats, queue=2 * size))
+    return results
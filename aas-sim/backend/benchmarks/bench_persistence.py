@@ -0,0 +1,28 @@
+"""_persist and load_db latency as history and individual jobs grow"""
+from app.core.database import load_db, DB_FILE
+from benchmarks.fixtures import fresh_state, seed
+from benchmarks.harness import benchmark, measure, result
+
+def persist(state):
+    with state._lock:
+        state._persist()
+
+@benchmark("persistence")
+def bench_persistence(quick: bool):
+    results = []
+    for size in ([100, 1000] if quick else [100, 1000, 10000]):
+        state = seed(fresh_state(), runs=size, jobs=size)
+        repeat = 5 if size >= 10000 else 20
+
+        stats = measure(lambda: persist(state), repeat=repeat)
+        results.append(result("persistence", "persist", stats, runs=size, jobs=size))
+
+        path = state._storage_path(DB_FILE)
+        stats = measure(lambda: load_db(path), repeat=repeat)
+        results.append(result("persistence", "load_db", stats, runs=size, jobs=size))
+
+        # Every history write persists the whole state
+        run = {"runId": "run_bench", "site": "JOB_POS1", "startedAt": "2099-01-01T00:00:00", "status": "running"}
+        stats = measure(lambda: state.add_run_history(run), repeat=repeat)
+        results.append(result("persistence", "add_run_history", stats, runs=size, jobs=size))
+    return results
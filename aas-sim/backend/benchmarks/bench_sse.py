@@ -0,0 +1,18 @@
+"""Building and serializing one SSE tick for every connected client"""
+import json
+from app.api.v1.sse import build_event
+from benchmarks.fixtures import fresh_state, make_jobs
+from benchmarks.harness import benchmark, measure, result
+
+@benchmark("sse")
+def bench_sse(quick: bool):
+    state = fresh_state()
+    state.orchestrator.admit_jobs(make_jobs(500))
+    results = []
+    for clients in ([1, 10, 100] if quick else [1, 10, 100, 1000]):
+        # Each client's generator builds and encodes its own event every tick
+        tick = lambda: [f"data: {json.dumps(build_event(state))}\n\n" for _ in range(clients)]
+        stats = measure(tick, repeat=20 if clients < 1000 else 5)
+        stats["per_client_us"] = round(stats["p50_ms"] * 1000 / clients, 2)
+        results.append(result("sse", "tick", stats, clients=clients))
+    return results
@@ -0,0 +1,23 @@
+"""Telemetry sampling on the simulation's hot path, and downsampled range queries"""
+from app.core.state import make_agv
+from app.core.telemetry import TelemetryStore
+from benchmarks.harness import benchmark, measure, result
+
+@benchmark("telemetry")
+def bench_telemetry(quick: bool):
+    results = []
+    store = TelemetryStore(capacity=18000)
+    device = make_agv()
+    status = device["operationalData"]["status"]
+
+    def record_steps(steps: int = 1000):
+        for _ in range(steps):
+            status["heartbeatCounter"] += 1
+            store.record(device)
+    results.append(result("telemetry", "record_1000", measure(record_steps, repeat=10 if quick else 30)))
+
+    # Fill the buffer so queries read it wrapped around
+    record_steps(20000)
+    for points in (0, 500):
+        results.append(result("telemetry", "query", measure(lambda: store.query(device["deviceId"], max_points=points), repeat=5 if quick else 20), samples=18000, points=points))
+    return results
@@ -0,0 +1,70 @@
+"""Isolated simulation states seeded with synthetic queues, history and jobs"""
+import os
+import tempfile
+from typing import Any, Dict, List
+from app.core.orchestrator import EngraveJob
+from app.core.state import SimulationState
+
+_workdir = tempfile.mkdtemp(prefix="aas-bench-")
+_states = 0
+
+def fresh_state() -> SimulationState:
+    """A new state with its own storage, no sleeps and no queue limits"""
+    global _states
+    _states += 1
+    state = SimulationState(f"bench-{_states}", storage_dir=os.path.join(_workdir, f"bench-{_states}"))
+    state.config["time_scale"] = 0.0
+    state.config["queue"].update({"max_length": 0, "max_per_site": 0})
+    return state
+
+def make_jobs(count: int, site: str = "JOB_POS1", prefix: str = "B") -> List[EngraveJob]:
+    return [EngraveJob(f"{prefix}-{i:06d}", "BENCHMARK"[: 1 + i % 9], site) for i in range(count)]
+
+def make_run(i: int, jobs: int = 3) -> Dict[str, Any]:
+    order_nos = [f"H-{i:06d}-{j}" for j in range(jobs)]
+    return {
+        "runId": f"run_{i:06d}",
+        "site": "JOB_POS1" if i % 2 else "JOB_POS2",
+        "startedAt": f"2025-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}",
+        "endedAt": f"2025-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}",
+        "status": "completed",
+        "jobsProcessed": order_nos,
+        "cycleSummary": {
+            "site": "JOB_POS1",
+            "jobsProcessed": order_nos,
+            "individualJobs": [make_job_details(order_no) for order_no in order_nos],
+            "agvBilledMeters": 27.3,
+            "agvCostEUR": 0.546,
+            "engraverEnergyKWh": 0.074,
+            "engraverCO2g": 31.08,
+            "engraverCostEUR": 0.0296,
+            "combinedCostEUR": 0.5756
+        },
+        "configSnapshot": {"agv": {"speed_m_per_s": 0.5}, "engraver": {"seconds_per_letter": 0.5}},
+        "error": None
+    }
+
+def make_job_details(order_no: str) -> Dict[str, Any]:
+    return {
+        "order_no": order_no,
+        "laser_text": "HELLO",
+        "letters": 5,
+        "energy_kWh": 0.025,
+        "co2_g": 10.5,
+        "cost_eur": 0.01,
+        "completed_at": "2025-01-01T00:00:00+00:00",
+        "source": "user",
+        "agv_distance_share": 9.1,
+        "agv_cost_share": 0.182
+    }
+
+def seed(state: SimulationState, runs: int = 0, jobs: int = 0) -> SimulationState:
+    """Fill history and individual jobs directly, without persisting after every entry"""
+    with state._lock:
+        for i in range(runs):
+            run = make_run(i)
+            state.run_history[run["runId"]] = run
+        state.history_index.rebuild(state.run_history)
+        state.individual_jobs.extend(make_job_details(f"J-{i:06d}") for i in range(jobs))
+        state._persist()
+    return state
@@ -0,0 +1,123 @@
+"""Timing, registration and JSON reporting shared by the benchmarks"""
+import gc
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# name -> function(quick) returning a list of result dicts
+BENCHMARKS: Dict[str, Callable[[bool], List[Dict[str, Any]]]] = {}
+
+# Result schema; bump when fields change meaning so old baselines are not compared blindly
+SCHEMA_VERSION = 1
+
+def benchmark(name: str):
+    """Register a benchmark group"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+def summarize(samples_s: List[float]) -> Dict[str, float]:
+    """Latency statistics in milliseconds"""
+    values = sorted(s * 1000 for s in samples_s)
+    return {
+        "n": len(values),
+        "mean_ms": round(sum(values) / len(values), 4),
+        "min_ms": round(values[0], 4),
+        "p50_ms": round(percentile(values, 50), 4),
+        "p90_ms": round(percentile(values, 90), 4),
+        "p99_ms": round(percentile(values, 99), 4),
+        "max_ms": round(values[-1], 4)
+    }
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int = 1, setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """Time repeat calls of func() (each after an untimed setup()) with the garbage collector paused"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return summarize(samples)
+
+def result(group: str, name: str, stats: Dict[str, float], **params: Any) -> Dict[str, Any]:
+    return {"group": group, "name": name, "params": params, **stats}
+
+def environment() -> Dict[str, Any]:
+    """Where and on what the results were produced"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit
+    }
+
+def report(results: List[Dict[str, Any]], quick: bool) -> Dict[str, Any]:
+    return {
+        "schema": SCHEMA_VERSION,
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "quick": quick,
+        "environment": environment(),
+        "results": results
+    }
+
+def result_key(entry: Dict[str, Any]) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(entry["params"].items()))
+    return f"{entry['group']}/{entry['name']}[{params}]"
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], metric: str = "p50_ms", threshold: float = 1.25) -> List[Dict[str, Any]]:
+    """Results whose metric grew by more than threshold times the baseline's"""
+    previous = {result_key(entry): entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in current["results"]:
+        before = previous.get(result_key(entry))
+        if before is None or not before.get(metric):
+            continue
+        ratio = entry[metric] / before[metric]
+        if ratio > threshold:
+            regressions.append({"benchmark": result_key(entry), "metric": metric, "baseline": before[metric], "current": entry[metric], "ratio": round(ratio, 3)})
+    return regressions
+
+def isolate_workdir(prefix: str = "aas-bench-cwd-") -> str:
+    """
+    Move into a fresh temporary directory before the app is imported,
+    so its default cell, journal and shards stay out of the working tree
+    """
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    os.chdir(workdir)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    return workdir
+
+def write_json(path: str, payload: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
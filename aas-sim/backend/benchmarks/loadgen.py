@@ -0,0 +1,481 @@
+"""
+Open-loop load generator for the simulation API.
+
+    python -m benchmarks.loadgen [--url http://localhost:8000] [--duration 30]
+        [--arrival poisson|bursty|diurnal] [--rates enqueue=20,direct=1,batch=0.5,cycle=0.2,dashboard=50]
+        [--sse 10] [--time-scale 0.05] [--output report.json]
+
+Requests are fired at times drawn from the arrival process, whether or
+not earlier ones have answered, so a saturated service shows up as
+growing latency, errors and queue depth instead of a slower client.
+Without --url the app is driven in-process through ASGI.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import string
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from benchmarks.harness import summarize, environment, isolate_workdir, write_json
+
+OPERATIONS = ("enqueue", "direct", "batch", "cycle", "dashboard")
+
+# Reads the dashboard polls; each dashboard arrival requests the next one
+DASHBOARD_PATHS = [
+    "/api/v1/aas/devices",
+    "/api/v1/queue",
+    "/api/v1/aas/combined-billing",
+    "/api/v1/history?limit=20",
+    "/api/v1/cycle/status",
+    "/api/v1/aas/individual-jobs"
+]
+
+SITES = ("JOB_POS1", "JOB_POS2")
+
+class Poisson:
+    """Constant-rate Poisson arrivals"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.max_rate = rate
+
+    def rate_at(self, t: float) -> float:
+        return self.rate
+
+class Bursty(Poisson):
+    """Poisson arrivals at `factor` times the rate for the first burst_s of every period_s"""
+
+    def __init__(self, rate: float, factor: float = 5.0, burst_s: float = 2.0, period_s: float = 10.0):
+        super().__init__(rate)
+        self.factor = factor
+        self.burst_s = burst_s
+        self.period_s = period_s
+        self.max_rate = rate * max(factor, 1.0)
+
+    def rate_at(self, t: float) -> float:
+        return self.rate * self.factor if t % self.period_s < self.burst_s else self.rate
+
+class Diurnal(Poisson):
+    """Poisson arrivals whose rate follows a sine wave around the mean, starting at the trough"""
+
+    def __init__(self, rate: float, amplitude: float = 0.8, period_s: float = 60.0):
+        super().__init__(rate)
+        self.amplitude = min(max(amplitude, 0.0), 1.0)
+        self.period_s = period_s
+        self.max_rate = rate * (1 + self.amplitude)
+
+    def rate_at(self, t: float) -> float:
+        return self.rate * (1 - self.amplitude * math.cos(2 * math.pi * t / self.period_s))
+
+def arrival_times(process: Poisson, duration_s: float, rng: random.Random) -> List[float]:
+    """Arrival offsets in [0, duration_s), by thinning a Poisson process at the maximum rate"""
+    times = []
+    if process.max_rate <= 0:
+        return times
+    t = 0.0
+    while True:
+        t += rng.expovariate(process.max_rate)
+        if t >= duration_s:
+            return times
+        if rng.random() * process.max_rate <= process.rate_at(t):
+            times.append(t)
+
+def make_process(arrival: str, rate: float, options: Dict[str, float]) -> Poisson:
+    if arrival == "poisson":
+        return Poisson(rate)
+    if arrival == "bursty":
+        return Bursty(rate, options.get("burst_factor", 5.0), options.get("burst_s", 2.0), options.get("burst_period_s", 10.0))
+    if arrival == "diurnal":
+        return Diurnal(rate, options.get("amplitude", 0.8), options.get("diurnal_period_s", 60.0))
+    raise ValueError(f"Unknown arrival process '{arrival}'. Available: poisson, bursty, diurnal")
+
+class AsgiTarget:
+    """
+    Calls the ASGI app directly. A request returns as soon as its response
+    body is complete, while background tasks keep running, as behind a server.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._tasks = set()
+
+    def _scope(self, method: str, path: str, body: bytes, spec_version: str = "2.4") -> Dict[str, Any]:
+        path, _, query = path.partition("?")
+        headers = [(b"host", b"loadgen")]
+        if body:
+            headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": spec_version},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("loadgen", 0),
+            "server": ("loadgen", 80)
+        }
+
+    async def request(self, method: str, path: str, body: Optional[Any] = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode() if body is not None else b""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        status = [0]
+        chunks: List[bytes] = []
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": payload, "more_body": False}
+            await asyncio.Event().wait()   # Never disconnects
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body") and not done.done():
+                    done.set_result(None)
+
+        task = asyncio.create_task(self._call(self._scope(method, path, payload), receive, send, done))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        await done
+        return status[0], b"".join(chunks)
+
+    async def _call(self, scope, receive, send, done: asyncio.Future) -> None:
+        try:
+            await self.app(scope, receive, send)
+        except Exception as e:
+            if not done.done():
+                done.set_exception(e)
+        finally:
+            if not done.done():
+                done.set_exception(RuntimeError("App returned without a complete response"))
+
+    async def stream(self, path: str, on_chunk: Callable[[bytes], None], stop: asyncio.Event) -> None:
+        """Read a streaming response until stop is set"""
+        sent_request = False
+
+        async def receive():
+            nonlocal sent_request
+            if not sent_request:
+                sent_request = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await stop.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if stop.is_set():
+                raise OSError("Subscriber disconnected")
+            if message["type"] == "http.response.body" and message.get("body"):
+                on_chunk(message["body"])
+
+        try:
+            await self.app(self._scope("GET", path, b"", spec_version="2.3"), receive, send)
+        except OSError:
+            pass
+
+    async def close(self) -> None:
+        """Give background work of finished requests a moment, then cancel what is left"""
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=5)
+            for task in pending:
+                task.cancel()
+
+class HttpTarget:
+    """Drives a live server over HTTP"""
+
+    def __init__(self, url: str):
+        import httpx
+        self.client = httpx.AsyncClient(base_url=url, timeout=60)
+
+    async def request(self, method: str, path: str, body: Optional[Any] = None) -> Tuple[int, bytes]:
+        response = await self.client.request(method, path, json=body)
+        return response.status_code, response.content
+
+    async def stream(self, path: str, on_chunk: Callable[[bytes], None], stop: asyncio.Event) -> None:
+        async with self.client.stream("GET", path, timeout=None) as response:
+            async for chunk in response.aiter_raw():
+                on_chunk(chunk)
+                if stop.is_set():
+                    return
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+class LoadGenerator:
+    """Fires each operation at its own arrival times and records every outcome"""
+
+    def __init__(self, target, duration_s: float, processes: Dict[str, Poisson], sse_subscribers: int = 0,
+                 sample_interval_s: float = 1.0, max_in_flight: int = 1000, seed: int = 1):
+        self.target = target
+        self.duration_s = duration_s
+        self.processes = processes
+        self.sse_subscribers = sse_subscribers
+        self.sample_interval_s = sample_interval_s
+        self.max_in_flight = max_in_flight
+        self.rng = random.Random(seed)
+        self.records: Dict[str, List[Tuple[float, float, Optional[int]]]] = defaultdict(list)   # op -> (sent at, latency, status)
+        self.skipped: Dict[str, int] = defaultdict(int)
+        self.queue_depth: List[Tuple[float, int]] = []
+        self.sse: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        self._sequence = 0
+        self._dashboard = 0
+        self._started = 0.0
+
+    def _text(self) -> str:
+        return "".join(self.rng.choice(string.ascii_uppercase) for _ in range(self.rng.randint(1, 12)))
+
+    def build_request(self, op: str) -> Tuple[str, str, Optional[Any]]:
+        """(method, path, JSON body) of one request for an operation"""
+        site = self.rng.choice(SITES)
+        if op == "enqueue":
+            self._sequence += 1
+            return "POST", "/api/v1/queue/enqueue", {"orderNo": f"LG-{self._sequence:07d}", "laserText": self._text(), "site": site}
+        if op == "direct":
+            return "POST", "/api/v1/composer/direct", {"laserText": self._text(), "site": site}
+        if op == "batch":
+            return "POST", "/api/v1/composer/batch", {"jobs": [{"laserText": self._text()} for _ in range(self.rng.randint(1, 5))], "site": site}
+        if op == "cycle":
+            return "POST", f"/api/v1/cycle/run?site={site}", None
+        if op == "dashboard":
+            self._dashboard += 1
+            return "GET", DASHBOARD_PATHS[self._dashboard % len(DASHBOARD_PATHS)], None
+        raise ValueError(f"Unknown operation '{op}'")
+
+    def now(self) -> float:
+        return time.perf_counter() - self._started
+
+    async def _fire(self, op: str) -> None:
+        method, path, body = self.build_request(op)
+        sent = self.now()
+        self.in_flight += 1
+        try:
+            status, _ = await self.target.request(method, path, body)
+        except Exception:
+            status = None
+        finally:
+            self.in_flight -= 1
+        self.records[op].append((sent, self.now() - sent, status))
+
+    async def _drive(self, op: str, times: List[float], tasks: set) -> None:
+        for t in times:
+            delay = t - self.now()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.in_flight >= self.max_in_flight:
+                self.skipped[op] += 1
+                continue
+            task = asyncio.create_task(self._fire(op))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async def _sample_queue(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            try:
+                status, body = await self.target.request("GET", "/api/v1/queue")
+                if status == 200:
+                    self.queue_depth.append((round(self.now(), 3), json.loads(body)["length"]))
+            except Exception:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), self.sample_interval_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _subscribe(self, stop: asyncio.Event) -> None:
+        stats = {"events": 0, "firstEventMs": None, "error": None}
+        self.sse.append(stats)
+        opened = time.perf_counter()
+
+        def on_chunk(chunk: bytes) -> None:
+            events = chunk.count(b"data:")
+            if events and stats["firstEventMs"] is None:
+                stats["firstEventMs"] = round((time.perf_counter() - opened) * 1000, 3)
+            stats["events"] += events
+
+        try:
+            await self.target.stream("/api/v1/events", on_chunk, stop)
+        except Exception as e:
+            stats["error"] = str(e)
+
+    async def run(self) -> Dict[str, Any]:
+        schedules = {op: arrival_times(process, self.duration_s, self.rng) for op, process in self.processes.items()}
+        stop = asyncio.Event()
+        requests: set = set()
+        self._started = time.perf_counter()
+
+        sampler = asyncio.create_task(self._sample_queue(stop))
+        subscribers = [asyncio.create_task(self._subscribe(stop)) for _ in range(self.sse_subscribers)]
+        await asyncio.gather(*(self._drive(op, times, requests) for op, times in schedules.items()))
+        remaining = self.duration_s - self.now()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        stop.set()
+
+        # Let in-flight requests finish, but do not wait forever on a stuck service
+        if requests:
+            await asyncio.wait(set(requests), timeout=30)
+        await asyncio.wait(subscribers + [sampler], timeout=5)
+        for task in subscribers + [sampler]:
+            task.cancel()
+        elapsed = self.now()
+        return self.report(schedules, elapsed)
+
+    def report(self, schedules: Dict[str, List[float]], elapsed_s: float) -> Dict[str, Any]:
+        operations = {}
+        for op, times in schedules.items():
+            records = self.records.get(op, [])
+            ok = sum(1 for _, _, status in records if status is not None and status < 400)
+            rejected = sum(1 for _, _, status in records if status is not None and 400 <= status < 500)
+            errors = sum(1 for _, _, status in records if status is None or status >= 500)
+            operations[op] = {
+                "scheduled": len(times),
+                "completed": len(records),
+                "skipped": self.skipped.get(op, 0),
+                "ok": ok,
+                "rejected": rejected,
+                "errors": errors,
+                "errorRate": round(errors / len(records), 4) if records else 0.0,
+                "throughputRps": round(ok / elapsed_s, 3) if elapsed_s else 0.0,
+                "latency": summarize([latency for _, latency, _ in records]) if records else None
+            }
+
+        timeline = []
+        for second in range(int(math.ceil(elapsed_s))):
+            in_bucket = [(latency, status) for records in self.records.values() for sent, latency, status in records if second <= sent < second + 1]
+            depths = [depth for t, depth in self.queue_depth if second <= t < second + 1]
+            timeline.append({
+                "t": second,
+                "requests": len(in_bucket),
+                "errors": sum(1 for _, status in in_bucket if status is None or status >= 500),
+                "p99Ms": summarize([latency for latency, _ in in_bucket])["p99_ms"] if in_bucket else None,
+                "queueDepth": depths[-1] if depths else None
+            })
+
+        depths = [depth for _, depth in self.queue_depth]
+        first_events = [s["firstEventMs"] for s in self.sse if s["firstEventMs"] is not None]
+        return {
+            "durationS": round(elapsed_s, 3),
+            "operations": operations,
+            "totals": {
+                "completed": sum(o["completed"] for o in operations.values()),
+                "errors": sum(o["errors"] for o in operations.values()),
+                "throughputRps": round(sum(o["ok"] for o in operations.values()) / elapsed_s, 3) if elapsed_s else 0.0
+            },
+            "queueDepth": {
+                "max": max(depths) if depths else None,
+                "mean": round(sum(depths) / len(depths), 2) if depths else None,
+                "final": depths[-1] if depths else None
+            },
+            "sse": {
+                "subscribers": len(self.sse),
+                "events": sum(s["events"] for s in self.sse),
+                "errors": sum(1 for s in self.sse if s["error"]),
+                "firstEventMs": summarize([ms / 1000 for ms in first_events]) if first_events else None
+            },
+            "timeline": timeline
+        }
+
+def parse_rates(text: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        op, _, rate = item.partition("=")
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{op}'. Available: {list(OPERATIONS)}")
+        rates[op] = float(rate)
+    return rates
+
+async def run(args, rates: Dict[str, float]) -> Dict[str, Any]:
+    if args.url:
+        target = HttpTarget(args.url)
+    else:
+        from app.main import app
+        target = AsgiTarget(app)
+
+    options = {
+        "burst_factor": args.burst_factor, "burst_s": args.burst_seconds, "burst_period_s": args.burst_period,
+        "amplitude": args.diurnal_amplitude, "diurnal_period_s": args.diurnal_period
+    }
+    processes = {op: make_process(args.arrival, rate, options) for op, rate in rates.items() if rate > 0}
+    previous_time_scale = None
+    try:
+        if args.time_scale is not None:
+            # A remote target is someone's running simulation: put its time_scale back afterwards
+            status, body = await target.request("GET", "/api/v1/config")
+            if status != 200:
+                raise RuntimeError(f"Could not read the target's config (HTTP {status})")
+            previous_time_scale = json.loads(body)["config"].get("time_scale")
+            await target.request("PATCH", "/api/v1/config", {"time_scale": args.time_scale})
+        generator = LoadGenerator(target, args.duration, processes, args.sse, args.sample_interval, args.max_in_flight, args.seed)
+        result = await generator.run()
+    finally:
+        try:
+            if previous_time_scale is not None:
+                await target.request("PATCH", "/api/v1/config", {"time_scale": previous_time_scale})
+        finally:
+            await target.close()
+    result["workload"] = {
+        "target": args.url or "in-process",
+        "arrival": args.arrival,
+        "rates": rates,
+        "options": options if args.arrival != "poisson" else {},
+        "sseSubscribers": args.sse,
+        "timeScale": args.time_scale,
+        "seed": args.seed
+    }
+    result["environment"] = environment()
+    return result
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen", description="Open-loop load generator for the AAS simulation API")
+    parser.add_argument("--url", default=None, help="Base URL of a running server (default: drive the app in-process)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--arrival", default="poisson", choices=["poisson", "bursty", "diurnal"])
+    parser.add_argument("--rates", default="enqueue=10,direct=0.5,batch=0.2,cycle=0.2,dashboard=20", help="Mean requests per second per operation")
+    parser.add_argument("--sse", type=int, default=0, help="SSE subscribers kept open for the whole run")
+    parser.add_argument("--burst-factor", type=float, default=5.0)
+    parser.add_argument("--burst-seconds", type=float, default=2.0)
+    parser.add_argument("--burst-period", type=float, default=10.0)
+    parser.add_argument("--diurnal-amplitude", type=float, default=0.8)
+    parser.add_argument("--diurnal-period", type=float, default=60.0)
+    parser.add_argument("--time-scale", type=float, default=None, help="Set the simulation's time_scale for the run (restored afterwards)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between queue depth samples")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Arrivals beyond this many open requests are skipped")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Write the report JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        rates = parse_rates(args.rates)
+    except ValueError as e:
+        parser.error(str(e))
+
+    output = args.output
+    if not args.url:
+        output = os.path.abspath(output) if output else None
+        isolate_workdir("aas-loadgen-")
+
+    report = asyncio.run(run(args, rates))
+    if output:
+        write_json(output, report)
+        print(f"Wrote load report to {output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
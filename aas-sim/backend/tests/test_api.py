@@ -2,7 +2,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
-from app.core.state import reset_state
+from app.core.state import reset_state, cells
 
 client = TestClient(app)
 
@@ -109,4 +109,201 @@ def test_cycle_status():
     data = response.json()
     assert "engraver_mode" in data
     assert "agv_mode" in data
-    assert "queue_length" in data
\ No newline at end of file
+    assert "queue_length" in data
+
+
+def test_aggregate_responses_cached_between_mutations():
+    """Aggregate endpoints are served from the cache until the state they read changes"""
+    from app.core.cache import response_cache
+    from app.core.state import get_state
+
+    reset_state()
+    first = client.get("/api/v1/aas/individual-jobs").json()
+    hits = response_cache.hits
+    assert client.get("/api/v1/aas/individual-jobs").json() == first
+    assert response_cache.hits == hits + 1
+
+    get_state().add_individual_job({"order_no": "C-1", "letters": 3, "energy_kWh": 0.05, "source": "direct"})
+    updated = client.get("/api/v1/aas/individual-jobs").json()
+    assert updated["summary"]["total_jobs"] == first["summary"]["total_jobs"] + 1
+    assert client.get("/api/v1/aas/individual-jobs", params={"source": "scenario"}).json()["summary"]["total_jobs"] == 0
+
+    # Heartbeats only touch the status submodel, which combined billing does not render
+    from app.core.orchestrator import bump_heartbeat
+    client.get("/api/v1/aas/combined-billing")
+    bump_heartbeat(get_state().engraver)
+    hits = response_cache.hits
+    client.get("/api/v1/aas/combined-billing")
+    assert response_cache.hits == hits + 1
+    reset_state()
+
+def test_response_cache_lru_eviction():
+    """Cache evicts least recently used entries beyond its bound"""
+    from app.core.cache import ResponseCache
+
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", (1,), b"A")
+    cache.put("b", (1,), b"B")
+    assert cache.get("a", (1,)) == b"A"
+    cache.put("c", (1,), b"C")
+    assert cache.get("b", (1,)) is None
+    assert cache.get("a", (2,)) is None
+    assert cache.stats()["evictions"] == 1
+
+def test_submodel_etag_conditional_get():
+    """Submodels carry strong ETags and answer 304 until they change"""
+    from app.core.orchestrator import set_progress
+    from app.core.state import get_state
+
+    reset_state()
+    response = client.get("/api/v1/aas/engraver/operational/status")
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/v1/aas/engraver/operational/status", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    # Other submodels are versioned independently
+    pose_etag = client.get("/api/v1/aas/engraver/operational/pose").headers["ETag"]
+
+    set_progress(get_state().engraver, 40)
+    response = client.get("/api/v1/aas/engraver/operational/status", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["productionProgress"] == 40
+    assert response.headers["ETag"] != etag
+    assert client.get("/api/v1/aas/engraver/operational/pose", headers={"If-None-Match": pose_etag}).status_code == 304
+
+def test_submodel_long_poll_wakes_on_change():
+    """wait=true parks the request until another thread updates the submodel"""
+    import threading
+    import time
+    from app.core.orchestrator import bump_heartbeat
+    from app.core.state import get_state
+
+    reset_state()
+    etag = client.get("/api/v1/aas/agv/operational/status").headers["ETag"]
+    timer = threading.Timer(0.2, bump_heartbeat, args=(get_state().agv,))
+    timer.start()
+
+    started = time.time()
+    response = client.get("/api/v1/aas/agv/operational/status", params={"wait": True, "timeout": 10}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["heartbeatCounter"] == 1
+    assert time.time() - started < 5
+
+    response = client.get("/api/v1/aas/agv/operational/status", params={"wait": True, "timeout": 0.1}, headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+def test_run_status_long_poll():
+    """waitFor=terminal returns as soon as the run completes"""
+    import threading
+    import time
+    from app.core.state import get_state
+
+    reset_state()
+    state = get_state()
+    state.add_run_history({"runId": "run_lp", "site": "JOB_POS1", "startedAt": "2025-01-01T00:00:00", "status": "running"})
+
+    response = client.get("/api/v1/cycle/status/run_lp", params={"sinceVersion": 0})
+    version = int(response.headers["X-Run-Version"])
+    assert response.json()["status"] == "running"
+
+    timer = threading.Timer(0.2, state.update_run_history, args=("run_lp", {"status": "completed"}))
+    timer.start()
+    started = time.time()
+    response = client.get("/api/v1/cycle/status/run_lp", params={"waitFor": "terminal", "timeout": 10})
+    assert response.json()["status"] == "completed"
+    assert int(response.headers["X-Run-Version"]) > version
+    assert time.time() - started < 5
+
+    response = client.get("/api/v1/cycle/status/run_lp", params={"sinceVersion": version + 1, "timeout": 0.1})
+    assert response.json()["status"] == "completed"
+    assert client.get("/api/v1/cycle/status/run_missing").status_code == 404
+
+    # Cleared between the status check and reading the run back
+    state.get_run_history = lambda run_id=None: None
+    try:
+        assert client.get("/api/v1/cycle/status/run_lp").status_code == 404
+    finally:
+        del state.get_run_history
+        reset_state()
+
+def test_batch_read_projection():
+    """Batch read returns only the requested fields for each device"""
+    reset_state()
+    response = client.post("/api/v1/aas/batch-read", json={
+        "fields": ["agv.operationalData.pose", "*.usageBilling.usageCost", "engraver.nope"]
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data["devices"]["agv-001"]["operationalData"]["pose"]) == {"posX", "posY", "orientation"}
+    assert data["devices"]["agv-001"]["usageBilling"] == {"usageCost": 0.0}
+    assert data["devices"]["engraver-001"] == {"usageBilling": {"usageCost": 0.0}}
+    assert data["missing"] == ["engraver-001.nope"]
+    assert data["unknownDevices"] == []
+
+    data = client.post("/api/v1/aas/batch-read", json={"devices": ["engraver", "ghost-1"], "fields": ["*.deviceType", "ghost-2.deviceType"]}).json()
+    assert data["devices"] == {"engraver-001": {"deviceType": "Engraver"}}
+    assert data["missing"] == ["ghost-2.deviceType"]
+    assert data["unknownDevices"] == ["ghost-1", "ghost-2"]
+
+def test_device_registry_endpoints():
+    """Devices created from templates are addressable by every /aas/{device} endpoint"""
+    reset_state()
+    try:
+        response = client.post("/api/v1/aas/registry", json={"deviceId": "agv-002", "deviceType": "AGV"})
+        assert response.status_code == 201
+        assert client.post("/api/v1/aas/registry", json={"deviceId": "agv-002", "deviceType": "AGV"}).status_code == 409
+        client.post("/api/v1/aas/registry", json={"deviceId": "engraver-002", "deviceType": "Engraver"})
+
+        assert client.get("/api/v1/aas/agv-002/operational/pose").status_code == 200
+        assert client.get("/api/v1/aas/agv-002/billing").json()["costPerMeter"] > 0
+
+        agvs = client.get("/api/v1/aas/registry", params={"deviceType": "AGV", "status": "Idle"}).json()
+        assert [d["deviceId"] for d in agvs["devices"]] == ["agv-001", "agv-002"]
+
+        assert client.delete("/api/v1/aas/registry/agv-001").status_code == 404
+        assert client.delete("/api/v1/aas/registry/agv-002").status_code == 200
+        assert client.get("/api/v1/aas/agv-002/billing").status_code == 404
+    finally:
+        reset_state()
+
+def test_composer_claims_its_own_jobs():
+    """A composer run engraves the jobs it admitted, not older ones queued at the same site"""
+    cell = "/api/v1/cells/cell-composer-claim"
+    try:
+        client.patch(f"{cell}/config", json={"agv": {"speed_m_per_s": 50.0}, "progress_step": 100})
+        client.post(f"{cell}/queue/enqueue", json={"orderNo": "OLDER-1", "laserText": "A", "site": "JOB_POS1"})
+        response = client.post(f"{cell}/composer/direct", json={"laserText": "B", "site": "JOB_POS1"}).json()
+        status = client.get(f"{cell}/cycle/status/{response['runId']}", params={"waitFor": "terminal", "timeout": 30}).json()
+        assert status["status"] == "completed"
+        assert status["jobsProcessed"] == [response["orderNo"]]
+        assert [job["orderNo"] for job in client.get(f"{cell}/queue").json()["queue"]] == ["OLDER-1"]
+
+        # /cycle/run ids started in the same second stay distinct
+        client.post(f"{cell}/queue/enqueue", json={"orderNo": "OLDER-2", "laserText": "A", "site": "JOB_POS1"})
+        run_ids = {client.post(f"{cell}/cycle/run", params={"site": "JOB_POS1", "maxJobs": "1"}).json()["runId"] for _ in range(2)}
+        assert len(run_ids) == 2
+        for run_id in run_ids:
+            client.get(f"{cell}/cycle/status/{run_id}", params={"waitFor": "terminal", "timeout": 30})
+    finally:
+        cells.delete("cell-composer-claim")
+
+def test_composer_batch_is_bounded_by_queue_limits():
+    """Batches beyond one AGV load are accepted up to the live per-site queue limit, and go through admission"""
+    from app.api.composer import BatchJobRequest
+    request = BatchJobRequest(jobs=[{"laserText": f"JOB{i}"} for i in range(501)], site="JOB_POS2")
+    assert len(request.jobs) == 501   # no static cap: the configured limits decide
+    with pytest.raises(ValueError):
+        BatchJobRequest(jobs=[])
+
+    reset_state()
+    try:
+        client.patch("/api/v1/config", json={"queue": {"max_per_site": 2}})
+        response = client.post("/api/v1/composer/batch", json={"jobs": [{"laserText": "A"}] * 3, "site": "JOB_POS2"})
+        assert response.status_code == 400   # can never fit, so retrying is pointless
+        client.post("/api/v1/queue/enqueue", json={"orderNo": "CB-1", "laserText": "A", "site": "JOB_POS2"})
+        response = client.post("/api/v1/composer/batch", json={"jobs": [{"laserText": "A"}] * 2, "site": "JOB_POS2"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "5"
+        assert client.get("/api/v1/queue").json()["length"] == 1   # all or nothing
+    finally:
+        reset_state()
@@ -0,0 +1,68 @@
+"""Tests for the benchmark harness and load generator"""
+import argparse
+import asyncio
+import random
+from app.main import app
+from app.core.state import reset_state, get_state
+from benchmarks.harness import percentile, summarize, compare, result, report
+from benchmarks.loadgen import arrival_times, Poisson, Bursty, Diurnal, LoadGenerator, AsgiTarget, run
+
+def test_percentiles_use_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([7.0], 99) == 7.0
+
+    stats = summarize([0.001, 0.002, 0.003, 0.004])
+    assert stats["n"] == 4
+    assert stats["p50_ms"] == 2.0 and stats["max_ms"] == 4.0
+
+def test_compare_flags_regressions():
+    baseline = report([result("api", "GET /health", {"p50_ms": 1.0}, concurrency=1), result("api", "GET /queue", {"p50_ms": 2.0}, concurrency=1)], quick=True)
+    current = report([result("api", "GET /health", {"p50_ms": 1.5}, concurrency=1), result("api", "GET /queue", {"p50_ms": 2.1}, concurrency=1), result("sse", "tick", {"p50_ms": 9.0}, clients=1)], quick=True)
+
+    regressions = compare(current, baseline, threshold=1.25)
+    assert [r["benchmark"] for r in regressions] == ["api/GET /health[concurrency=1]"]
+    assert regressions[0]["ratio"] == 1.5
+
+def test_arrival_processes_match_their_rates():
+    rng = random.Random(7)
+    assert abs(len(arrival_times(Poisson(50), 100, rng)) / 100 - 50) < 3
+
+    bursty = arrival_times(Bursty(10, factor=5, burst_s=2, period_s=10), 100, rng)
+    in_bursts = sum(1 for t in bursty if t % 10 < 2)
+    assert in_bursts > len(bursty) - in_bursts   # 5x the rate for a fifth of the time
+
+    diurnal = arrival_times(Diurnal(20, amplitude=1.0, period_s=100), 100, rng)
+    assert sum(1 for t in diurnal if 25 <= t < 75) > 3 * sum(1 for t in diurnal if t < 25 or t >= 75)
+
+def test_load_generator_in_process():
+    """A short in-process run reports every operation, SSE events and queue depth"""
+    reset_state()
+    generator = LoadGenerator(AsgiTarget(app), 1.5, {"enqueue": Poisson(10), "dashboard": Poisson(20)}, sse_subscribers=1, sample_interval_s=0.5)
+    try:
+        report = asyncio.run(generator.run())
+    finally:
+        reset_state()
+
+    assert report["operations"]["enqueue"]["completed"] == report["operations"]["enqueue"]["scheduled"] > 0
+    assert report["operations"]["dashboard"]["errors"] == 0
+    assert report["operations"]["dashboard"]["latency"]["p99_ms"] > 0
+    assert report["sse"]["events"] >= 1
+    assert report["queueDepth"]["max"] >= 1
+    assert [bucket["t"] for bucket in report["timeline"]] == [0, 1]
+
+def test_time_scale_is_restored_after_a_run():
+    """--time-scale only applies for the run; the target's own time_scale comes back"""
+    reset_state()
+    args = argparse.Namespace(
+        url=None, arrival="poisson", duration=0.2, sse=0, sample_interval=0.1, max_in_flight=10, seed=1, time_scale=0.01,
+        burst_factor=5.0, burst_seconds=2.0, burst_period=10.0, diurnal_amplitude=0.8, diurnal_period=60.0
+    )
+    try:
+        before = get_state().config["time_scale"]
+        report = asyncio.run(run(args, {"dashboard": 10}))
+        assert report["workload"]["timeScale"] == 0.01
+        assert get_state().config["time_scale"] == before != 0.01
+    finally:
+        reset_state()
@@ -2,8 +2,9 @@
 import pytest
 import os
 import json
+import math
 from app.core.state import SimulationState, make_engraver, make_agv, reset_state, get_state
-from app.core.orchestrator import run_engrave_job
+from app.core.orchestrator import run_engrave_job, run_cycle_for_site, pack_trips, Orchestrator, EngraveJob
 
 # Mock config for testing
 TEST_CONFIG = {
@@ -79,3 +80,97 @@ def test_cumulative_billing_persistence():
     new_state = SimulationState()
     assert new_state.cumulative_billing["user_jobs"]["total_cost_eur"] == 15.0
     assert "JOB-1" in new_state.cumulative_billing["user_jobs"]["jobs_processed"]
+
+def test_fleet_device_persistence():
+    """Non-primary devices are stored per device and reloaded on restart"""
+    from app.core.orchestrator import set_operation_mode
+
+    reset_state()
+    state = get_state()
+    state.add_device("Engraver", "engraver-007")
+    device = state.devices.get("engraver-007")
+    set_operation_mode(device, "Running")
+    assert state.list_devices("Engraver", "Running")[0]["deviceId"] == "engraver-007"
+    state._save_device(device)
+
+    new_state = SimulationState()
+    restored = new_state.get_device("engraver-007")
+    assert restored["operationalData"]["status"]["operationMode"] == "Running"
+    assert [d["deviceId"] for d in new_state.list_devices(status="Running")] == ["engraver-007"]
+    reset_state()
+
+def test_released_pair_is_persisted():
+    """Devices a cycle drove are written when their pair is released, without any other save"""
+    from app.core.orchestrator import set_operation_mode
+    from app.core.versioning import touch_device
+
+    reset_state()
+    state = get_state()
+    state.add_device("Engraver", "engraver-008")
+    state.add_device("AGV", "agv-008")
+    primaries = state.fleet.acquire_pair()
+    engraver, agv = state.fleet.acquire_pair()
+    assert (engraver["deviceId"], agv["deviceId"]) == ("engraver-008", "agv-008")
+    set_operation_mode(engraver, "Running")
+    agv["operationalData"]["pose"]["posX"] = 4.0
+    touch_device(agv, "pose")
+    state.fleet.release_pair((engraver, agv))
+
+    try:
+        new_state = SimulationState()
+        assert new_state.get_device("engraver-008")["operationalData"]["status"]["operationMode"] == "Running"
+        assert new_state.get_device("agv-008")["operationalData"]["pose"]["posX"] == 4.0
+    finally:
+        state.fleet.release_pair(primaries)
+        reset_state()
+
+def test_pack_trips_fills_fewest_loads():
+    """First-fit decreasing respects both payload limits and keeps queue order within a load"""
+    assert pack_trips(list("abcde"), [1.0] * 5, 2, None) == [["a", "b"], ["c", "d"], ["e"]]
+    assert pack_trips(list("abcd"), [6.0, 5.0, 4.0, 5.0], None, 10.0) == [["a", "c"], ["b", "d"]]
+    assert pack_trips(list("ab"), [25.0, 1.0], 10, 20.0) == [["a"], ["b"]]   # too heavy: rides alone
+    assert pack_trips(list("abc"), [1.0] * 3, None, None) == [["a", "b", "c"]]
+    assert pack_trips([], [], 2, 2.0) == []
+    assert pack_trips(list("abcde"), [0.1] * 5, 4, 0.3) == [["a", "b"], ["c", "d"], ["e"]]   # uniform: chunked like first-fit
+    weights = [1.0, 2.0, 0.5] * 10000
+    loads = pack_trips(list(range(len(weights))), weights, 5, 8.0)
+    assert sorted(i for load in loads for i in load) == list(range(len(weights)))
+    assert all(len(load) <= 5 and sum(weights[i] for i in load) <= 8.0 for load in loads)
+
+def test_large_batch_is_split_into_billed_trips():
+    """A batch over the AGV payload takes one billed round trip per load within a single cycle"""
+    config = {**TEST_CONFIG, "agv": {**TEST_CONFIG["agv"], "payload_max_jobs": 2, "payload_max_kg": 0, "job_weight_kg": 1.0}, "time_scale": 0}
+    coords = {"HOME": (0.0, 0.0), "ENGRAVER_DOCK": (5.0, 0.0), "JOB_POS1": (12.0, 8.0)}
+    orch = Orchestrator(make_engraver(), make_agv(), config, coords)
+    for i in range(5):
+        orch.enqueue_job(EngraveJob(f"T-{i}", "A", "JOB_POS1", weightKg=0.5 if i else None))
+
+    summary = run_cycle_for_site(orch, "JOB_POS1")
+    assert summary["jobsProcessed"] == [f"T-{i}" for i in range(5)]
+    assert summary["billedTrips"] == 3
+    assert [trip["jobs"] for trip in summary["trips"]] == [["T-0", "T-1"], ["T-2", "T-3"], ["T-4"]]
+    assert summary["trips"][0]["weightKg"] == 1.5
+    assert summary["agvBilledMeters"] == pytest.approx(3 * 2 * math.hypot(7, 8), abs=1e-5)
+
+def test_jobs_stay_journaled_until_billed(tmp_path):
+    """With on_billed, a cycle's jobs leave the queue journal only after the bill is recorded"""
+    from app.core.database import QueueJournal
+    config = {**TEST_CONFIG, "time_scale": 0}
+    coords = {"HOME": (0.0, 0.0), "ENGRAVER_DOCK": (5.0, 0.0), "JOB_POS1": (12.0, 8.0)}
+    journal = QueueJournal(str(tmp_path / "queue.jsonl"))
+    orch = Orchestrator(make_engraver(), make_agv(), config, coords, journal=journal)
+    orch.enqueue_jobs([EngraveJob(f"B-{i}", "A", "JOB_POS1") for i in range(2)])
+
+    def crash(summary):
+        assert [record["orderNo"] for record in QueueJournal(journal.path).load()] == ["B-0", "B-1"]
+        raise RuntimeError("crashed before billing was saved")
+
+    with pytest.raises(RuntimeError):
+        run_cycle_for_site(orch, "JOB_POS1", on_billed=crash)
+    assert [record["orderNo"] for record in QueueJournal(journal.path).load()] == ["B-0", "B-1"]
+
+    orch.enqueue_jobs([EngraveJob("B-2", "A", "JOB_POS1")])
+    billed = []
+    run_cycle_for_site(orch, "JOB_POS1", on_billed=lambda summary: billed.extend(summary["jobsProcessed"]))
+    assert billed == ["B-2"]
+    assert [record["orderNo"] for record in QueueJournal(journal.path).load()] == ["B-0", "B-1"]
@@ -0,0 +1,156 @@
+"""Tests for the capacity planning simulator"""
+import copy
+import math
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.capacity import simulate_shift, size_fleet, leg_seconds, optimise_batching, shift_start
+from app.core.fleet import BatchingPolicy
+from app.core.rules import DEFAULT_CONFIG, DEFAULT_COORDS
+from app.core.state import reset_state
+
+client = TestClient(app)
+
+def test_shift_accounts_for_every_job():
+    """Every arrival is served, and energy, distance and utilisation follow the timing model"""
+    result = simulate_shift(DEFAULT_CONFIG, DEFAULT_COORDS, 60, pairs=2, job_mix={10: 1.0}, site_mix={"JOB_POS1": 1.0})
+    jobs = result["jobs"]
+    assert jobs["arrived"] == jobs["completed"] == result["queueWaitSeconds"]["n"] > 400
+    assert result["makespanSeconds"] >= result["shiftSeconds"] - 3600
+
+    engraver = DEFAULT_CONFIG["engraver"]
+    seconds = 10 * engraver["seconds_per_letter"]
+    energy = engraver["baseIdle_kWh"] + engraver["k_laser_kWh_per_sec_at_power1"] * seconds
+    assert result["perJob"]["energyKWh"] == pytest.approx(energy)
+    assert result["perJob"]["co2g"] == pytest.approx(energy * engraver["emissionFactor_g_per_kWh"])
+
+    billed = leg_seconds(DEFAULT_COORDS, "JOB_POS1", DEFAULT_CONFIG)["billedMeters"]
+    assert billed == pytest.approx(2 * math.hypot(7, 8))
+    assert result["perJob"]["agvBilledMeters"] == pytest.approx(billed * result["billedTrips"] / jobs["completed"], rel=1e-5)
+
+    horizon = max(result["shiftSeconds"], result["makespanSeconds"])
+    assert result["utilisation"]["engraver"] == pytest.approx(jobs["completed"] * seconds / (2 * horizon), abs=1e-4)
+    assert all(0 < pair["reserved"] <= 1 for pair in result["utilisation"]["perPair"])
+
+def test_batching_policy_trades_wait_for_fewer_cycles():
+    """Holding cycles until five jobs are queued batches more, bounded by max_wait_s"""
+    eager = simulate_shift(DEFAULT_CONFIG, DEFAULT_COORDS, 30, pairs=2)
+    patient = simulate_shift(DEFAULT_CONFIG, DEFAULT_COORDS, 30, pairs=2, policy=BatchingPolicy(min_batch=5, max_wait_s=600))
+    assert patient["jobs"]["completed"] == eager["jobs"]["completed"]
+    assert patient["meanBatchSize"] > eager["meanBatchSize"]
+    assert patient["cycles"] < eager["cycles"]
+    assert patient["perJob"]["agvCostEUR"] < eager["perJob"]["agvCostEUR"]
+    assert patient["queueWaitSeconds"]["mean"] > eager["queueWaitSeconds"]["mean"]
+
+    capped = simulate_shift(DEFAULT_CONFIG, DEFAULT_COORDS, 300, pairs=1, policy=BatchingPolicy(max_jobs=3))
+    assert capped["meanBatchSize"] <= 3
+
+def test_size_fleet_recommends_fewest_pairs():
+    sizing = size_fleet(DEFAULT_CONFIG, DEFAULT_COORDS, 400, max_pairs=8, target_p95_wait_s=300, policy=BatchingPolicy(max_jobs=10))
+    pairs = sizing["recommendedPairs"]
+    assert pairs and pairs > 1
+    assert sizing["results"][-1]["queueWaitSeconds"]["p95"] <= 300 < sizing["results"][-2]["queueWaitSeconds"]["p95"]
+    # The same arrivals are replayed for every fleet size
+    assert len({result["jobs"]["arrived"] for result in sizing["results"]}) == 1
+
+def test_capacity_endpoints():
+    response = client.post("/api/v1/capacity/simulate", json={"arrivalRatePerHour": 120, "jobMix": {"5": 1, "20": 1}})
+    assert response.status_code == 200
+    assert response.json()["pairs"] == 1
+    assert response.json()["wallMs"] < 1000
+
+    response = client.post("/api/v1/capacity/simulate", json={"arrivalRatePerHour": 120, "siteMix": {"NOWHERE": 1}})
+    assert response.status_code == 400
+
+    response = client.post("/api/v1/capacity/size", json={"arrivalRatePerHour": 400, "maxJobs": 10, "targetP95WaitS": 300})
+    assert response.status_code == 200
+    assert response.json()["recommendedPairs"] == len(response.json()["results"])
+
+    # Work is capped across all simulated shifts of a request, before any of them runs
+    assert client.post("/api/v1/capacity/size", json={"arrivalRatePerHour": 8000, "shiftHours": 24, "maxPairs": 64}).status_code == 400
+    assert client.post("/api/v1/capacity/batching", json={"arrivalRatePerHour": 8000, "shiftHours": 24}).status_code == 400
+
+def test_shift_is_priced_on_the_tariff_schedule():
+    """Simulated engraving pays the time-of-use price of when it runs, anchored at start_at"""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config["engraver"]["tariff_file"] = "tou_example.csv"
+    backlog = [(10, "JOB_POS1")] * 5
+    night = simulate_shift(config, DEFAULT_COORDS, 0, backlog=backlog, shift_s=600, start_at=shift_start("02:00"))
+    evening = simulate_shift(config, DEFAULT_COORDS, 0, backlog=backlog, shift_s=600, start_at=shift_start("18:00"))
+    assert night["totals"]["energyKWh"] == evening["totals"]["energyKWh"]
+    assert night["perJob"]["engraverCostEUR"] == pytest.approx(night["perJob"]["energyKWh"] * 0.24, abs=1e-6)
+    assert evening["perJob"]["engraverCostEUR"] == pytest.approx(evening["perJob"]["energyKWh"] * 0.52, abs=1e-6)
+    assert shift_start("1735689600") == 1735689600.0
+
+def test_optimiser_picks_cheapest_policy_within_wait_bound():
+    backlog = [(5, "JOB_POS1")] * 6 + [(10, "JOB_POS2")] * 3
+    result = optimise_batching(DEFAULT_CONFIG, DEFAULT_COORDS, backlog, 600, arrival_rate_per_h=60, pairs=2, shift_s=4 * 3600)
+    recommended = result["recommended"]
+    assert recommended["feasible"]
+    feasible = [entry for entry in result["candidates"] if entry["feasible"]]
+    assert recommended["costPerJobEUR"] == min(entry["costPerJobEUR"] for entry in feasible)
+    assert {entry["kind"] for entry in result["candidates"]} >= {"all", "cap", "fixed", "window", "cost"}
+    # Dispatching every job at once (the shipped default) pays for far more round trips
+    assert result["current"]["policy"] == BatchingPolicy().to_config()
+    assert result["savingPerJobEUR"] > 0
+
+    again = optimise_batching(DEFAULT_CONFIG, DEFAULT_COORDS, backlog, 600, arrival_rate_per_h=60, pairs=2, shift_s=4 * 3600, seed=1)
+    assert again["recommended"] == recommended   # deterministic for a seed
+
+    impossible = optimise_batching(DEFAULT_CONFIG, DEFAULT_COORDS, backlog * 20, 1, pairs=1, shift_s=3600)
+    assert not impossible["recommended"]["feasible"]
+    assert impossible["recommended"]["p95WaitS"] == min(entry["p95WaitS"] for entry in impossible["candidates"])
+
+def test_optimiser_candidates_never_hold_jobs_forever():
+    """Without the end-of-shift drain a policy lacking a time trigger strands jobs; every candidate has one"""
+    backlog = [(5, "JOB_POS1")] * 3
+    held = simulate_shift(DEFAULT_CONFIG, DEFAULT_COORDS, 0, policy=BatchingPolicy(min_batch=10), backlog=backlog, shift_s=600, drain=False)
+    assert held["jobs"]["stranded"] == 3 and held["jobs"]["completed"] == 0
+    assert simulate_shift(DEFAULT_CONFIG, DEFAULT_COORDS, 0, policy=BatchingPolicy(min_batch=10), backlog=backlog, shift_s=600)["jobs"]["stranded"] == 0
+
+    result = optimise_batching(DEFAULT_CONFIG, DEFAULT_COORDS, backlog, 300, shift_s=600)
+    assert all(0 <= entry["policy"]["max_wait_s"] <= 300 for entry in result["candidates"])
+    assert all(entry["strandedJobs"] == 0 for entry in result["candidates"])
+
+def test_batching_endpoint_applies_policy_used_by_dispatch():
+    reset_state()
+    try:
+        assert client.post("/api/v1/capacity/batching", json={}).status_code == 400   # empty queue, no arrivals
+        for i in range(3):
+            client.post("/api/v1/queue/enqueue", json={"orderNo": f"B-{i}", "laserText": "HELLO", "site": "JOB_POS1"})
+
+        response = client.post("/api/v1/capacity/batching", json={"maxP95WaitS": 3600, "arrivalRatePerHour": 30, "apply": True})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["backlog"] == 3 and data["applied"]
+        assert client.get("/api/v1/config").json()["config"]["batching"] == data["recommended"]["policy"]
+
+        # A policy waiting for five jobs holds the site instead of dispatching three
+        client.patch("/api/v1/config", json={"batching": {"max_jobs": None, "min_batch": 5, "max_wait_s": None, "max_agv_cost_per_job": None}})
+        response = client.post("/api/v1/cycle/dispatch")
+        assert response.status_code == 200
+        assert response.json()["runs"] == []
+        assert response.json()["held"][0]["site"] == "JOB_POS1" and response.json()["held"][0]["queued"] == 3
+    finally:
+        reset_state()
+
+def test_held_site_released_when_oldest_job_waited_max_wait():
+    """A site held for min_batch is dispatched by a timer once its oldest job has waited max_wait_s"""
+    reset_state()
+    try:
+        client.patch("/api/v1/config", json={"agv": {"speed_m_per_s": 50.0}, "progress_step": 100, "batching": {"min_batch": 5, "max_wait_s": 0.3}})
+        for i in range(2):
+            client.post("/api/v1/queue/enqueue", json={"orderNo": f"H-{i}", "laserText": "A", "site": "JOB_POS1"})
+        response = client.post("/api/v1/cycle/dispatch").json()
+        assert response["runs"] == [] and response["held"][0]["site"] == "JOB_POS1"
+
+        deadline = time.monotonic() + 10
+        runs = []
+        while time.monotonic() < deadline and not runs:
+            time.sleep(0.05)
+            runs = [run for run in client.get("/api/v1/history").json()["history"] if run["status"] == "completed"]
+        assert runs and runs[0]["runId"].startswith("dispatch_") and runs[0]["site"] == "JOB_POS1"
+        assert client.get("/api/v1/queue").json()["length"] == 0
+    finally:
+        reset_state()
@@ -0,0 +1,137 @@
+"""Tests for multi-cell routing, isolation and eviction"""
+import threading
+import time
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.state import cells, reset_state
+from app.core.versioning import versions
+
+client = TestClient(app)
+
+def drop_cells(*cell_ids):
+    for cell_id in cell_ids:
+        cells.delete(cell_id)
+
+def test_cells_are_isolated():
+    """Queue, config and cached aggregates are per cell, by path prefix or header"""
+    reset_state()
+    job = {"orderNo": "CELL-1", "laserText": "A", "site": "JOB_POS1"}
+
+    try:
+        assert client.post("/api/v1/cells/cell-a/queue/enqueue", json=job).status_code == 200
+        assert client.post("/api/v1/queue/enqueue", json=job, headers={"X-Cell-Id": "cell-b"}).status_code == 200
+        assert client.post("/api/v1/cells/cell-a/queue/enqueue", json=job).status_code == 409
+
+        client.patch("/api/v1/cells/cell-a/config", json={"agv": {"speed_m_per_s": 2.0}})
+        assert client.get("/api/v1/cells/cell-a/config").json()["config"]["agv"]["speed_m_per_s"] == 2.0
+        assert client.get("/api/v1/cells/cell-b/config").json()["config"]["agv"]["speed_m_per_s"] != 2.0
+
+        assert client.get("/api/v1/cells/cell-a/queue").json()["length"] == 1
+        assert client.get("/api/v1/queue").json()["length"] == 0
+
+        # Identical mutation histories give both cells the same versions, but never a shared cached body
+        client.patch("/api/v1/cells/cell-b/config", json={"agv": {"speed_m_per_s": 3.0}})
+        client.patch("/api/v1/cells/cell-a/config", json={"agv": {"costPerMeter_EUR": 0.5}})
+        client.patch("/api/v1/cells/cell-b/config", json={"agv": {"costPerMeter_EUR": 0.7}})
+        assert client.get("/api/v1/cells/cell-a/aas/devices").json()["agv"]["usageBilling"]["costPerMeter"] == 0.5
+        assert client.get("/api/v1/cells/cell-b/aas/devices").json()["agv"]["usageBilling"]["costPerMeter"] == 0.7
+        assert client.get("/health", headers={"X-Cell-Id": "cell-b"}).json()["cell"] == "cell-b"
+    finally:
+        drop_cells("cell-a", "cell-b")
+
+def test_invalid_cell_id_rejected():
+    assert client.get("/api/v1/cells/..%2Fetc/queue").status_code in (400, 404)
+    assert client.get("/api/v1/queue", headers={"X-Cell-Id": "../etc"}).status_code == 400
+
+def test_evicted_cell_reloads_from_storage():
+    """Evicting a cell writes it to its shard; the next request loads it back"""
+    job = {"orderNo": "EVICT-1", "laserText": "AB", "site": "JOB_POS2"}
+
+    try:
+        client.post("/api/v1/cells/cell-e/queue/enqueue", json=job)
+        client.patch("/api/v1/cells/cell-e/config", json={"engraver": {"seconds_per_letter": 0.25}})
+        etag = client.get("/api/v1/cells/cell-e/aas/engraver/operational/status").headers["etag"]
+
+        response = client.post("/api/v1/cells/evict", params={"cellId": "cell-e"})
+        assert response.json() == {"evicted": ["cell-e"]}
+        assert cells.loaded("cell-e") is None
+        assert "cell-e" in client.get("/api/v1/cells").json()["stored"]
+        # Its version keys went with it; reloaded, it issues ETags under a newer epoch
+        assert not [key for key in versions._versions if key.startswith("cell:cell-e:")]
+        reloaded = client.get("/api/v1/cells/cell-e/aas/engraver/operational/status", headers={"If-None-Match": etag})
+        assert reloaded.status_code == 200 and reloaded.headers["etag"] != etag
+
+        jobs = client.get("/api/v1/cells/cell-e/queue").json()["queue"]
+        assert [j["orderNo"] for j in jobs] == ["EVICT-1"]
+        assert client.get("/api/v1/cells/cell-e/config").json()["config"]["engraver"]["seconds_per_letter"] == 0.25
+
+        # The default cell is never evicted
+        assert client.post("/api/v1/cells/evict", params={"cellId": "default"}).status_code == 409
+    finally:
+        drop_cells("cell-e")
+
+def test_idle_cells_evicted_beyond_limits():
+    """Idle cells past the TTL or beyond max_loaded are evicted, busy ones are kept"""
+    cells.configure(idle_ttl_s=3600, max_loaded=10)
+    try:
+        for name in ("cell-x", "cell-y", "cell-z"):
+            client.get(f"/api/v1/cells/{name}/queue")
+        with cells.active("cell-x"):
+            evicted = cells.evict_idle(time.monotonic() + 7200)
+        assert sorted(evicted) == ["cell-y", "cell-z"]
+        assert cells.loaded("cell-x") is not None
+        assert cells.loaded("default") is not None
+
+        # Loading a third cell over the limit evicts the least recently used one
+        cells.configure(max_loaded=2)
+        client.get("/api/v1/cells/cell-y/queue")
+        assert cells.loaded("cell-x") is None
+        assert cells.loaded("cell-y") is not None
+    finally:
+        cells.configure(idle_ttl_s=300, max_loaded=256)
+        drop_cells("cell-x", "cell-y", "cell-z")
+
+def test_background_cycle_runs_in_its_cell():
+    """Cycles started in a cell record history in that cell only"""
+    cell = "/api/v1/cells/cell-run"
+    try:
+        client.patch(f"{cell}/config", json={"agv": {"speed_m_per_s": 50.0}, "progress_step": 100})
+        client.post(f"{cell}/queue/enqueue", json={"orderNo": "RUN-1", "laserText": "A", "site": "JOB_POS1"})
+        run_id = client.post(f"{cell}/cycle/run", params={"site": "JOB_POS1"}).json()["runId"]
+
+        status = client.get(f"{cell}/cycle/status/{run_id}", params={"waitFor": "terminal", "timeout": 30}).json()
+        assert status["status"] == "completed"
+        assert status["jobsProcessed"] == ["RUN-1"]
+        assert client.get(f"/api/v1/cycle/status/{run_id}").status_code == 404
+    finally:
+        drop_cells("cell-run")
+
+def test_cell_not_evicted_while_dispatch_in_flight():
+    """A dispatched cycle holds its cell until the thread ends, even while it holds no device pair"""
+    cell = "/api/v1/cells/cell-busy"
+    try:
+        client.patch(f"{cell}/config", json={"agv": {"speed_m_per_s": 50.0}, "progress_step": 100})
+        client.post(f"{cell}/queue/enqueue", json={"orderNo": "BUSY-1", "laserText": "A", "site": "JOB_POS1"})
+        state = cells.loaded("cell-busy")
+        entered, proceed = threading.Event(), threading.Event()
+        add_run_history = state.add_run_history
+
+        def blocked_add_run_history(run):
+            entered.set()
+            proceed.wait(5)
+            add_run_history(run)
+
+        state.add_run_history = blocked_add_run_history
+        run_id = client.post(f"{cell}/cycle/dispatch").json()["runs"][0]["runId"]
+        assert entered.wait(5)
+        assert state.fleet.is_idle()
+        assert not cells.evict("cell-busy")
+
+        proceed.set()
+        assert client.get(f"{cell}/cycle/status/{run_id}", params={"waitFor": "terminal", "timeout": 30}).json()["status"] == "completed"
+        deadline = time.monotonic() + 5
+        while not cells.evict("cell-busy") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cells.loaded("cell-busy") is None
+    finally:
+        drop_cells("cell-busy")
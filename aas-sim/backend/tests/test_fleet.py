@@ -0,0 +1,96 @@
+"""Tests for fleet dispatching across device pairs"""
+import threading
+import pytest
+from app.core.fleet import FleetDispatcher, dispatchable_sites, BatchingPolicy
+from app.core.registry import DeviceRegistry
+from app.core.orchestrator import Orchestrator, EngraveJob
+from app.core.state import make_engraver, make_agv
+
+def make_fleet(pairs: int = 2) -> FleetDispatcher:
+    registry = DeviceRegistry()
+    for i in range(1, pairs + 1):
+        registry.register(make_engraver(f"engraver-{i:03d}"))
+        registry.register(make_agv(f"agv-{i:03d}"))
+    return FleetDispatcher(registry)
+
+def test_pairs_are_disjoint_and_released():
+    """Concurrent cycles get different devices and wait when the fleet is busy"""
+    fleet = make_fleet(2)
+    first = fleet.acquire_pair()
+    second = fleet.acquire_pair()
+    assert first[0]["deviceId"] == "engraver-001" and first[1]["deviceId"] == "agv-001"
+    assert {second[0]["deviceId"], second[1]["deviceId"]} == {"engraver-002", "agv-002"}
+    assert fleet.acquire_pair(timeout=0.05) is None
+
+    fleet.release_pair(first)
+    third = fleet.acquire_pair(timeout=1)
+    assert third[1]["deviceId"] == "agv-001"
+    assert fleet.stats()["cyclesStarted"] == 3
+
+def test_exclusive_waits_for_running_cycles():
+    """exclusive() blocks new pairs and waits until running cycles finish"""
+    fleet = make_fleet(1)
+    pair = fleet.acquire_pair()
+    entered = threading.Event()
+
+    def take_fleet():
+        with fleet.exclusive():
+            entered.set()
+
+    thread = threading.Thread(target=take_fleet)
+    thread.start()
+    assert not entered.wait(0.1)
+    fleet.release_pair(pair)
+    assert entered.wait(1)
+    thread.join()
+
+def test_views_share_queue_and_claims_are_atomic():
+    """Orchestrator views for different pairs never claim the same job"""
+    orch = Orchestrator(make_engraver(), make_agv(), {}, {"JOB_POS1": (1.0, 1.0)})
+    for i in range(4):
+        orch.enqueue_job(EngraveJob(f"F-{i}", "A", "JOB_POS1"))
+    view = orch.for_devices(make_engraver("engraver-002"), make_agv("agv-002"))
+
+    first = view.claim_batch("JOB_POS1", 3)
+    second = orch.claim_batch("JOB_POS1")
+    assert [job.orderNo for job in first] == ["F-0", "F-1", "F-2"]
+    assert [job.orderNo for job in second] == ["F-3"]
+    assert orch.site_depth("JOB_POS1") == 0
+    assert view.agv["deviceId"] == "agv-002" and orch.agv["deviceId"] == "agv-001"
+
+def test_billing_windows_are_tracked_per_pair():
+    """A view's billing window shows on the fleet and closes with its pair"""
+    fleet = make_fleet(2)
+    orch = Orchestrator(make_engraver(), make_agv(), {}, {}, on_billing=fleet.set_billing)
+    fleet.acquire_pair()
+    engraver, agv = fleet.acquire_pair()
+    view = orch.for_devices(engraver, agv)
+    assert not fleet.billing_window_active()
+
+    view._toggle_billing(True)
+    assert fleet.billing_window_active()
+    assert fleet.stats()["billingWindows"] == ["agv-002"]
+    mirror = make_fleet(2)
+    mirror.load_snapshot(fleet.stats())
+    assert mirror.billing_window_active()
+
+    fleet.release_pair((engraver, agv))
+    assert not fleet.billing_window_active()
+
+def test_dispatchable_sites():
+    assert dispatchable_sites({"JOB_POS1": 1, "JOB_POS2": 4, "NOWHERE": 2}, {"JOB_POS1": 0, "JOB_POS2": 0}) == ["JOB_POS2", "JOB_POS1"]
+
+def test_batching_policy_triggers():
+    """Count, age and cost triggers each start a cycle; with none set a site waits for the drain"""
+    assert BatchingPolicy().ready(1, 0.0)
+    assert not BatchingPolicy().ready(0, 100.0)
+    by_count = BatchingPolicy(min_batch=3)
+    assert not by_count.ready(2, 10.0) and by_count.ready(3, 0.0)
+    by_age = BatchingPolicy(min_batch=None, max_wait_s=60)
+    assert not by_age.ready(5, 59.0) and by_age.ready(1, 60.0)
+    by_cost = BatchingPolicy(min_batch=None, max_agv_cost_per_job=0.1)
+    assert not by_cost.ready(3, 0.0, trip_cost=0.4) and by_cost.ready(4, 0.0, trip_cost=0.4)
+    # A cycle never shares the trip among more than max_jobs
+    assert not BatchingPolicy(max_jobs=2, min_batch=None, max_agv_cost_per_job=0.1).ready(10, 0.0, trip_cost=0.4)
+    assert BatchingPolicy(min_batch=None).ready(1, 0.0, draining=True)
+    assert BatchingPolicy(max_jobs=2, min_batch=5).min_batch == 2
@@ -0,0 +1,213 @@
+"""Tests for history queries and exports"""
+import pytest
+import gzip
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.state import reset_state, get_state, cells
+from app.core.history_index import HistoryIndex
+
+client = TestClient(app)
+
+def make_run(i: int, site: str = "JOB_POS1", status: str = "completed", **extra):
+    return {"runId": f"run_{i:03d}", "site": site, "startedAt": f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}", "status": status, **extra}
+
+def seed_history(count: int = 25):
+    reset_state()
+    state = get_state()
+    for i in range(count):
+        state.add_run_history(make_run(i, site="JOB_POS1" if i % 2 else "JOB_POS2", status="error" if i % 5 == 0 else "completed"))
+    return state
+
+def test_index_pages_newest_first():
+    """Pages follow startedAt descending and the cursor resumes after the last run"""
+    index = HistoryIndex()
+    index.rebuild({run["runId"]: run for run in (make_run(i) for i in range(10))})
+
+    first, cursor = index.page(4)
+    assert first == ["run_009", "run_008", "run_007", "run_006"]
+    second, cursor = index.page(4, cursor)
+    assert second == ["run_005", "run_004", "run_003", "run_002"]
+    last, cursor = index.page(4, cursor)
+    assert last == ["run_001", "run_000"]
+    assert cursor is None
+
+def test_index_tracks_status_changes():
+    """Re-adding a run moves it between status indexes"""
+    index = HistoryIndex()
+    run = make_run(1, status="running")
+    index.add(run)
+    assert index.page(10, filters={"status": "running"})[0] == ["run_001"]
+
+    run["status"] = "completed"
+    index.add(run)
+    assert index.page(10, filters={"status": "running"})[0] == []
+    assert index.page(10, filters={"status": "completed"})[0] == ["run_001"]
+    assert len(index) == 1
+
+def test_history_cursor_pagination():
+    """GET /history walks every run exactly once using nextCursor"""
+    seed_history()
+    try:
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 7, "site": "JOB_POS1"}
+            if cursor:
+                params["cursor"] = cursor
+            data = client.get("/api/v1/history", params=params).json()
+            seen.extend(run["runId"] for run in data["history"])
+            cursor = data["nextCursor"]
+            if not cursor:
+                break
+
+        expected = [f"run_{i:03d}" for i in range(24, -1, -1) if i % 2]
+        assert seen == expected
+        assert data["total"] == len(expected)   # counted after filtering
+
+        errors = client.get("/api/v1/history", params={"status": "error", "site": "JOB_POS2"}).json()
+        assert [run["runId"] for run in errors["history"]] == ["run_020", "run_010", "run_000"]
+        assert errors["total"] == 3
+        assert client.get("/api/v1/history").json()["total"] == 25
+
+        assert client.get("/api/v1/history", params={"cursor": "not-a-cursor"}).status_code == 400
+    finally:
+        reset_state()
+
+def test_no_next_cursor_without_more_matching_runs():
+    """A page that takes the last matching run has no nextCursor, even with older non-matching runs below it"""
+    seed_history()
+    try:
+        # Errors at JOB_POS2 are runs 20, 10 and 0; other runs sit between and below them
+        data = client.get("/api/v1/history", params={"status": "error", "site": "JOB_POS2", "limit": 3}).json()
+        assert len(data["history"]) == 3 and data["nextCursor"] is None
+
+        data = client.get("/api/v1/history", params={"status": "error", "limit": 4}).json()
+        assert [run["runId"] for run in data["history"]] == ["run_020", "run_015", "run_010", "run_005"]
+        assert data["nextCursor"] is not None
+        rest = client.get("/api/v1/history", params={"status": "error", "limit": 4, "cursor": data["nextCursor"]}).json()
+        assert [run["runId"] for run in rest["history"]] == ["run_000"] and rest["nextCursor"] is None
+
+        # The newest matching run sits above older non-matching ones
+        data = client.get("/api/v1/history", params={"site": "JOB_POS1", "status": "error", "limit": 2}).json()
+        assert [run["runId"] for run in data["history"]] == ["run_015", "run_005"] and data["nextCursor"] is None
+    finally:
+        reset_state()
+
+def test_clearing_history_drops_run_versions():
+    """Cleared runs leave no version keys behind"""
+    from app.core.versioning import versions
+    state = seed_history(3)
+    try:
+        state.update_run_history("run_001", {"status": "completed"})
+        assert versions.get("run:run_001") > 0
+        assert client.delete("/api/v1/history").status_code == 200
+        assert not {"run:run_000", "run:run_001", "run:run_002"} & versions._versions.keys()
+    finally:
+        reset_state()
+
+def test_streaming_exports():
+    """JSON, NDJSON and CSV exports stream the same filtered runs"""
+    seed_history()
+    try:
+        data = client.get("/api/v1/history/export/json", params={"limit": 3}).json()
+        assert data["totalRuns"] == 25
+        assert data["exportedRuns"] == 3
+        assert [run["runId"] for run in data["history"]] == ["run_024", "run_023", "run_022"]
+
+        ndjson = client.get("/api/v1/history/export/ndjson", params={"site": "JOB_POS2", "from": "2025-01-01T00:00:10", "to": "2025-01-01T00:00:14"})
+        assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in ndjson.text.splitlines()]
+        assert [row["runId"] for row in rows] == ["run_014", "run_012", "run_010"]
+
+        lines = client.get("/api/v1/history/export/csv").text.strip().splitlines()
+        assert lines[0].startswith("runId,site,startedAt")
+        assert len(lines) == 26
+
+        assert client.get("/api/v1/history/export/xml").status_code == 404
+    finally:
+        reset_state()
+
+def test_gzip_export():
+    """gzip=true compresses the stream on the fly"""
+    seed_history(5)
+    try:
+        response = client.get("/api/v1/history/export/ndjson", params={"gzip": True})
+        assert response.headers["content-type"] == "application/gzip"
+        assert "ndjson.gz" in response.headers["content-disposition"]
+        rows = gzip.decompress(response.content).decode().splitlines()
+        assert len(rows) == 5
+    finally:
+        reset_state()
+
+def test_run_trace_export():
+    """A finished run's spans download as Chrome trace events: 5 legs, each job, persistence and API calls"""
+    cell = "/api/v1/cells/cell-trace"
+    try:
+        client.patch(f"{cell}/config", json={"agv": {"speed_m_per_s": 50.0}, "progress_step": 100})
+        for order_no in ("TR-1", "TR-2"):
+            client.post(f"{cell}/queue/enqueue", json={"orderNo": order_no, "laserText": "A", "site": "JOB_POS1"})
+        run_id = client.post(f"{cell}/cycle/run", params={"site": "JOB_POS1"}).json()["runId"]
+        assert client.get(f"{cell}/cycle/status/{run_id}", params={"waitFor": "terminal", "timeout": 30}).json()["status"] == "completed"
+
+        response = client.get(f"{cell}/history/{run_id}/trace")
+        assert response.status_code == 200
+        assert run_id in response.headers["content-disposition"]
+        trace = response.json()
+        spans = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        names = [event["name"] for event in spans]
+
+        assert [name.split(":")[0] for name in names if name.startswith("leg")] == ["leg 1", "leg 2", "leg 3", "leg 4", "leg 5"]
+        assert "engrave TR-1" in names and "engrave TR-2" in names
+        assert "cycle JOB_POS1" in names and "wait for device pair" in names and "persist" in names
+        assert "POST /api/v1/cycle/run" in names and "GET /api/v1/cycle/status/{run_id}" in names
+        assert all(event["dur"] >= 0 and isinstance(event["ts"], float) for event in spans)
+        assert trace["otherData"]["runId"] == run_id
+
+        # Traces are per cell
+        assert client.get(f"/api/v1/history/{run_id}/trace").status_code == 404
+    finally:
+        cells.delete("cell-trace")
+
+
+def test_composer_runs_are_traced():
+    """Composer runs get a trace like /cycle/run"""
+    cell = "/api/v1/cells/cell-composer-trace"
+    try:
+        client.patch(f"{cell}/config", json={"agv": {"speed_m_per_s": 50.0}, "progress_step": 100})
+        run_id = client.post(f"{cell}/composer/batch", json={"jobs": [{"laserText": "A"}, {"laserText": "B"}], "site": "JOB_POS2"}).json()["runId"]
+        assert client.get(f"{cell}/cycle/status/{run_id}", params={"waitFor": "terminal", "timeout": 30}).json()["status"] == "completed"
+
+        names = [event["name"] for event in client.get(f"{cell}/history/{run_id}/trace").json()["traceEvents"] if event["ph"] == "X"]
+        assert "POST /api/v1/composer/batch" in names and "cycle JOB_POS2" in names
+    finally:
+        cells.delete("cell-composer-trace")
+
+def test_rebill_history_against_other_schedules():
+    """Past engrave jobs are repriced per job interval without touching history"""
+    reset_state()
+    state = get_state()
+    try:
+        for i, started_at in enumerate(("2025-01-01T06:30:00+00:00", "2025-01-01T18:00:00+00:00")):
+            job = {"order_no": f"RB-{i}", "seconds": 3600.0, "energy_kWh": 1.0, "cost_eur": 0.4, "co2_g": 400.0, "started_at": started_at}
+            state.add_run_history(make_run(i, startedAt=started_at[:19], cycleSummary={"individualJobs": [job]}))
+        state.add_run_history(make_run(2, status="error"))
+
+        # 06:30-07:30 is half at 0.2 and half at 0.6; 18:00-19:00 all at 0.6
+        body = {"tariff": {"points": [["00:00", 0.2], ["07:00", 0.6]]}, "emission": {"points": [[0, 300.0]]}}
+        data = client.post("/api/v1/history/rebill", params={"perRun": True}, json=body).json()
+        assert data["jobs"] == 2 and data["runs"] == 2
+        assert data["billed"] == {"costEUR": 0.8, "co2g": 800.0}
+        assert data["rebilled"]["costEUR"] == pytest.approx(1.0)
+        assert data["delta"]["co2g"] == pytest.approx(-200.0)
+        assert {run["runId"]: run["costEUR"] for run in data["perRun"]} == pytest.approx({"run_000": 0.4, "run_001": 0.6})
+
+        # Without a body the current (flat) schedules reprice to what was billed at the same rates
+        current = client.post("/api/v1/history/rebill", params={"from": "2025-01-01T12:00"}, json={}).json()
+        assert current["jobs"] == 1 and "perRun" not in current
+        assert state.get_run_history("run_000")["cycleSummary"]["individualJobs"][0]["cost_eur"] == 0.4
+
+        assert client.post("/api/v1/history/rebill", json={"tariffFile": "../config.yaml"}).status_code == 400
+        assert client.post("/api/v1/history/rebill", json={"tariff": {"points": [["25:00", 1.0]]}}).status_code == 400
+    finally:
+        reset_state()
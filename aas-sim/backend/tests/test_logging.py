@@ -0,0 +1,75 @@
+"""Tests for the queued JSON logging pipeline"""
+import io
+import json
+import logging
+import queue
+from app.core.logging import (
+    setup_logging, flush_logging, get_logger, log_context,
+    RateLimitFilter, SamplingFilter, NonBlockingQueueHandler
+)
+
+def read_records(stream: io.StringIO):
+    flush_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_json_records_carry_context():
+    stream = io.StringIO()
+    setup_logging("INFO", stream=stream)
+    try:
+        logger = get_logger("test")
+        with log_context(runId="run_1"):
+            with log_context(orderNo="E-1"):
+                logger.info("Job %s done", "E-1", extra={"letters": 3})
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Cycle failed")
+
+        done, failed = read_records(stream)
+        assert done["message"] == "Job E-1 done"
+        assert done["runId"] == "run_1" and done["orderNo"] == "E-1" and done["letters"] == 3
+        assert done["cell"] == "default" and done["logger"] == "aas_sim.test"
+        assert failed["level"] == "ERROR" and "orderNo" not in failed
+        assert "ValueError: boom" in failed["exception"]
+    finally:
+        setup_logging("INFO")
+
+def test_hot_loggers_are_sampled():
+    stream = io.StringIO()
+    setup_logging("INFO", stream=stream, sampling={"aas_sim.test.hot": 5})
+    try:
+        logger = get_logger("test.hot")
+        for i in range(20):
+            logger.info("job %d", i)
+        logger.warning("always kept")
+
+        records = read_records(stream)
+        assert [r["message"] for r in records] == ["job 0", "job 5", "job 10", "job 15", "always kept"]
+        assert records[0]["sampled"] == 5
+    finally:
+        setup_logging("INFO")
+
+def test_rate_limit_reports_suppressed_records():
+    now = [0.0]
+    limiter = RateLimitFilter(rate=1.0, burst=2, clock=lambda: now[0])
+    records = [logging.makeLogRecord({"name": "aas_sim.x", "msg": str(i)}) for i in range(5)]
+
+    assert [limiter.filter(r) for r in records[:4]] == [True, True, False, False]
+    now[0] = 1.0
+    assert limiter.filter(records[4])
+    assert records[4].suppressed == 2
+    # Loggers are limited independently
+    assert limiter.filter(logging.makeLogRecord({"name": "aas_sim.y"}))
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    for i in range(5):
+        handler.handle(logging.makeLogRecord({"msg": str(i)}))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+def test_sampling_filter_keeps_warnings():
+    sampler = SamplingFilter({"aas_sim.hot": 100})
+    assert sampler.filter(logging.makeLogRecord({"name": "aas_sim.hot", "levelno": logging.INFO}))
+    assert not sampler.filter(logging.makeLogRecord({"name": "aas_sim.hot", "levelno": logging.INFO}))
+    assert sampler.filter(logging.makeLogRecord({"name": "aas_sim.hot", "levelno": logging.ERROR}))
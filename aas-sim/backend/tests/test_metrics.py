@@ -0,0 +1,58 @@
+"""Tests for the metrics registry and /metrics endpoint"""
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.metrics import MetricsRegistry, TimedLock, LOCK_HOLD
+from app.core.state import reset_state
+
+client = TestClient(app)
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Test", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, kind="a")
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{kind="a",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{kind="a",le="1"} 3' in text
+    assert 'test_seconds_bucket{kind="a",le="+Inf"} 4' in text
+    assert 'test_seconds_count{kind="a"} 4' in text
+    assert registry.histogram("test_seconds", "Test") is histogram
+
+def test_counter_and_gauge_render():
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Test", ("store",)).inc(3, store="x")
+    registry.gauge("test_depth", "Test", ("cell",)).set_function(lambda: {("a",): 2, ("b",): 0})
+
+    text = registry.render()
+    assert 'test_total{store="x"} 3' in text
+    assert 'test_depth{cell="a"} 2' in text
+    assert 'test_depth{cell="b"} 0' in text
+
+def test_timed_lock_records_holds():
+    lock = TimedLock("test_lock")
+    before = LOCK_HOLD.count(lock="test_lock")
+    with lock:
+        assert lock.locked()
+    assert not lock.locked()
+    assert LOCK_HOLD.count(lock="test_lock") == before + 1
+
+def test_metrics_endpoint():
+    """Requests are labelled by route template and persistence is measured"""
+    reset_state()
+    client.post("/api/v1/queue/enqueue", json={"orderNo": "MET-1", "laserText": "A", "site": "JOB_POS1"})
+    client.get("/api/v1/cycle/status/run_missing")
+
+    try:
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        assert 'aas_http_request_duration_seconds_count{method="GET",route="/api/v1/cycle/status/{run_id}",status="404"}' in text
+        assert 'aas_persist_duration_seconds_count' in text
+        assert 'aas_persist_bytes_total{store="state"}' in text
+        assert 'aas_lock_wait_seconds_bucket{lock="state"' in text
+        assert 'aas_queue_depth{cell="default"} 1' in text
+    finally:
+        reset_state()
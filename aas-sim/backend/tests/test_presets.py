@@ -0,0 +1,106 @@
+"""Tests for engraver power presets and their precomputed tables"""
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.rules import DEFAULT_CONFIG
+from app.core.state import make_engraver, reset_state, get_state
+from app.core.orchestrator import run_engrave_job
+from app.core.presets import TABLE_LETTERS, build_preset_tables, merge_presets, preset_table
+
+client = TestClient(app)
+
+def engraver_config(**presets):
+    return {**DEFAULT_CONFIG["engraver"], "power_presets": {**DEFAULT_CONFIG["engraver"]["power_presets"], **presets}}
+
+def test_tables_follow_the_energy_model():
+    """Lookups match the formula inside and beyond the table; Standard keeps the paper's result"""
+    engraver = engraver_config(Test={"power_factor": 2.0, "speed_multiplier": 0.5, "idle_kWh": 0.1})
+    standard = preset_table(engraver)
+    assert standard.name == "Standard"
+    assert standard.lookup(5) == pytest.approx((2.5, 0.025))   # 0.02 + 0.002 x 2.5, as before presets
+
+    table = preset_table(engraver, "Test")
+    for letters in (0, 1, 7, TABLE_LETTERS, TABLE_LETTERS + 10):
+        seconds = max(1.0, letters * 0.5 / 0.5)
+        assert table.lookup(letters) == pytest.approx((seconds, 0.1 + 0.002 * 2.0 * seconds))
+
+    # A preset removed after a job was queued runs as the default
+    assert preset_table(engraver, "Gone") is standard
+
+def test_tables_rebuild_only_changed_presets():
+    """Changing one preset rebuilds its table; a shared parameter rebuilds all of them"""
+    engraver = engraver_config(Rebuild={"power_factor": 1.1, "speed_multiplier": 1.0, "idle_kWh": None})
+    build_preset_tables(engraver)
+    assert build_preset_tables(engraver) == []
+
+    engraver["power_presets"] = merge_presets(engraver, {"power_presets": {"Rebuild": {"power_factor": 1.2}}})
+    assert build_preset_tables(engraver) == ["Rebuild"]
+
+    engraver["seconds_per_letter"] = 0.123
+    assert sorted(build_preset_tables(engraver)) == sorted(engraver["power_presets"])
+
+def test_merge_presets_keeps_a_default():
+    engraver = engraver_config()
+    merged = merge_presets(engraver, {"power_presets": {"Eco": None, "Turbo": {"power_factor": 2.0}}})
+    assert "Eco" not in merged
+    assert merged["Turbo"] == {"power_factor": 2.0, "speed_multiplier": 1.0, "idle_kWh": None}
+    with pytest.raises(ValueError):
+        merge_presets(engraver, {"power_presets": {"Standard": None}})
+    with pytest.raises(ValueError):
+        merge_presets(engraver, {"default_powerPreset": "Turbo"})
+
+def test_job_bills_its_preset():
+    """A job's preset sets its time and energy, and is recorded with it"""
+    config = {**DEFAULT_CONFIG, "progress_step": 100, "poll_interval_s": 0.0, "time_scale": 0.0}
+    device = make_engraver()
+    standard = run_engrave_job(device, "P-1", "ABCDEFGH", config)
+    eco = run_engrave_job(device, "P-2", "ABCDEFGH", config, "Eco")
+    assert standard["power_preset"] == "Standard" and eco["power_preset"] == "Eco"
+    assert eco["seconds"] == pytest.approx(8 * 0.5 / 0.75, abs=1e-3)
+    assert eco["energy_kWh"] == pytest.approx(0.015 + 0.002 * 0.6 * 8 * 0.5 / 0.75, abs=1e-6)
+    assert standard["energy_kWh"] == pytest.approx(0.02 + 0.002 * 4.0)
+
+def test_preset_api():
+    """Presets are listed, quoted, patched and validated on enqueue"""
+    reset_state()
+    try:
+        presets = client.get("/api/v1/config/presets").json()
+        assert presets["default"] == "Standard"
+        assert [preset["name"] for preset in presets["presets"]] == ["Eco", "Standard", "High"]
+
+        quote = client.post("/api/v1/config/presets/quote", json={"jobs": [{"laserText": "HELLO"}, {"laserText": "HELLO", "powerPreset": "High"}]}).json()
+        assert [job["powerPreset"] for job in quote["jobs"]] == ["Standard", "High"]
+        assert quote["jobs"][0]["energyKWh"] == pytest.approx(0.025)
+        assert quote["totals"]["jobs"] == 2
+        assert quote["totals"]["costEUR"] == pytest.approx(sum(job["costEUR"] for job in quote["jobs"]))
+        assert client.post("/api/v1/config/presets/quote", json={"jobs": [{"laserText": "A", "powerPreset": "Nope"}]}).status_code == 400
+
+        response = client.patch("/api/v1/config", json={"engraver": {"power_presets": {"High": {"power_factor": 3.0}, "Eco": None}}})
+        assert response.status_code == 200
+        assert response.json()["config"]["engraver"]["power_presets"]["High"] == {"power_factor": 3.0, "speed_multiplier": 1.4, "idle_kWh": 0.03}
+        assert "Eco" not in get_state().config["engraver"]["power_presets"]
+        assert client.patch("/api/v1/config", json={"engraver": {"default_powerPreset": "Eco"}}).status_code == 400
+
+        assert client.post("/api/v1/queue/enqueue", json={"orderNo": "PP-1", "laserText": "A", "powerPreset": "Eco"}).status_code == 400
+        assert client.post("/api/v1/queue/enqueue", json={"orderNo": "PP-2", "laserText": "A", "powerPreset": "High"}).status_code == 200
+        assert get_state().orchestrator.queue[-1].to_record()["powerPreset"] == "High"
+    finally:
+        reset_state()
+
+def test_null_preset_fields_and_invalid_presets():
+    """A null preset field resets to its default; presets that cannot be built leave the config untouched"""
+    reset_state()
+    try:
+        response = client.patch("/api/v1/config", json={"engraver": {"power_presets": {"High": {"speed_multiplier": None, "idle_kWh": None}}}})
+        assert response.status_code == 200
+        assert response.json()["config"]["engraver"]["power_presets"]["High"] == {"power_factor": 1.5, "speed_multiplier": 1.0, "idle_kWh": None}
+        assert preset_table(get_state().config["engraver"], "High").lookup(4)[0] == pytest.approx(2.0)
+
+        state = get_state()
+        before = {**state.config["engraver"]}
+        with pytest.raises(ValueError):
+            state.update_config({"currency": "USD", "engraver": {"seconds_per_letter": "slow"}})
+        assert state.config["engraver"] == before
+        assert state.config["currency"] != "USD"
+    finally:
+        reset_state()
@@ -0,0 +1,79 @@
+"""Tests for opt-in profiling of routes and cycles"""
+import threading
+import time
+import pstats
+import marshal
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.profiling import Profiler, profiler
+
+client = TestClient(app)
+
+def busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+def test_disabled_profiler_records_nothing():
+    local = Profiler()
+    with local.profile("cycle"):
+        busy(0.01)
+    assert local.status()["profiledBlocks"] == 0
+    assert local.collapsed() == ""
+    assert local.pstats_text() is None
+
+def test_sampling_collects_collapsed_stacks():
+    local = Profiler()
+    local.configure("sample", interval_s=0.001)
+    try:
+        with local.profile("cycle"):
+            busy(0.1)
+    finally:
+        local.configure("off")
+    lines = local.collapsed().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert stack.startswith("cycle;") and "test_profiling.py:busy" in stack
+    assert int(count) > 0
+
+def test_overlapping_cprofile_blocks_are_skipped():
+    """A cProfile block that starts while another runs goes unprofiled instead of failing"""
+    local = Profiler()
+    local.configure("cprofile")
+    inner = []
+    try:
+        with local.profile("cycle") as outer:
+            thread = threading.Thread(target=lambda: inner.append(local.profile("cycle").__enter__()))
+            thread.start()
+            thread.join()
+            busy(0.01)
+        with local.profile("cycle") as dropped:
+            dropped.discard()
+    finally:
+        local.configure("off")
+    assert outer is not None and inner == [None]
+    status = local.status()
+    assert (status["profiledBlocks"], status["skippedBlocks"], status["discardedBlocks"]) == (1, 1, 1)
+    assert "function calls" in local.pstats_text()
+
+def test_cprofile_endpoints():
+    """Profiled routes are merged into one pstats table, served as text and as a binary dump"""
+    client.delete("/api/v1/profile")
+    assert client.post("/api/v1/profile/start", params={"mode": "bogus"}).status_code == 400
+    assert client.post("/api/v1/profile/start", params={"mode": "cprofile", "routes": "/api/v1/queue"}).json()["mode"] == "cprofile"
+    try:
+        client.get("/api/v1/queue")
+        client.get("/api/v1/config")
+    finally:
+        status = client.post("/api/v1/profile/stop").json()
+    assert status["mode"] == "off"
+    assert status["profiledBlocks"] == 1
+
+    report = client.get("/api/v1/profile/pstats", params={"sort": "tottime", "limit": 10}).text
+    assert "function calls" in report
+    stats = marshal.loads(client.get("/api/v1/profile/pstats", params={"format": "binary"}).content)
+    assert any(func[2] == "get_queue_jobs" for func in stats)
+
+    client.delete("/api/v1/profile")
+    assert client.get("/api/v1/profile/pstats").status_code == 404
+    assert not profiler.enabled
@@ -0,0 +1,194 @@
+"""Tests for queue admission control"""
+import asyncio
+import pytest
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.state import reset_state, get_state, SimulationState
+from app.core.orchestrator import Orchestrator, EngraveJob, JobQueue
+from app.core.state import make_engraver, make_agv
+from app.api.v1 import queue as queue_api
+
+client = TestClient(app)
+
+def make_orchestrator(max_length: int = 3, max_per_site: int = 2) -> Orchestrator:
+    config = {"queue": {"max_length": max_length, "max_per_site": max_per_site, "retry_after_s": 7}}
+    return Orchestrator(make_engraver(), make_agv(), config, {})
+
+def test_admission_limits():
+    """Duplicate, global and per-site limits are checked in that order"""
+    orch = make_orchestrator()
+
+    assert orch.admit_job(EngraveJob("Q-1", "A", "JOB_POS1")) is None
+    assert orch.admit_job(EngraveJob("Q-1", "B", "JOB_POS2")) == "duplicate"
+    assert orch.admit_job(EngraveJob("Q-2", "A", "JOB_POS1")) is None
+    assert orch.admit_job(EngraveJob("Q-3", "A", "JOB_POS1")) == "site_full"
+    assert orch.admit_job(EngraveJob("Q-4", "A", "JOB_POS2")) is None
+    assert orch.admit_job(EngraveJob("Q-5", "A", "JOB_POS2")) == "queue_full"
+
+    stats = orch.get_queue_stats()
+    assert stats["depth"] == 3
+    assert stats["siteDepth"] == {"JOB_POS1": 2, "JOB_POS2": 1}
+    assert stats["counters"]["rejected_duplicate"] == 1
+    assert stats["counters"]["rejected_site_full"] == 1
+    assert stats["counters"]["rejected_queue_full"] == 1
+
+def test_job_queue_removes_out_of_order():
+    """Removed jobs drop out of iteration and length; the rest keep their order"""
+    queue = JobQueue()
+    jobs = [EngraveJob(f"J-{i}", "A") for i in range(10)]
+    for job in jobs:
+        queue.append(job)
+
+    for index in (0, 3, 4, 5, 6, 7, 9):
+        assert queue.remove(jobs[index])
+    assert not queue.remove(jobs[3])
+    assert len(queue) == 3
+    assert [job.orderNo for job in queue] == ["J-1", "J-2", "J-8"]
+    assert queue.find("J-2") is jobs[2]
+    assert queue.find("J-3") is None
+    assert queue[-1] is jobs[8]
+
+def test_indexes_follow_removal():
+    """Removing jobs frees their orderNo and site capacity"""
+    orch = make_orchestrator()
+    orch.admit_job(EngraveJob("Q-1", "A", "JOB_POS1"))
+    orch.admit_job(EngraveJob("Q-2", "A", "JOB_POS1"))
+
+    assert orch.remove_job("Q-1")
+    assert not orch.remove_job("Q-1")
+    assert orch.site_depth("JOB_POS1") == 1
+    assert orch.admit_job(EngraveJob("Q-1", "A", "JOB_POS1")) is None
+
+    assert orch.clear_queue() == 2
+    assert orch.site_depth("JOB_POS1") == 0
+    assert orch.admit_job(EngraveJob("Q-2", "A", "JOB_POS1")) is None
+
+def test_enqueue_backpressure():
+    """Enqueue endpoint answers 409 for duplicates and 429/503 with Retry-After when full"""
+    reset_state()
+    state = get_state()
+    state.update_config({"queue": {"max_length": 2, "max_per_site": 1, "retry_after_s": 3}})
+
+    try:
+        job = {"orderNo": "BP-1", "laserText": "A", "site": "JOB_POS1"}
+        assert client.post("/api/v1/queue/enqueue", json=job).status_code == 200
+        assert client.post("/api/v1/queue/enqueue", json=job).status_code == 409
+
+        response = client.post("/api/v1/queue/enqueue", json={**job, "orderNo": "BP-2"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "3"
+
+        assert client.post("/api/v1/queue/enqueue", json={**job, "orderNo": "BP-3", "site": "JOB_POS2"}).status_code == 200
+        response = client.post("/api/v1/queue/enqueue", json={**job, "orderNo": "BP-4", "site": "HOME"})
+        assert response.status_code == 503
+
+        stats = client.get("/api/v1/queue/stats").json()
+        assert stats["depth"] == 2
+        assert stats["counters"]["rejected_queue_full"] == 1
+    finally:
+        reset_state()
+
+def test_bulk_enqueue_ndjson():
+    """Bulk endpoint accepts NDJSON and reports per-row results"""
+    reset_state()
+    body = "\n".join([
+        '{"orderNo": "BULK-1", "laserText": "A", "site": "JOB_POS1"}',
+        '{"orderNo": "BULK-2", "laserText": "B", "site": "JOB_POS2"}',
+        '{"orderNo": "BULK-1", "laserText": "C"}',
+        'not json',
+        '{"orderNo": "BULK-3", "laserText": ""}',
+        '{"orderNo": "BULK-4", "laserText": "D", "site": "NOWHERE"}',
+    ])
+
+    try:
+        response = client.post("/api/v1/queue/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == 2
+        assert data["rejected"] == 4
+        assert data["queueLength"] == 2
+        assert [r["accepted"] for r in data["results"]] == [True, True, False, False, False, False]
+        assert data["results"][2]["reason"] == "duplicate"
+    finally:
+        reset_state()
+
+def test_bulk_enqueue_json_array_chunked():
+    """JSON array bodies are parsed incrementally across chunk boundaries"""
+    reset_state()
+    jobs = [{"orderNo": f"ARR-{i}", "laserText": "X" * (i % 5 + 1), "site": "JOB_POS1"} for i in range(50)]
+    payload = json.dumps(jobs).encode()
+
+    def chunks():
+        for i in range(0, len(payload), 7):
+            yield payload[i:i + 7]
+
+    try:
+        response = client.post("/api/v1/queue/bulk?report=rejected", content=chunks())
+        data = response.json()
+        assert data["accepted"] == 50
+        assert data["results"] == []
+        assert get_state().orchestrator.site_depth("JOB_POS1") == 50
+    finally:
+        reset_state()
+
+def test_bulk_array_rejects_malformed_rows_and_resyncs(monkeypatch):
+    """A malformed array element is rejected with its row number and later rows still count; runaway rows stop the parse"""
+    reset_state()
+    body = b'[{"orderNo": "RS-1", "laserText": "A"}, {"orderNo": "RS-2", laserText: B}, {"orderNo": "RS-3", "laserText": "C,]"}, 42, {"orderNo": "RS-4", "laserText": "D"}]'
+    try:
+        data = client.post("/api/v1/queue/bulk", content=body).json()
+        assert data["accepted"] == 3 and data["rejected"] == 2
+        assert [(r["row"], r["orderNo"], r["accepted"]) for r in data["results"]] == [
+            (1, "RS-1", True), (2, None, False), (3, "RS-3", True), (4, None, False), (5, "RS-4", True)
+        ]
+        assert data["results"][1]["reason"].startswith("Invalid JSON")
+        assert data["results"][3]["reason"] == "Row must be a JSON object"
+    finally:
+        reset_state()
+
+    async def parse(body, size):
+        async def chunks():
+            for i in range(0, len(body), size):
+                yield body[i:i + size]
+        return [row async for rows in queue_api.iter_bulk_rows(chunks()) for row in rows]
+
+    # Same rows whatever the chunking, including a number split across chunks
+    assert asyncio.run(parse(body, 3)) == asyncio.run(parse(body, len(body)))
+    assert asyncio.run(parse(b"[1, 234]", 5)) == [(1, None), (234, None)]
+
+    monkeypatch.setattr(queue_api, "MAX_BULK_ROW_CHARS", 100)
+    rows = asyncio.run(parse(b'[{"laserText": "' + b"E" * 500 + b'"}, {"laserText": "F"}]', 200))
+    assert len(rows) == 1 and "longer than 100" in rows[0][1]
+
+def test_queue_survives_restart():
+    """Queued jobs are replayed from the journal and finished jobs are not"""
+    reset_state()
+    state = get_state()
+    orch = state.orchestrator
+    jobs = [EngraveJob(f"DUR-{i}", "A", "JOB_POS1") for i in range(3)]
+    for job in jobs:
+        orch.enqueue_job(job)
+
+    # One job finished, one still in flight when the process "dies"
+    orch.dequeue_job(jobs[0])
+    orch.dequeue_job(jobs[1], acknowledge=False)
+
+    try:
+        restored = SimulationState()
+        assert [j["orderNo"] for j in restored.orchestrator.get_queue_jobs()] == ["DUR-1", "DUR-2"]
+        assert restored.orchestrator.site_depth("JOB_POS1") == 2
+    finally:
+        reset_state()
+
+def test_interrupted_runs_marked_on_restart():
+    """Runs stuck in "running" are marked interrupted during init_from_db"""
+    reset_state()
+    state = get_state()
+    state.add_run_history({"runId": "run_stuck", "site": "JOB_POS1", "startedAt": "2025-01-01T00:00:00", "status": "running"})
+
+    try:
+        restored = SimulationState()
+        assert restored.get_run_history("run_stuck")["status"] == "interrupted"
+    finally:
+        reset_state()
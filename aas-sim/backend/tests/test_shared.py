@@ -0,0 +1,127 @@
+"""Tests for shared-state mode (owner publisher, worker replicas, request forwarding)"""
+import pytest
+from app.core.state import get_state, reset_state, cells
+from app.core.shared import SharedStore, StatePublisher, ReplicaState
+from app.core.context import DEFAULT_CELL
+from app.api.forwarding import must_forward
+
+def make_pair(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    store.reset("boot-1")
+    publisher = StatePublisher(store, cells)
+    get_state()
+    reset_state()
+    publisher.flush()
+    return store, publisher, ReplicaState(DEFAULT_CELL, None, store)
+
+def test_replica_follows_owner(tmp_path):
+    """Replicas see queue, devices, config and history changes, including removals"""
+    store, publisher, replica = make_pair(tmp_path)
+    state = get_state()
+
+    try:
+        replica.sync()
+        assert replica.get_device("engraver")["deviceId"] == "engraver-001"
+
+        from app.core.orchestrator import EngraveJob
+        state.orchestrator.admit_job(EngraveJob("SH-1", "A", "JOB_POS2"))
+        state.add_device("AGV", "agv-002")
+        state.update_config({"agv": {"speed_m_per_s": 1.5}})
+        state.add_run_history({"runId": "run_sh", "site": "JOB_POS2", "startedAt": "2025-01-01T00:00:00", "status": "completed"})
+        publisher.flush()
+        replica.sync()
+
+        assert [j["orderNo"] for j in replica.orchestrator.get_queue_jobs()] == ["SH-1"]
+        assert replica.orchestrator.site_depth("JOB_POS2") == 1
+        assert len(replica.list_devices("AGV")) == 2
+        assert replica.config["agv"]["speed_m_per_s"] == 1.5
+        assert replica.get_run_history("run_sh")["status"] == "completed"
+
+        state.remove_device("agv-002")
+        state.clear_run_history()
+        state.orchestrator.clear_queue()
+        publisher.flush()
+        replica.sync()
+
+        assert replica.get_device("agv-002") is None
+        assert replica.get_run_history("run_sh") is None
+        assert replica.orchestrator.get_queue_jobs() == []
+    finally:
+        publisher.close()
+        reset_state()
+
+def test_publisher_sends_only_bumped_sections(tmp_path):
+    """A publish carries just the sections whose versions moved, and a reset still removes extra devices"""
+    store, publisher, replica = make_pair(tmp_path)
+    state = get_state()
+    try:
+        state.update_config({})
+        publisher.flush()
+        _, generation = store.head(DEFAULT_CELL)
+
+        from app.core.orchestrator import EngraveJob
+        state.orchestrator.admit_job(EngraveJob("SH-2", "A", "JOB_POS1"))
+        publisher.flush()
+        assert [name for name, _ in store.changes(DEFAULT_CELL, generation)] == ["queue"]
+
+        state.add_device("AGV", "agv-003")
+        state.add_run_history({"runId": "run_rs", "site": "JOB_POS1", "startedAt": "2025-01-01T00:00:00", "status": "completed"})
+        publisher.flush()
+        replica.sync()
+        assert replica.get_device("agv-003") is not None
+
+        state.reset_to_defaults()
+        publisher.flush()
+        replica.sync()
+        assert replica.get_device("agv-003") is None
+        assert replica.get_run_history("run_rs") is None
+        assert replica.orchestrator.get_queue_jobs() == []
+    finally:
+        publisher.close()
+        reset_state()
+
+def test_replica_is_read_only(tmp_path):
+    store, publisher, replica = make_pair(tmp_path)
+    try:
+        replica.sync()
+        with pytest.raises(RuntimeError):
+            replica.add_device("AGV", "agv-009")
+    finally:
+        publisher.close()
+
+def test_replica_resyncs_after_owner_restart(tmp_path):
+    """A new owner boot makes replicas drop what the old owner published"""
+    store, publisher, replica = make_pair(tmp_path)
+    state = get_state()
+    try:
+        state.add_run_history({"runId": "run_old", "site": "JOB_POS1", "startedAt": "2025-01-01T00:00:00", "status": "completed"})
+        publisher.flush()
+        replica.sync()
+        assert replica.get_run_history("run_old") is not None
+
+        # The old owner dies before publishing the removal
+        publisher.close()
+        state.clear_run_history()
+        store.reset("boot-2")
+        restarted = StatePublisher(store, cells)
+        state.update_config({})
+        restarted.flush()
+        replica.sync()
+        assert replica.get_run_history("run_old") is None
+        assert replica.boot == "boot-2"
+        restarted.close()
+    finally:
+        publisher.close()
+        reset_state()
+
+def test_forwarding_rules():
+    assert must_forward("POST", "/api/v1/queue/enqueue", b"")
+    assert must_forward("GET", "/api/v1/cycle/status/run_1", b"waitFor=terminal&timeout=30")
+    assert must_forward("GET", "/api/v1/aas/engraver/operational/status", b"wait=true")
+    assert must_forward("GET", "/api/v1/cells", b"")
+    assert must_forward("GET", "/api/v1/history/run_1/trace", b"")
+    assert not must_forward("GET", "/api/v1/aas/engraver/operational/status", b"wait=false")
+    assert not must_forward("GET", "/api/v1/history", b"limit=20")
+    assert not must_forward("POST", "/api/v1/profile/start", b"mode=sample")
+    assert not must_forward("GET", "/api/v1/profile/collapsed", b"")
+    assert must_forward("GET", "/api/v1/profile/pstats", b"owner=true")
@@ -0,0 +1,65 @@
+"""Tests for time-of-use tariff and grid-carbon schedules"""
+import pytest
+import random
+from app.core import tariff as tariff_module
+from app.core.tariff import Schedule, DAY_S, bill_jobs, load_schedule
+
+def test_integral_across_steps():
+    """Integrals and means weight each step by the seconds it covers"""
+    schedule = Schedule.from_points([("00:00", 0.2), ("07:00", 0.4), ("17:00", 0.6)])
+    assert schedule.daily
+    assert schedule.value_at(7 * 3600) == 0.4
+    # 06:00-08:00: one hour at 0.2 and one at 0.4
+    assert schedule.integral(6 * 3600, 8 * 3600) == pytest.approx(3600 * 0.6)
+    assert schedule.mean(6 * 3600, 8 * 3600) == pytest.approx(0.3)
+    assert schedule.mean(100.0, 100.0) == 0.2
+
+def test_daily_schedule_wraps_midnight():
+    """Before the first step the previous day's last step applies, and whole days integrate alike"""
+    schedule = Schedule.from_points([("06:00", 1.0), ("18:00", 3.0)])
+    assert schedule.value_at(3 * 3600) == 3.0
+    per_day = 12 * 3600 * 1.0 + 12 * 3600 * 3.0
+    day = 20000 * DAY_S
+    assert schedule.integral(day, day + 3 * DAY_S) == pytest.approx(3 * per_day)
+    # 23:00 to 01:00 the next day stays on the evening price
+    assert schedule.mean(day + 23 * 3600, day + 25 * 3600) == pytest.approx(3.0)
+
+def test_absolute_schedule_holds_its_ends():
+    """Absolute schedules keep their first value before they start and their last after they end"""
+    schedule = Schedule.from_points([("2025-01-01T00:00:00Z", 100.0), ("2025-01-01T12:00:00Z", 300.0)])
+    start = schedule.starts[0]
+    assert not schedule.daily
+    assert schedule.value_at(start - 3600) == 100.0
+    assert schedule.mean(start + 11 * 3600, start + 13 * 3600) == pytest.approx(200.0)
+    assert schedule.value_at(start + 10 * DAY_S) == 300.0
+
+    with pytest.raises(ValueError):
+        Schedule.from_points([("06:00", 1.0), ("2025-01-01T00:00:00Z", 2.0)])
+
+def test_batched_means_match_single_means():
+    """means() gives the same result as mean() per interval"""
+    schedule = Schedule.from_points([(f"{hour:02d}:00", 0.2 + hour / 100) for hour in range(24)])
+    rng = random.Random(4)
+    t0s = [rng.uniform(0, 30 * DAY_S) for _ in range(200)]
+    t1s = [t0 + rng.choice([0.0, rng.uniform(1, 7200)]) for t0 in t0s]
+    assert schedule.means(t0s, t1s) == pytest.approx([schedule.mean(t0, t1) for t0, t1 in zip(t0s, t1s)])
+
+    costs, co2s = bill_jobs([(t0s[0], t1s[0], 2.0)], schedule, Schedule.constant(400.0))
+    assert costs[0] == pytest.approx(2.0 * schedule.mean(t0s[0], t1s[0]))
+    assert co2s == [800.0]
+
+def test_schedule_files_stay_in_the_tariff_directory(tmp_path, monkeypatch):
+    """Files load from the tariff directory (CSV or JSON) and paths may not leave it"""
+    monkeypatch.setattr(tariff_module, "TARIFF_DIR", str(tmp_path))
+    (tmp_path / "tou.csv").write_text("start,value\n00:00,0.2\n12:00,0.5\n")
+    (tmp_path / "carbon.json").write_text('{"unit": "g/kWh", "points": [["00:00", 300], ["12:00", 450]]}')
+    (tmp_path / "epoch.csv").write_text("start,value\n1735689600,0.2\n1735732800.5,0.5\n")
+
+    assert load_schedule("tou.csv").value_at(13 * 3600) == 0.5
+    assert load_schedule("carbon.json").unit == "g/kWh"
+    epoch = load_schedule("epoch.csv")
+    assert not epoch.daily and epoch.starts == [1735689600.0, 1735732800.5]
+    with pytest.raises(ValueError):
+        load_schedule("../outside.csv")
+    with pytest.raises(ValueError):
+        load_schedule("missing.csv")
@@ -0,0 +1,80 @@
+"""Tests for device telemetry ring buffers and downsampling"""
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.state import cells
+from app.core.telemetry import TelemetryBuffer, TelemetryStore, lttb, telemetry
+
+client = TestClient(app)
+
+def test_buffer_keeps_one_sample_per_heartbeat():
+    """Writes within a heartbeat refresh the latest sample; old samples are overwritten once full"""
+    buffer = TelemetryBuffer(capacity=4)
+    buffer.write(1.0, 0.0, 0.0, 0, 1, heartbeat=1)
+    buffer.write(1.1, 0.5, 0.0, 10, 1, heartbeat=1)
+    assert len(buffer) == 1
+    assert [list(column) for column in buffer.snapshot()] == [[1.1], [0.5], [0.0], [10], [1]]
+
+    for step in range(2, 8):
+        buffer.write(float(step), float(step), 0.0, step, 1, heartbeat=step)
+    t, x, _, progress, _ = buffer.snapshot()
+    assert list(t) == [4.0, 5.0, 6.0, 7.0]
+    assert list(progress) == [4, 5, 6, 7]
+    assert list(buffer.snapshot(start=4.5, end=6.0)[0]) == [5.0, 6.0]
+
+def test_lttb_keeps_shape():
+    """Endpoints and a lone spike survive downsampling to a handful of points"""
+    xs = [float(i) for i in range(1000)]
+    ys = [0.0] * 1000
+    ys[437] = 50.0
+    kept = lttb(xs, ys, 20)
+    assert len(kept) == 20
+    assert kept[0] == 0 and kept[-1] == 999
+    assert 437 in kept
+    assert kept == sorted(kept)
+    assert lttb(xs[:10], ys[:10], 20) == list(range(10))
+
+def test_store_drops_least_recently_written_buffer():
+    """Beyond max_buffers the buffer written to longest ago goes, not the first created"""
+    store = TelemetryStore(capacity=4, max_buffers=2)
+    def device(device_id, heartbeat):
+        status = {"productionProgress": 0, "operationMode": "Idle", "heartbeatCounter": heartbeat}
+        return {"deviceId": device_id, "operationalData": {"status": status, "pose": {"posX": 0.0, "posY": 0.0}}}
+    for device_id, heartbeat in (("old-but-busy", 1), ("idle", 1), ("old-but-busy", 2), ("new", 1)):
+        store.record(device(device_id, heartbeat))
+        time.sleep(0.001)
+    assert store.get("old-but-busy") is not None and store.get("new") is not None
+    assert store.get("idle") is None
+
+def test_telemetry_endpoint_after_a_cycle():
+    """A cycle leaves an AGV trajectory and engraver progress curve that can be downsampled"""
+    cell = "/api/v1/cells/cell-telemetry"
+    try:
+        client.patch(f"{cell}/config", json={"agv": {"speed_m_per_s": 5.0}, "time_scale": 0.0})
+        client.post(f"{cell}/queue/enqueue", json={"orderNo": "TM-1", "laserText": "HELLO", "site": "JOB_POS1"})
+        run_id = client.post(f"{cell}/cycle/run", params={"site": "JOB_POS1"}).json()["runId"]
+        assert client.get(f"{cell}/cycle/status/{run_id}", params={"waitFor": "terminal", "timeout": 30}).json()["status"] == "completed"
+
+        full = client.get(f"{cell}/aas/agv/telemetry", params={"points": 0}).json()
+        assert full["samples"] == full["returned"] > 20
+        assert full["t"] == sorted(full["t"])
+        assert max(full["x"]) == pytest.approx(12.0, abs=1e-3)   # reached JOB_POS1
+        assert "Running" in full["mode"]
+
+        small = client.get(f"{cell}/aas/agv/telemetry", params={"points": 10}).json()
+        assert small["returned"] == 10 and small["downsampledBy"] == "pose"
+        assert small["t"][0] == full["t"][0] and small["t"][-1] == full["t"][-1]
+
+        engraver = client.get(f"{cell}/aas/engraver/telemetry").json()
+        assert max(engraver["progress"]) == 100
+        window = client.get(f"{cell}/aas/agv/telemetry", params={"points": 0, "from": full["t"][5], "to": full["t"][10]}).json()
+        assert window["t"] == full["t"][5:11]
+
+        assert client.get(f"{cell}/aas/nope/telemetry").status_code == 404
+        assert client.get(f"{cell}/aas/agv/telemetry", params={"from": "yesterday"}).status_code == 400
+        assert ("cell-telemetry", "agv-001") in telemetry._buffers
+    finally:
+        cells.delete("cell-telemetry")
+    assert ("cell-telemetry", "agv-001") not in telemetry._buffers   # deleting a cell drops its telemetry
+
@@ -16,9 +16,7 @@ export default function BatchBuilder({ onNotification }: BatchBuilderProps) {
   const [isSubmitting, setIsSubmitting] = useState(false);
 
   const addJob = () => {
-    if (jobs.length < 5) {
-      setJobs([...jobs, { laserText: '' }]);
-    }
+    setJobs([...jobs, { laserText: '' }]);
   };
 
   const removeJob = (index: number) => {
@@ -93,7 +91,7 @@ export default function BatchBuilder({ onNotification }: BatchBuilderProps) {
         </div>
         <div>
           <h2 className="text-2xl font-bold text-gray-900">Batch Job Builder</h2>
-          <p className="text-green-600">Compose up to 5 jobs for efficient batch processing</p>
+          <p className="text-green-600">Compose up to the queue's per-site limit of jobs; the AGV carries them in as few trips as its payload allows</p>
         </div>
       </div>
 
@@ -131,16 +129,11 @@ export default function BatchBuilder({ onNotification }: BatchBuilderProps) {
         {/* Jobs List */}
         <div className="space-y-4">
           <div className="flex items-center justify-between">
-            <h3 className="text-lg font-semibold text-gray-800">Jobs ({jobs.length}/5)</h3>
+            <h3 className="text-lg font-semibold text-gray-800">Jobs ({jobs.length})</h3>
             <button
               type="button"
               onClick={addJob}
-              disabled={jobs.length >= 5}
-              className={`flex items-center space-x-2 px-4 py-2 rounded-lg text-sm font-medium transition-all ${
-                jobs.length < 5
-                  ? 'bg-green-100 text-green-700 hover:bg-green-200'
-                  : 'bg-gray-100 text-gray-400 cursor-not-allowed'
-              }`}
+              className="flex items-center space-x-2 px-4 py-2 rounded-lg text-sm font-medium transition-all bg-green-100 text-green-700 hover:bg-green-200"
             >
               <Plus className="h-4 w-4" />
               <span>Add Job</span>
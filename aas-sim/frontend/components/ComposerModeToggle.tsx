@@ -37,7 +37,7 @@ export default function ComposerModeToggle({ currentMode, onModeChange }: Compos
         >
           <Package className="h-5 w-5" />
           <span>Batch Mode</span>
-          <div className="text-xs opacity-80">Up to 5 jobs</div>
+          <div className="text-xs opacity-80">Up to the per-site queue limit</div>
         </button>
       </div>
     </div>
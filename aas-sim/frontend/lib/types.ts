@@ -143,6 +143,11 @@ export interface ConfigModel {
     baseIdle_kWh: number;
     k_laser_kWh_per_sec_at_power1: number;
     default_powerPreset: string;
+    power_presets?: Record<string, {
+      power_factor: number;
+      speed_multiplier: number;
+      idle_kWh: number | null;
+    }>;
     seconds_per_letter: number;
   };
   agv: {
@@ -29,13 +29,13 @@ def run_scenario(name, endpoint):
         run_id = data["runId"]
         print(f"Started {name}. Run ID: {run_id}")
         
-        # Poll for completion
+        # Long-poll until the run reaches a terminal status
         while True:
-            status_resp = requests.get(f"{BASE_URL}/cycle/status/{run_id}")
+            status_resp = requests.get(f"{BASE_URL}/cycle/status/{run_id}", params={"waitFor": "terminal", "timeout": 60})
             status_data = status_resp.json()
             status = status_data["status"]
             
-            if status in ["completed", "error", "no_jobs"]:
+            if status in ["completed", "error", "no_jobs", "interrupted"]:
                 print(f"Scenario finished with status: {status}")
                 if status == "completed":
                     summary = status_data["cycleSummary"]
@@ -45,8 +45,6 @@ def run_scenario(name, endpoint):
                     print(f"Error: {status_data.get('error')}")
                     return None
             
-            time.sleep(1)
-            
     except Exception as e:
         print(f"Failed to run {name}: {e}")
         return None